@@ -0,0 +1,298 @@
+"""
+Offline benchmark data: HMMs built from the `Appendix_4` alignments,
+a tiny Pfam-like release to run `setup` on, and synthetic proteomes.
+"""
+import typing as t
+from collections import abc
+from pathlib import Path
+
+import numpy as np
+from pyhmmer.easel import Alphabet, DigitalSequence, TextSequence
+from pyhmmer.hmmer import hmmalign
+from pyhmmer.plan7 import HMM, Background, Builder
+
+from tkp_finder.constants import PFAM_A_NAME, PFAM_DAT_NAME, PFAM_PK_NAME
+from tkp_finder.hmm import decode_name, encode_name
+
+ALIGNMENTS_DIR = Path(__file__).parent.parent / "Appendix_4" / "_alignments"
+AMINO_ACIDS = "ACDEFGHIKLMNPQRSTVWY"
+#: Background amino acid frequencies (UniProtKB/Swiss-Prot)
+AA_FREQUENCIES = (
+    0.0825, 0.0138, 0.0546, 0.0672, 0.0386, 0.0707, 0.0227, 0.0591, 0.0580,
+    0.0965, 0.0241, 0.0406, 0.0474, 0.0393, 0.0553, 0.0665, 0.0536, 0.0686,
+    0.0110, 0.0292,
+)  # fmt: skip
+_AA_CODES = np.frombuffer(AMINO_ACIDS.encode("ascii"), dtype=np.uint8)
+_AA_P = np.array(AA_FREQUENCIES) / sum(AA_FREQUENCIES)
+PK_PROFILE_NAME = "Pkinase"
+#: Decoy category => (the number of profiles, min length, max length)
+DECOY_CATEGORIES = {
+    "Domain": (8, 60, 120),
+    "Motif": (4, 12, 25),
+    "Repeat": (4, 25, 40),
+}
+#: Bit score cutoffs (GA, TC and NC) assigned to the built profiles
+CUTOFF = 25.0
+
+T = t.TypeVar("T")
+
+
+class Profile(t.NamedTuple):
+    category: str
+    hmm: HMM
+    #: Sequences emitted as the profile's domains in synthetic proteins
+    domains: list[str]
+
+
+def read_alignment(path: Path) -> list[tuple[str, str]]:
+    """
+    :param path: One of the `Appendix_4/_alignments` fasta files.
+    :return: A list of (name, ungapped sequence) pairs.
+    """
+    seqs = []
+    for record in path.read_text().split(">")[1:]:
+        header, *lines = record.splitlines()
+        seq = "".join(lines).replace("-", "").replace(".", "").upper()
+        seqs.append((header.split()[0], seq.replace("*", "")))
+    return seqs
+
+
+def _digitize(seqs: abc.Iterable[tuple[str, str]], alphabet: Alphabet):
+    return [
+        TextSequence(name=encode_name(name), sequence=seq).digitize(alphabet)
+        for name, seq in seqs
+    ]
+
+
+def median_length(xs: abc.Sequence[T], key: abc.Callable[[T], int] = len) -> T:
+    """
+    :return: An element of `xs` with the median length (the lower median).
+    """
+    return sorted(xs, key=key)[(len(xs) - 1) // 2]
+
+
+def build_hmm(
+    name: str,
+    accession: str,
+    seqs: abc.Sequence[DigitalSequence],
+    builder: Builder,
+    background: Background,
+) -> HMM:
+    """
+    Build a profile from unaligned sequences: the sequence of the median
+    length seeds a single-sequence profile the rest are aligned to. Thus,
+    the profile spans a typical domain rather than the longest outlier,
+    and the typical domains cover most of it.
+
+    :param name: A name of the profile.
+    :param accession: A versioned accession of the profile.
+    :param seqs: Digital sequences of the profile's domains.
+    :param builder: A profile builder.
+    :param background: A background model.
+    :return: A profile with the bit score cutoffs set to :data:`CUTOFF`.
+    """
+    seed = median_length(seqs)
+    hmm, _, _ = builder.build(seed, background)
+    if len(seqs) > 1:
+        msa = hmmalign(hmm, seqs, trim=True, digitize=True)
+        msa.name = encode_name(name)
+        hmm, _, _ = builder.build_msa(msa, background)
+    hmm.name = encode_name(name)
+    hmm.accession = encode_name(accession)
+    hmm.description = encode_name(f"Synthetic {name} profile")
+    for cutoffs in ("gathering", "trusted", "noise"):
+        setattr(hmm.cutoffs, cutoffs, (CUTOFF, CUTOFF))
+    return hmm
+
+
+def build_profiles(num_families: int | None = None, seed: int = 0) -> list[Profile]:
+    """
+    Build the benchmark profiles:
+
+    #. The PK domain profile named :data:`PFAM_PK_NAME` built from the
+       median-length sequence of each alignment.
+    #. A `Family` profile per alignment.
+    #. Decoy profiles of :data:`DECOY_CATEGORIES` built from random
+       sequences.
+
+    :param num_families: The number of alignments to use. By default, all
+        of them are used.
+    :param seed: A seed of the random decoy sequences.
+    :return: A list of profiles with unique names.
+    """
+    rng = np.random.default_rng(seed)
+    alphabet = Alphabet.amino()
+    background = Background(alphabet)
+    builder = Builder(alphabet)
+
+    paths = sorted(ALIGNMENTS_DIR.glob("*.fa"))[:num_families]
+    if not paths:
+        raise ValueError(f"Found no alignments in {ALIGNMENTS_DIR}")
+    families = {p.stem: read_alignment(p) for p in paths}
+
+    representatives = [
+        median_length(seqs, key=lambda x: len(x[1])) for seqs in families.values()
+    ]
+    pk = build_hmm(
+        PK_PROFILE_NAME,
+        f"{PFAM_PK_NAME}.1",
+        _digitize(representatives, alphabet),
+        builder,
+        background,
+    )
+    profiles = [Profile("Domain", pk, [s for _, s in representatives])]
+
+    for i, (name, seqs) in enumerate(families.items(), start=1):
+        # Profile names become identifiers of the chains' fields
+        name = name.replace("-", "_")
+        hmm = build_hmm(
+            name, f"PF8{i:04}.1", _digitize(seqs, alphabet), builder, background
+        )
+        profiles.append(Profile("Family", hmm, [s for _, s in seqs]))
+
+    i = 0
+    for category, (num, min_len, max_len) in DECOY_CATEGORIES.items():
+        for _ in range(num):
+            i += 1
+            domains = [
+                random_sequence(rng, rng.integers(min_len, max_len + 1))
+                for _ in range(3)
+            ]
+            name = f"Decoy{category}{i}"
+            hmm = build_hmm(
+                name,
+                f"PF9{i:04}.1",
+                _digitize([(name, domains[0])], alphabet),
+                builder,
+                background,
+            )
+            profiles.append(Profile(category, hmm, domains))
+
+    return profiles
+
+
+def write_pfam(profiles: abc.Iterable[Profile], base: Path) -> tuple[Path, Path]:
+    """
+    Write a tiny Pfam-like release to be consumed by `tkp-finder setup`.
+
+    :param profiles: Profiles built by :func:`build_profiles`.
+    :param base: A directory to write to.
+    :return: Paths to the written `Pfam-A.hmm` and `Pfam-A.hmm.dat`.
+    """
+    base.mkdir(exist_ok=True, parents=True)
+    path_hmm, path_dat = base / PFAM_A_NAME, base / PFAM_DAT_NAME
+    with path_hmm.open("wb") as f_hmm, path_dat.open("w") as f_dat:
+        for p in profiles:
+            p.hmm.write(f_hmm)
+            f_dat.write(
+                "# STOCKHOLM 1.0\n"
+                f"#=GF ID   {decode_name(p.hmm.name)}\n"
+                f"#=GF AC   {decode_name(p.hmm.accession)}\n"
+                f"#=GF DE   {decode_name(p.hmm.description)}\n"
+                f"#=GF GA   {CUTOFF}; {CUTOFF};\n"
+                f"#=GF TP   {p.category}\n"
+                f"#=GF ML   {p.hmm.M}\n"
+                "//\n"
+            )
+    return path_hmm, path_dat
+
+
+def random_sequence(rng: np.random.Generator, size: int) -> str:
+    """
+    :param rng: A random generator.
+    :param size: The sequence length.
+    :return: A sequence with the background amino acid composition.
+    """
+    return rng.choice(_AA_CODES, size=size, p=_AA_P).tobytes().decode("ascii")
+
+
+def mutate(rng: np.random.Generator, seq: str, rate: float) -> str:
+    """
+    :param rng: A random generator.
+    :param seq: A sequence to mutate.
+    :param rate: A fraction of positions to substitute.
+    :return: The mutated sequence.
+    """
+    codes = np.frombuffer(seq.encode("ascii"), dtype=np.uint8).copy()
+    is_mutated = rng.random(len(codes)) < rate
+    substitutes = random_sequence(rng, int(is_mutated.sum())).encode("ascii")
+    codes[is_mutated] = np.frombuffer(substitutes, dtype=np.uint8)
+    return codes.tobytes().decode("ascii")
+
+
+def generate_proteome(
+    path: Path,
+    profiles: abc.Sequence[Profile],
+    num_proteins: int,
+    tkp_rate: float = 0.05,
+    pk_rate: float = 0.1,
+    decoy_rate: float = 1.0,
+    length_median: int = 400,
+    length_sigma: float = 0.6,
+    mutation_rate: float = 0.1,
+    seed: int = 0,
+) -> dict[str, int]:
+    """
+    Generate a synthetic proteome: random background sequences with
+    embedded kinase and decoy domains.
+
+    :param path: A path to write the fasta file to.
+    :param profiles: Profiles built by :func:`build_profiles`.
+    :param num_proteins: The number of proteins.
+    :param tkp_rate: The fraction of tandem kinases, i.e., of proteins with
+        two or three kinase domains.
+    :param pk_rate: The fraction of proteins with a single kinase domain.
+    :param decoy_rate: The mean number of decoy domains per protein.
+    :param length_median: The median length of the log-normal distribution
+        of protein lengths. Proteins are extended to fit their domains.
+    :param length_sigma: The shape of the log-normal length distribution.
+    :param mutation_rate: The fraction of the domains' positions substituted
+        at random.
+    :param seed: A seed of the random generator.
+    :return: Counts of proteins by kind ("tkp", "pk", "other") and the total
+        number of "residues".
+    """
+    rng = np.random.default_rng(seed)
+    kinases = [s for p in profiles if p.category == "Family" for s in p.domains]
+    decoys = [
+        p.domains
+        for p in profiles
+        if p.category != "Family" and decode_name(p.hmm.name) != PK_PROFILE_NAME
+    ]
+    counts = {"tkp": 0, "pk": 0, "other": 0, "residues": 0}
+
+    kinds = rng.choice(
+        ["tkp", "pk", "other"],
+        size=num_proteins,
+        p=[tkp_rate, pk_rate, 1 - tkp_rate - pk_rate],
+    )
+    lengths = rng.lognormal(np.log(length_median), length_sigma, size=num_proteins)
+    with path.open("w") as f:
+        for i, (kind, length) in enumerate(zip(kinds, lengths.astype(int))):
+            num_kinases = {"tkp": rng.choice([2, 3], p=[0.9, 0.1]), "pk": 1}
+            domains = [
+                mutate(rng, kinases[rng.integers(len(kinases))], mutation_rate)
+                for _ in range(num_kinases.get(kind, 0))
+            ]
+            for _ in range(rng.poisson(decoy_rate)):
+                group = decoys[rng.integers(len(decoys))]
+                domains.append(
+                    mutate(rng, group[rng.integers(len(group))], mutation_rate)
+                )
+            rng.shuffle(domains)
+            # Split the background residues into linkers between the domains
+            num_background = max(length - sum(map(len, domains)), 10)
+            cuts = np.sort(rng.integers(0, num_background + 1, size=len(domains)))
+            linkers = np.diff(cuts, prepend=0, append=num_background)
+            parts = [random_sequence(rng, linkers[0])]
+            for domain, linker in zip(domains, linkers[1:]):
+                parts += [domain, random_sequence(rng, linker)]
+            seq = "M" + "".join(parts)
+            f.write(f">SYN{i:07} kind={kind}\n{seq}\n")
+            counts[kind] += 1
+            counts["residues"] += len(seq)
+    return counts
+
+
+if __name__ == "__main__":
+    raise RuntimeError
@@ -0,0 +1,570 @@
+"""
+Offline benchmarks of the tkp-finder stages on synthetic data.
+
+The profiles are built from the `Appendix_4` alignments (see
+:mod:`benchmarks.data`), so no downloads are needed. For instance::
+
+    python -m benchmarks.run -n 1000 -n 10000 -o bench.json
+    python -m benchmarks.run -n 1000 -n 10000 --baseline bench.json
+
+Each stage is timed `repeats` times on fresh copies of its inputs. The
+results are written as JSON with a record per stage and input size holding
+the wall times, the throughput of the median run and the peak RSS.
+"""
+import json
+import logging
+import os
+import pickle
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import typing as t
+from collections import abc
+from datetime import datetime, timezone
+from pathlib import Path
+
+import click
+
+from benchmarks.data import (
+    DECOY_CATEGORIES,
+    build_profiles,
+    generate_proteome,
+    write_pfam,
+)
+from tkp_finder.__about__ import __version__
+from tkp_finder.constants import PFAM_PK_NAME, PK_NAME
+from tkp_finder.hmm import decode_name, load_profiles
+from tkp_finder.metrics import peak_rss, reset_peak_rss
+from tkp_finder.tkp_finder import (
+    VARIABLES,
+    aggregate_annotations,
+    annotate_by_hmms,
+    annotate_ppks,
+    calculate_variables,
+    filter_child_overlaps,
+    find_tkps,
+    format_summaries,
+    hit_score,
+    run_setup,
+    split_hmm,
+)
+
+LOGGER = logging.getLogger("benchmarks")
+
+#: Bumped on incompatible changes of the output's layout
+SCHEMA_VERSION = 1
+CATEGORIES = ("Family", *DECOY_CATEGORIES)
+STAGES = (
+    "split_hmm",
+    "setup",
+    "find_tkps",
+    "annotate_by_hmms",
+    "filter_child_overlaps",
+    "calculate_variables",
+    "annotate_ppks",
+    "aggregate_annotations",
+    "format_summaries",
+)
+# The CLI defaults of `tkp-finder find`
+MIN_HMM_SCORE = 0.0
+MIN_HMM_COV = 0.5
+
+
+def measure(
+    fn: abc.Callable[..., t.Any],
+    prepare: abc.Callable[[], tuple] = tuple,
+    repeats: int = 3,
+) -> dict[str, t.Any]:
+    """
+    :param fn: A function to time.
+    :param prepare: A function returning fresh arguments of `fn` before each
+        run. It's not timed.
+    :param repeats: The number of runs.
+    :return: A partial record with wall times of each run, the median wall
+        time and the peak RSS across the runs.
+    """
+    times, rss = [], []
+    for _ in range(repeats):
+        args = prepare()
+        reset_peak_rss()
+        start = time.perf_counter()
+        fn(*args)
+        times.append(time.perf_counter() - start)
+        rss.append(peak_rss())
+    return {
+        "times": times,
+        "wall_time": statistics.median(times),
+        "peak_rss_mb": None if None in rss else max(rss) / 2**20,
+    }
+
+
+def record(
+    stage: str,
+    items: int,
+    unit: str,
+    measured: dict[str, t.Any],
+    num_proteins: int | None = None,
+    **extra,
+) -> dict[str, t.Any]:
+    wall_time = measured["wall_time"]
+    res = {
+        "stage": stage,
+        "num_proteins": num_proteins,
+        "items": items,
+        "unit": unit,
+        **measured,
+        "throughput": items / wall_time if wall_time > 0 else None,
+        **extra,
+    }
+    LOGGER.info(
+        f"{stage} (n={num_proteins}): {wall_time:.3f}s, "
+        f"{res['throughput'] or 0:.1f} {unit}/s, "
+        f"{res['peak_rss_mb'] or 0:.1f} MB"
+    )
+    return res
+
+
+def bench_setup(
+    work_dir: Path,
+    path_pfam_a: Path,
+    path_pfam_dat: Path,
+    categories: dict[str, str],
+    stages: abc.Container[str],
+    repeats: int,
+) -> list[dict[str, t.Any]]:
+    """
+    Time splitting and pressing the Pfam-like release from scratch.
+
+    :param categories: A mapping from accessions to categories.
+    """
+    records, out = [], work_dir / "setup"
+
+    def fresh_dir():
+        shutil.rmtree(out, ignore_errors=True)
+        out.mkdir()
+        return (out,)
+
+    def get_path(record):
+        accession = decode_name(record.accession).split(".")[0]
+        return out / "profiles" / categories[accession] / f"{accession}.hmm"
+
+    if "split_hmm" in stages:
+        measured = measure(
+            lambda _: split_hmm(path_pfam_a, get_path), fresh_dir, repeats
+        )
+        records.append(record("split_hmm", len(categories), "profile", measured))
+    if "setup" in stages:
+        measured = measure(
+            lambda x: run_setup(
+                x, path_pfam_a=path_pfam_a, path_pfam_dat=path_pfam_dat, quiet=True
+            ),
+            fresh_dir,
+            repeats,
+        )
+        records.append(record("setup", len(categories), "profile", measured))
+    shutil.rmtree(out, ignore_errors=True)
+    return records
+
+
+def bench_proteome(
+    path: Path,
+    hmm_dir: Path,
+    num_proteins: int,
+    stages: abc.Container[str],
+    repeats: int,
+    threads: int,
+    residues: int | None = None,
+) -> list[dict[str, t.Any]]:
+    """
+    Time the discovery and annotation stages on a synthetic proteome.
+    The stages following the discovery are given its copied results.
+
+    :param residues: The total length of the proteome's sequences.
+    :raises click.ClickException: If no TKPs are found.
+    """
+    records = []
+    kw = dict(num_proteins=num_proteins)
+    chains = find_tkps(
+        path,
+        profile=hmm_dir / f"{PFAM_PK_NAME}.hmm",
+        min_cov=MIN_HMM_COV,
+        min_score=MIN_HMM_SCORE,
+        threads=threads,
+    )
+    if len(chains) == 0:
+        # Timings of the stages following the discovery would be meaningless
+        raise click.ClickException(
+            f"Found no TKPs among {num_proteins} proteins: the synthetic "
+            f"proteome does not exercise the pipeline"
+        )
+    if "find_tkps" in stages:
+        measured = measure(
+            lambda: find_tkps(
+                path,
+                profile=hmm_dir / f"{PFAM_PK_NAME}.hmm",
+                min_cov=MIN_HMM_COV,
+                min_score=MIN_HMM_SCORE,
+                threads=threads,
+            ),
+            repeats=repeats,
+        )
+        records.append(
+            record(
+                "find_tkps",
+                num_proteins,
+                "seq",
+                measured,
+                found=len(chains),
+                residues=residues,
+                **kw,
+            )
+        )
+    dumped = pickle.dumps(chains)
+    hmms = {c: load_profiles(hmm_dir, c) for c in CATEGORIES}
+
+    def annotate(cs, category, resolve_overlaps=True):
+        return annotate_by_hmms(
+            cs,
+            hmms=hmms[category],
+            hmm_type=category,
+            threads=threads,
+            resolve_overlaps=resolve_overlaps,
+            min_score=MIN_HMM_SCORE,
+            min_cov_hmm=MIN_HMM_COV,
+        )
+
+    if "annotate_by_hmms" in stages:
+        for category in CATEGORIES:
+            measured = measure(
+                lambda cs: annotate(cs, category),
+                lambda: (pickle.loads(dumped),),
+                repeats,
+            )
+            records.append(
+                record(
+                    f"annotate_by_hmms:{category}",
+                    len(chains),
+                    "chain",
+                    measured,
+                    profiles=len(hmms[category]),
+                    **kw,
+                )
+            )
+
+    if "filter_child_overlaps" in stages:
+        overlapping = annotate(pickle.loads(dumped), "Family", False)
+        num_children = sum(len(c.children) for c in overlapping)
+        dumped_overlapping = pickle.dumps(overlapping)
+        measured = measure(
+            lambda cs: filter_child_overlaps(
+                cs, filt_fn=lambda x: x.name.startswith("Family"), val_fn=hit_score
+            ),
+            lambda: (pickle.loads(dumped_overlapping),),
+            repeats,
+        )
+        records.append(
+            record("filter_child_overlaps", num_children, "child", measured, **kw)
+        )
+
+    num_pks = len(chains.collapse_children())
+    if "calculate_variables" in stages:
+        measured = measure(
+            lambda cs: calculate_variables(cs, VARIABLES, map_name=PK_NAME),
+            lambda: (pickle.loads(dumped).collapse_children(),),
+            repeats,
+        )
+        records.append(record("calculate_variables", num_pks, "domain", measured, **kw))
+    if "annotate_ppks" in stages:
+        measured = measure(
+            annotate_ppks,
+            lambda: (pickle.loads(dumped).collapse_children(),),
+            repeats,
+        )
+        records.append(record("annotate_ppks", num_pks, "domain", measured, **kw))
+
+    if "aggregate_annotations" in stages or "format_summaries" in stages:
+        annotated = pickle.loads(dumped)
+        for category in CATEGORIES:
+            annotated = annotate(annotated, category)
+        annotate_ppks(annotated.collapse_children())
+        measured = measure(
+            lambda: aggregate_annotations(
+                annotated.collapse_children(), inp_name=path.stem
+            ),
+            repeats=repeats,
+        )
+        if "aggregate_annotations" in stages:
+            records.append(
+                record("aggregate_annotations", len(chains), "chain", measured, **kw)
+            )
+        df = aggregate_annotations(annotated.collapse_children(), inp_name=path.stem)
+        if "format_summaries" in stages:
+            measured = measure(
+                lambda: format_summaries(df, hmm_dir), repeats=repeats
+            )
+            records.append(record("format_summaries", len(df), "row", measured, **kw))
+
+    return records
+
+
+def find_regressions(
+    results: abc.Iterable[dict[str, t.Any]],
+    baseline: abc.Iterable[dict[str, t.Any]],
+    tolerance: float,
+) -> list[str]:
+    """
+    :param results: Records of the current run.
+    :param baseline: Records of a previous run.
+    :param tolerance: The allowed relative increase of the median wall time.
+    :return: A description of each stage slower than its baseline.
+    """
+    key = lambda x: (x["stage"], x["num_proteins"])
+    previous = {key(x): x for x in baseline}
+    regressions = []
+    for x in results:
+        y = previous.get(key(x))
+        if y is not None and x["wall_time"] > y["wall_time"] * (1 + tolerance):
+            regressions.append(
+                f"{x['stage']} (n={x['num_proteins']}): "
+                f"{y['wall_time']:.3f}s -> {x['wall_time']:.3f}s"
+            )
+    return regressions
+
+
+@click.command(
+    "benchmark", context_settings=dict(help_option_names=["-h", "--help"])
+)
+@click.option(
+    "-n",
+    "--num_proteins",
+    type=click.IntRange(min=1),
+    multiple=True,
+    default=(1000,),
+    show_default=True,
+    help="The size of a synthetic proteome. Can be used multiple times.",
+)
+@click.option(
+    "--tkp_rate",
+    type=click.FloatRange(0, 1),
+    default=0.05,
+    show_default=True,
+    help="The fraction of tandem kinases in a proteome.",
+)
+@click.option(
+    "--pk_rate",
+    type=click.FloatRange(0, 1),
+    default=0.1,
+    show_default=True,
+    help="The fraction of proteins with a single kinase domain.",
+)
+@click.option(
+    "--decoy_rate",
+    type=click.FloatRange(min=0),
+    default=1.0,
+    show_default=True,
+    help="The mean number of non-kinase domains per protein.",
+)
+@click.option(
+    "--length_median",
+    type=click.IntRange(min=1),
+    default=400,
+    show_default=True,
+    help="The median protein length (log-normally distributed).",
+)
+@click.option(
+    "--length_sigma",
+    type=click.FloatRange(min=0),
+    default=0.6,
+    show_default=True,
+    help="The shape parameter of the log-normal protein length distribution.",
+)
+@click.option(
+    "--mutation_rate",
+    type=click.FloatRange(0, 1),
+    default=0.1,
+    show_default=True,
+    help="The fraction of substituted residues in the embedded domains.",
+)
+@click.option(
+    "--families",
+    type=click.IntRange(min=1),
+    default=None,
+    help=(
+        "The number of `Appendix_4` alignments to build kinase family "
+        "profiles from. All are used by default."
+    ),
+)
+@click.option(
+    "-s",
+    "--stage",
+    "stages",
+    type=click.Choice(STAGES),
+    multiple=True,
+    help="Stages to benchmark. Can be used multiple times. All by default.",
+)
+@click.option(
+    "-r",
+    "--repeats",
+    type=click.IntRange(min=1),
+    default=3,
+    show_default=True,
+    help="The number of runs of each stage.",
+)
+@click.option(
+    "-T",
+    "--threads",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    help="The number of threads for HMM searches.",
+)
+@click.option("--seed", type=int, default=0, show_default=True)
+@click.option(
+    "-w",
+    "--work_dir",
+    type=click.Path(file_okay=False, dir_okay=True, writable=True),
+    help=(
+        "A directory for the generated data, kept after the run. "
+        "By default, a temporary directory is used."
+    ),
+)
+@click.option(
+    "-o",
+    "--output",
+    type=click.Path(file_okay=True, dir_okay=False, writable=True),
+    help="A path to write the JSON results to. By default, print them.",
+)
+@click.option(
+    "--baseline",
+    type=click.Path(exists=True, file_okay=True, dir_okay=False),
+    help=(
+        "A JSON output of a previous run. Exit with code 1 if any stage is "
+        "slower than in the baseline by more than `tolerance`."
+    ),
+)
+@click.option(
+    "--tolerance",
+    type=click.FloatRange(min=0),
+    default=0.25,
+    show_default=True,
+    help="The allowed relative slowdown of a stage compared to the baseline.",
+)
+@click.option("-q", "--quiet", is_flag=True, default=False)
+def benchmark(
+    num_proteins,
+    tkp_rate,
+    pk_rate,
+    decoy_rate,
+    length_median,
+    length_sigma,
+    mutation_rate,
+    families,
+    stages,
+    repeats,
+    threads,
+    seed,
+    work_dir,
+    output,
+    baseline,
+    tolerance,
+    quiet,
+):
+    """
+    Benchmark the tkp-finder stages on synthetic proteomes.
+    """
+    logging.basicConfig(format="%(asctime)s - %(levelname)s - %(message)s")
+    LOGGER.setLevel(logging.WARNING if quiet else logging.INFO)
+    if tkp_rate + pk_rate > 1:
+        raise click.BadParameter("`tkp_rate` + `pk_rate` must not exceed 1")
+    stages = set(stages or STAGES)
+    params = dict(
+        num_proteins=list(num_proteins),
+        tkp_rate=tkp_rate,
+        pk_rate=pk_rate,
+        decoy_rate=decoy_rate,
+        length_median=length_median,
+        length_sigma=length_sigma,
+        mutation_rate=mutation_rate,
+        families=families,
+        repeats=repeats,
+        threads=threads,
+        seed=seed,
+    )
+
+    is_tmp = work_dir is None
+    work_dir = Path(tempfile.mkdtemp() if is_tmp else work_dir)
+    work_dir.mkdir(exist_ok=True, parents=True)
+    try:
+        LOGGER.info("Building profiles")
+        profiles = build_profiles(families, seed)
+        path_pfam_a, path_pfam_dat = write_pfam(profiles, work_dir / "pfam")
+        hmm_dir = work_dir.absolute() / "hmm"
+        hmm_dir.mkdir(exist_ok=True)
+        run_setup(
+            hmm_dir,
+            path_pfam_a=path_pfam_a,
+            path_pfam_dat=path_pfam_dat,
+            quiet=True,
+        )
+        categories = {
+            decode_name(p.hmm.accession).split(".")[0]: p.category for p in profiles
+        }
+        results = bench_setup(
+            work_dir, path_pfam_a, path_pfam_dat, categories, stages, repeats
+        )
+
+        for n in num_proteins:
+            path = work_dir / f"proteome_{n}.fa"
+            LOGGER.info(f"Generating {path}")
+            counts = generate_proteome(
+                path,
+                profiles,
+                n,
+                tkp_rate=tkp_rate,
+                pk_rate=pk_rate,
+                decoy_rate=decoy_rate,
+                length_median=length_median,
+                length_sigma=length_sigma,
+                mutation_rate=mutation_rate,
+                seed=seed,
+            )
+            LOGGER.info(f"Generated {counts}")
+            results += bench_proteome(
+                path, hmm_dir, n, stages, repeats, threads, counts["residues"]
+            )
+    finally:
+        if is_tmp:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    doc = {
+        "schema": SCHEMA_VERSION,
+        "meta": {
+            "version": __version__,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "params": params,
+        "results": results,
+    }
+    text = json.dumps(doc, indent=2)
+    if output is None:
+        click.echo(text)
+    else:
+        Path(output).write_text(text)
+
+    if baseline is not None:
+        previous = json.loads(Path(baseline).read_text())["results"]
+        regressions = find_regressions(results, previous, tolerance)
+        for x in regressions:
+            click.echo(f"Regression: {x}", err=True)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,47 @@
+"""
+Shared fixtures: a small synthetic Pfam release and proteome built by the
+benchmark helpers (see :mod:`benchmarks.data`).
+"""
+from pathlib import Path
+
+import pytest
+
+from benchmarks.data import Profile, build_profiles, generate_proteome, write_pfam
+
+
+@pytest.fixture(scope="session")
+def profiles() -> list[Profile]:
+    return build_profiles(num_families=3)
+
+
+@pytest.fixture(scope="session")
+def proteome(tmp_path_factory, profiles) -> Path:
+    path = tmp_path_factory.mktemp("proteome") / "proteome.fa"
+    generate_proteome(path, profiles, 60, tkp_rate=0.3, pk_rate=0.2)
+    return path
+
+
+@pytest.fixture(scope="session")
+def hmm_dir(tmp_path_factory, profiles) -> Path:
+    from tkp_finder.tkp_finder import run_setup
+
+    base = tmp_path_factory.mktemp("pfam")
+    path_hmm, path_dat = write_pfam(profiles, base / "pfam")
+    hmm_dir = base / "hmm"
+    hmm_dir.mkdir()
+    run_setup(hmm_dir, path_pfam_a=path_hmm, path_pfam_dat=path_dat, quiet=True)
+    return hmm_dir
+
+
+@pytest.fixture(scope="session")
+def pk_profile_no_cutoffs(tmp_path_factory, profiles) -> Path:
+    """
+    The PK profile without the bit score cutoffs, so that its hits are
+    reported by E-values.
+    """
+    hmm = profiles[0].hmm.copy()
+    hmm.cutoffs.gathering = hmm.cutoffs.trusted = hmm.cutoffs.noise = None
+    path = tmp_path_factory.mktemp("pk") / "pk.hmm"
+    with path.open("wb") as f:
+        hmm.write(f)
+    return path
@@ -0,0 +1,77 @@
+import pandas as pd
+import pytest
+from lXtractor.core.chain import ChainList
+
+from tkp_finder.archive import ChainArchive
+from tkp_finder.constants import ARCHIVE_SUFFIX, PFAM_PK_NAME
+from tkp_finder.finder import TKPFinder
+from tkp_finder.tkp_finder import aggregate_annotations, run_find
+
+CATEGORIES = ["Family", "Domain", "Motif"]
+
+
+def tree(c) -> tuple:
+    """
+    :return: A comparable representation of a chain and its descendants.
+    """
+    return (
+        c.id,
+        c.name,
+        c.start,
+        c.end,
+        {k: c[k] for k in c.fields},
+        c.meta,
+        [tree(x) for x in c.children],
+    )
+
+
+@pytest.fixture(scope="module")
+def chains(hmm_dir, proteome) -> ChainList:
+    with TKPFinder(hmm_dir, categories=CATEGORIES) as finder:
+        return ChainList(finder.find(proteome))
+
+
+def test_round_trip(tmp_path, chains):
+    path = tmp_path / f"chains{ARCHIVE_SUFFIX}"
+    with ChainArchive(path) as archive:
+        archive.write(chains[:2])
+        archive.write(chains[2:])
+
+    with ChainArchive(path) as archive:
+        assert len(archive) == len(chains)
+        assert archive.ids() == [c.id for c in chains]
+        assert [tree(c) for c in archive] == [tree(c) for c in chains]
+        assert tree(archive[chains[-1].id]) == tree(chains[-1])
+        assert "missing" not in archive and archive.get("missing") is None
+        with pytest.raises(KeyError):
+            archive["missing"]
+
+        restored = ChainList(archive)
+    pd.testing.assert_frame_equal(
+        aggregate_annotations(restored.collapse_children()),
+        aggregate_annotations(chains.collapse_children()),
+    )
+
+
+def test_run_find_archive(tmp_path, hmm_dir, proteome, chains):
+    def find(name, chains_format):
+        return run_find(
+            [proteome],
+            hmm_dir,
+            tmp_path / name,
+            hmm_dir / f"{PFAM_PK_NAME}.hmm",
+            ann_type=CATEGORIES,
+            chains_format=chains_format,
+            quiet=True,
+        )
+
+    dirs, archived = find("dirs", "dirs"), find("archive", "archive")
+    assert archived.chains[proteome] == tmp_path / "archive" / (
+        f"{proteome.name}{ARCHIVE_SUFFIX}"
+    )
+    assert archived.summary.equals(dirs.summary)
+    assert (tmp_path / "archive" / "summary.tsv").read_text() == (
+        tmp_path / "dirs" / "summary.tsv"
+    ).read_text()
+    with ChainArchive(archived.chains[proteome]) as archive:
+        assert [tree(c) for c in archive] == [tree(c) for c in chains]
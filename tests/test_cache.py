@@ -0,0 +1,168 @@
+import pytest
+from pyhmmer.easel import SequenceFile
+from pyhmmer.plan7 import HMMFile
+
+from tkp_finder.cache import AnnotationCache, search_cached, stage_key
+from tkp_finder.constants import PFAM_PK_NAME
+from tkp_finder.finder import TKPFinder
+from tkp_finder.hmm import BatchHMMer
+from tkp_finder.tkp_finder import find_tkps, run_find
+
+CATEGORIES = ["Family", "Domain"]
+
+
+def tree(c) -> tuple:
+    """
+    :return: A comparable representation of a chain and its descendants.
+    """
+    return (
+        c.name,
+        c.start,
+        c.end,
+        {k: c[k] for k in c.fields},
+        c.meta,
+        [tree(x) for x in c.children],
+    )
+
+
+@pytest.fixture
+def block(proteome, profiles):
+    with SequenceFile(proteome, digital=True, alphabet=profiles[0].hmm.alphabet) as f:
+        seqs = f.read_block()
+    annotator = BatchHMMer([("PK", profiles[0].hmm)])
+    # Named by the index, as expected by `search_cached`
+    return annotator.digitize(s.textize().sequence for s in seqs)
+
+
+def search(profiles, block, cache, stage):
+    annotator = BatchHMMer([("PK", profiles[0].hmm)])
+    hits = search_cached(annotator, block, cache, stage, label="PK", min_score=0.0)
+    return annotator, hits
+
+
+def test_search_cached(tmp_path, profiles, block):
+    _, expected = search(profiles, block, None, None)
+    assert expected
+
+    stage = stage_key("discovery", "checksum", 0.0)
+    with AnnotationCache(tmp_path / "cache.db") as cache:
+        _, hits = search(profiles, block, cache, stage)
+        assert hits == expected
+        assert cache.stats["PK"] == [0, len(block)]
+
+    with AnnotationCache(tmp_path / "cache.db") as cache:
+        annotator, hits = search(profiles, block, cache, stage)
+        assert hits == expected
+        # Every sequence, including the ones without hits, is cached
+        assert cache.stats["PK"] == [len(block), len(block)]
+        assert annotator.hits_ is None
+
+        # Other parameters or profiles miss the cache
+        for other in (
+            stage_key("discovery", "checksum", 1.0),
+            stage_key("discovery", "other", 0.0),
+        ):
+            cache.stats.clear()
+            _, hits = search(profiles, block, cache, other)
+            assert hits == expected
+            assert cache.stats["PK"] == [0, len(block)]
+
+
+def test_finder_reuses_cache(tmp_path, hmm_dir, proteome):
+    def find(cache, **kwargs):
+        with TKPFinder(hmm_dir, categories=CATEGORIES, cache=cache, **kwargs) as f:
+            chains = [tree(c) for c in f.find(proteome)]
+            stats = None if f.cache is None else dict(f.cache.stats)
+        return chains, stats
+
+    expected, _ = find(None)
+    assert expected
+
+    cache = tmp_path / "cache.db"
+    chains, stats = find(cache)
+    assert chains == expected
+    assert all(cached == 0 for cached, _ in stats.values())
+
+    chains, stats = find(cache)
+    assert chains == expected
+    assert set(stats) == {"discovery", *CATEGORIES}
+    assert all(cached == total > 0 for cached, total in stats.values())
+
+    # Other thresholds miss the cache
+    _, stats = find(cache, min_hmm_score=1.0)
+    assert all(cached == 0 for cached, _ in stats.values())
+
+
+def test_run_find_reuses_cache(tmp_path, hmm_dir, proteome):
+    def find(name, cache):
+        return run_find(
+            [proteome],
+            hmm_dir,
+            tmp_path / name,
+            hmm_dir / f"{PFAM_PK_NAME}.hmm",
+            ann_type=CATEGORIES,
+            cache=cache,
+            quiet=True,
+        )
+
+    expected = find("base", None)
+    assert sum(expected.num_tkps.values()) > 0
+    for name in ("cached1", "cached2"):
+        res = find(name, tmp_path / "cache.db")
+        assert res.num_tkps == expected.num_tkps
+        assert res.summary.equals(expected.summary)
+        assert (tmp_path / name / "summary.tsv").read_text() == (
+            tmp_path / "base" / "summary.tsv"
+        ).read_text()
+
+
+
+def test_evalue_hits_do_not_depend_on_cache(tmp_path, proteome, pk_profile_no_cutoffs):
+    def discover(path, cache):
+        chains = find_tkps(
+            path, pk_profile_no_cutoffs, min_cov=0.5, min_score=0.0, cache=cache
+        )
+        return [tree(c) for c in chains]
+
+    expected = discover(proteome, None)
+    assert expected
+
+    with AnnotationCache(tmp_path / "cold.db") as cache:
+        cold, warm = discover(proteome, cache), discover(proteome, cache)
+
+    # A third of the sequences was searched within another input before
+    with SequenceFile(proteome, format="fasta") as f:
+        part = [f">{s.name}\n{s.sequence}\n" for s in f][::3]
+    (tmp_path / "part.fa").write_text("".join(part))
+    with AnnotationCache(tmp_path / "partial.db") as cache:
+        discover(tmp_path / "part.fa", cache)
+        partial = discover(proteome, cache)
+
+    assert cold == expected
+    assert warm == expected
+    assert partial == expected
+
+
+def test_evalue_hits_of_block_do_not_depend_on_cache(
+    tmp_path, block, pk_profile_no_cutoffs
+):
+    with HMMFile(pk_profile_no_cutoffs) as f:
+        hmm = f.read()
+
+    def search(seqs, cache):
+        # Unfiltered, so that the hits barely passing the E-value threshold
+        # are kept
+        annotator = BatchHMMer([("PK", hmm)])
+        assert annotator.uses_evalues
+        return search_cached(annotator, seqs, cache, "stage")
+
+    expected = search(block, None)
+    with AnnotationCache(tmp_path / "cache.db") as cache:
+        cold, warm = search(block, cache), search(block, cache)
+    with AnnotationCache(tmp_path / "partial.db") as cache:
+        search(block[::3], cache)
+        partial = search(block, cache)
+
+    assert cold == expected
+    assert warm == expected
+    assert partial == expected
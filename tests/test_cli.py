@@ -0,0 +1,21 @@
+import importlib.util
+
+import pytest
+from click.testing import CliRunner
+
+from tkp_finder.cli import tkp_finder
+
+
+@pytest.mark.skipif(
+    importlib.util.find_spec("pyarrow") is not None, reason="pyarrow is installed"
+)
+def test_find_requires_pyarrow_for_datasets(tmp_path):
+    fasta = tmp_path / "seqs.fa"
+    fasta.write_text(">seq\nMSTAV\n")
+    output = tmp_path / "out"
+    result = CliRunner().invoke(
+        tkp_finder, ["find", str(fasta), "-o", str(output), "-O", "parquet"]
+    )
+    assert result.exit_code == 2
+    assert "pip install pyarrow" in result.output
+    assert not output.exists()
@@ -0,0 +1,172 @@
+import threading
+import types
+from pathlib import Path
+
+import pytest
+from lXtractor.core.chain import ChainSequence
+
+import tkp_finder.deeptm
+from tkp_finder.deeptm import APP_NAME, DeepTMHMM
+
+
+class FakeJob:
+    def __init__(self, seqs: list[tuple[str, str]], polls: int, fail: bool):
+        self.seqs = seqs
+        self.polls = polls
+        self.fail = fail
+
+    def is_finished(self) -> bool:
+        self.polls -= 1
+        return self.polls < 0
+
+    def get_output_file(self, path: str):
+        assert path == "/TMRs.gff3"
+        if self.fail:
+            raise RuntimeError("The job failed")
+        # Every sequence is predicted as a single "inside" segment
+        data = "//\n".join(
+            f"# {header} Length: {len(seq)}\n{header}\tinside\t1\t{len(seq)}\n"
+            for header, seq in self.seqs
+        )
+        return types.SimpleNamespace(get_data=lambda: data.encode("utf-8"))
+
+
+class FakeApp:
+    """
+    Records the submitted jobs. The first `fail` jobs fail after polling.
+    """
+
+    def __init__(self, polls: int = 0, fail: int = 0, barrier=None):
+        self.polls = polls
+        self.fail = fail
+        self.barrier = barrier
+        self.jobs: list[FakeJob] = []
+        self.payloads: list[bytes] = []
+        self.lock = threading.Lock()
+
+    def cli(self, args: str, blocking: bool = True) -> FakeJob:
+        assert not blocking
+        path = Path(args.removeprefix("--fasta "))
+        payload = path.read_bytes()
+        lines = payload.decode("utf-8").split()
+        seqs = list(zip((x.removeprefix(">") for x in lines[::2]), lines[1::2]))
+        if self.barrier is not None:
+            self.barrier.wait()
+        with self.lock:
+            job = FakeJob(seqs, self.polls, fail=len(self.jobs) < self.fail)
+            self.jobs.append(job)
+            self.payloads.append(payload)
+        return job
+
+
+def fake_biolib(app: FakeApp) -> types.ModuleType:
+    biolib = types.ModuleType("biolib")
+    biolib.loaded = []
+    biolib.tokens = []
+
+    def load(name):
+        biolib.loaded.append(name)
+        return app
+
+    biolib.load = load
+    biolib.set_api_token = biolib.tokens.append
+    return biolib
+
+
+@pytest.fixture
+def sleeps(monkeypatch) -> list[float]:
+    slept = []
+    monkeypatch.setattr(tkp_finder.deeptm.time, "sleep", slept.append)
+    return slept
+
+
+def make_chains(num: int, size: int = 50) -> list[ChainSequence]:
+    aas = "ACDEFGHIKLMNPQRSTVWY"
+    return [
+        ChainSequence.from_string(
+            "".join(aas[(i + j) % len(aas)] for j in range(size + i)), name=f"s{i}"
+        )
+        for i in range(num)
+    ]
+
+
+def test_annotate_in_batches_by_size(sleeps):
+    app = FakeApp()
+    biolib = fake_biolib(app)
+    chains = make_chains(10)
+    max_bytes = 250
+
+    with DeepTMHMM(token="token", biolib=biolib, poll_interval=0) as tm:
+        children = list(tm.annotate(chains, max_bytes=max_bytes))
+
+    assert biolib.tokens == ["token"]
+    assert biolib.loaded == [APP_NAME]
+    # Each job's fasta is within the limit, and each sequence is sent once
+    assert len(app.jobs) > 1
+    assert all(len(x) <= max_bytes for x in app.payloads)
+    assert sum(len(job.seqs) for job in app.jobs) == len(chains)
+    assert [(c.parent.name, c.name, c.start, c.end) for c in children] == [
+        (c.name, "TM_inside", 1, len(c.seq1)) for c in chains
+    ]
+
+
+def test_submit_runs_jobs_concurrently(sleeps):
+    max_jobs = 3
+    # Each job blocks until `max_jobs` of them are submitted at once
+    barrier = threading.Barrier(max_jobs, timeout=10)
+    app = FakeApp(barrier=barrier)
+    chains = make_chains(max_jobs)
+
+    with DeepTMHMM(biolib=fake_biolib(app), max_jobs=max_jobs, poll_interval=0) as tm:
+        # A single sequence per job
+        futures = tm.submit(chains, max_bytes=1)
+        assert len(futures) == max_jobs
+        children = list(tm.collect(chains, futures))
+
+    assert not barrier.broken
+    assert len(app.jobs) == max_jobs
+    assert len(children) == len(chains)
+
+
+def test_wait_backs_off(sleeps):
+    tm = DeepTMHMM(biolib=fake_biolib(FakeApp()), poll_interval=1, max_poll_interval=3)
+    tm.wait(FakeJob([], polls=6, fail=False))
+    assert sleeps == [1, 1.5, 2.25, 3, 3, 3]
+
+
+def test_run_batch_resubmits_failed_jobs(sleeps):
+    app = FakeApp(polls=1, fail=1)
+    tm = DeepTMHMM(biolib=fake_biolib(app), retries=2, poll_interval=2)
+    batch = [("a", "MKVL"), ("b", "MSTAVE")]
+
+    res = tm.run_batch(batch)
+
+    assert len(app.jobs) == 2
+    assert {k: [(s.start, s.end, s.name) for s in v] for k, v in res.items()} == {
+        "a": [(1, 4, "inside")],
+        "b": [(1, 6, "inside")],
+    }
+    # A poll of each job and a delay before the resubmission
+    assert sleeps == [2, 2, 2]
+
+
+def test_run_batch_gives_up_after_retries(sleeps):
+    app = FakeApp(fail=3)
+    tm = DeepTMHMM(biolib=fake_biolib(app), retries=2, poll_interval=1)
+
+    with pytest.raises(RuntimeError, match="The job failed"):
+        tm.run_batch([("a", "MKVL")])
+
+    assert len(app.jobs) == 3
+    # The delays before the resubmissions grow exponentially
+    assert sleeps == [1, 2]
+
+
+def test_failed_job_fails_collect(sleeps):
+    app = FakeApp(fail=1)
+    chains = make_chains(2)
+
+    with DeepTMHMM(biolib=fake_biolib(app), retries=0, poll_interval=0) as tm:
+        futures = tm.submit(chains, max_bytes=1)
+        with pytest.raises(RuntimeError, match="1/2 DeepTMHMM jobs failed"):
+            list(tm.collect(chains, futures))
@@ -0,0 +1,172 @@
+from pathlib import Path
+
+import pytest
+
+import tkp_finder.tkp_finder as tf
+from tkp_finder.archive import ChainArchive
+from tkp_finder.checkpoint import CHECKPOINTS_DIR_NAME
+from tkp_finder.constants import PFAM_PK_NAME
+
+CATEGORIES = ["Family", "Domain", "Motif"]
+
+
+def tree(c) -> tuple:
+    return (
+        c.name,
+        c.start,
+        c.end,
+        {k: c[k] for k in c.fields},
+        c.meta,
+        [tree(x) for x in c.children],
+    )
+
+
+def find(hmm_dir: Path, fasta: list[Path], output: Path, **kwargs) -> tf.FindResult:
+    return tf.run_find(
+        fasta,
+        hmm_dir,
+        output,
+        hmm_dir / f"{PFAM_PK_NAME}.hmm",
+        ann_type=CATEGORIES,
+        chains_format="archive",
+        quiet=True,
+        **kwargs,
+    )
+
+
+def outputs(res: tf.FindResult) -> tuple:
+    """
+    :return: The chains and the summary tables written by a run.
+    """
+    chains = {}
+    for inp, path in res.chains.items():
+        with ChainArchive(path) as archive:
+            chains[inp] = [tree(c) for c in archive]
+    summaries = {p.name: p.read_text() for p in res.summaries if p.is_file()}
+    return chains, summaries, res.summary
+
+
+@pytest.fixture(scope="module")
+def expected(tmp_path_factory, hmm_dir, proteome):
+    res = find(hmm_dir, [proteome], tmp_path_factory.mktemp("expected"))
+    assert sum(res.num_tkps.values()) > 0
+    return outputs(res)
+
+
+def test_resume_after_interruption(tmp_path, monkeypatch, hmm_dir, proteome, expected):
+    annotate = tf.annotate_by_hmms
+    calls, interrupt = [], ["Domain"]
+
+    def annotate_or_interrupt(chains, hmm_type, **kwargs):
+        calls.append(hmm_type)
+        if hmm_type in interrupt:
+            raise KeyboardInterrupt
+        return annotate(chains, hmm_type=hmm_type, **kwargs)
+
+    monkeypatch.setattr(tf, "annotate_by_hmms", annotate_or_interrupt)
+    with pytest.raises(KeyboardInterrupt):
+        find(hmm_dir, [proteome], tmp_path)
+    assert calls == ["Family", "Domain"]
+    assert (tmp_path / CHECKPOINTS_DIR_NAME).is_dir()
+
+    # The discovery and the Family annotation are taken from the checkpoints
+    calls.clear()
+    interrupt.clear()
+    monkeypatch.setattr(tf, "find_tkps", None)
+    res = find(hmm_dir, [proteome], tmp_path, resume=True)
+
+    assert calls == ["Domain", "Motif"]
+    chains, summaries, summary = outputs(res)
+    assert chains == {proteome: expected[0][proteome]}
+    assert summaries == expected[1]
+    assert summary.equals(expected[2])
+    # A completed run leaves no checkpoints behind
+    assert not (tmp_path / CHECKPOINTS_DIR_NAME).exists()
+
+
+def test_resume_refuses_other_params(tmp_path, monkeypatch, hmm_dir, proteome):
+    def interrupted(*args, **kwargs):
+        raise KeyboardInterrupt
+
+    with monkeypatch.context() as m:
+        m.setattr(tf, "annotate_by_hmms", interrupted)
+        with pytest.raises(KeyboardInterrupt):
+            find(hmm_dir, [proteome], tmp_path)
+
+    checkpoints = sorted((tmp_path / CHECKPOINTS_DIR_NAME).rglob("*"))
+    with pytest.raises(ValueError, match="min_hmm_cov"):
+        find(hmm_dir, [proteome], tmp_path, resume=True, min_hmm_cov=0.7)
+    # The checkpoints are kept for a resumption with the original parameters
+    assert sorted((tmp_path / CHECKPOINTS_DIR_NAME).rglob("*")) == checkpoints
+
+
+@pytest.fixture(scope="module")
+def with_duplicates(tmp_path_factory, proteome) -> Path:
+    # The proteome followed by its renamed copy, so that every sequence is
+    # repeated in another shard
+    text = proteome.read_text()
+    path = tmp_path_factory.mktemp("duplicates") / "duplicates.fa"
+    path.write_text(text + text.replace(">SYN", ">DUP"))
+    return path
+
+
+def test_split_fasta(with_duplicates):
+    data = with_duplicates.read_bytes()
+    shards = tf.split_fasta(with_duplicates, 4096)
+
+    assert len(shards) > 2
+    assert shards[0].start == 0 and shards[-1].end == len(data)
+    assert all(a.end == b.start for a, b in zip(shards, shards[1:]))
+    assert all(data[s.start : s.start + 1] == b">" for s in shards)
+    assert b"".join(s.open().read() for s in shards) == data
+
+
+def test_merge_shards(proteome):
+    shards = tf.split_fasta(proteome, 4096)
+    shards = [shards[:2], shards[2:3], shards[3:5]]
+    results = [tf.ChainList([]), None, tf.ChainList([]), None, tf.ChainList([])]
+    merged = list(tf.merge_shards(shards, results))
+    # A failed shard fails its whole input
+    assert merged[0] is None and merged[2] is None
+    assert merged[1] is not None and len(merged[1]) == 0
+
+
+def test_sharded_find_matches_unsharded(
+    tmp_path, monkeypatch, hmm_dir, proteome, with_duplicates
+):
+    fasta = [proteome, with_duplicates]
+    unsharded = find(hmm_dir, fasta, tmp_path / "unsharded")
+    # Duplicates are reported once
+    assert unsharded.num_tkps[with_duplicates] == unsharded.num_tkps[proteome]
+
+    split_fasta = tf.split_fasta
+    num_shards = []
+
+    def split_small(path, shard_size):
+        shards = split_fasta(path, 4096)
+        num_shards.append(len(shards))
+        return shards
+
+    monkeypatch.setattr(tf, "split_fasta", split_small)
+    sharded = find(hmm_dir, fasta, tmp_path / "sharded", num_proc=2)
+
+    assert all(x > 1 for x in num_shards)
+    assert sharded.num_tkps == unsharded.num_tkps
+    chains, summaries, summary = outputs(sharded)
+    expected_chains, expected_summaries, expected_summary = outputs(unsharded)
+    assert chains == expected_chains
+    assert summaries == expected_summaries
+    assert summary.equals(expected_summary)
+
+
+def test_failed_shard_fails_input(tmp_path, monkeypatch, hmm_dir, proteome):
+    split_fasta = tf.split_fasta
+
+    def split_broken(path, shard_size):
+        # The second shard holds a truncated record failing to parse
+        shards = split_fasta(path, 4096)
+        return [shards[0], tf.Shard(path, shards[1].start, shards[1].start + 1)]
+
+    monkeypatch.setattr(tf, "split_fasta", split_broken)
+    res = find(hmm_dir, [proteome], tmp_path, num_proc=2)
+    assert res.num_tkps == {}
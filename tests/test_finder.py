@@ -0,0 +1,105 @@
+from pathlib import Path
+
+import pytest
+from pyhmmer.easel import SequenceFile
+
+from benchmarks.data import write_pfam
+from tkp_finder.archive import ChainArchive
+from tkp_finder.constants import PFAM_PK_NAME
+from tkp_finder.finder import TKPFinder, count_input
+from tkp_finder.tkp_finder import find_tkps, run_find, run_setup
+
+CATEGORIES = ["Family", "Domain", "Motif"]
+
+
+def domains(c) -> tuple:
+    # The children found by `TKPFinder` are renamed and given the motif by
+    # the PPK annotation
+    ignored = ("id", "name", "motif")
+    return c.name, c.seq1, [
+        (x.start, x.end, {k: v for k, v in x.meta.items() if k not in ignored})
+        for x in c.children
+    ]
+
+
+@pytest.mark.parametrize("block_size", [7, 1000])
+def test_discovery_matches_find_tkps(
+    hmm_dir, proteome, pk_profile_no_cutoffs, block_size
+):
+    expected = find_tkps(proteome, pk_profile_no_cutoffs, min_cov=0.5, min_score=0.0)
+    assert expected
+
+    with TKPFinder(
+        hmm_dir, pk_profile_no_cutoffs, categories=[], block_size=block_size
+    ) as finder:
+        chains = list(finder.find(proteome))
+
+    assert [domains(c) for c in chains] == [domains(c) for c in expected]
+
+
+def tree(c) -> tuple:
+    return (
+        c.name,
+        c.start,
+        c.end,
+        {k: c[k] for k in c.fields},
+        c.meta,
+        [tree(x) for x in c.children],
+    )
+
+
+@pytest.fixture(scope="module")
+def hmm_dir_no_cutoffs(tmp_path_factory, profiles) -> Path:
+    # Category profiles whose hits are reported by E-values
+    stripped = []
+    for p in profiles:
+        hmm = p.hmm.copy()
+        hmm.cutoffs.gathering = hmm.cutoffs.trusted = hmm.cutoffs.noise = None
+        stripped.append(p._replace(hmm=hmm))
+    base = tmp_path_factory.mktemp("pfam_no_cutoffs")
+    path_hmm, path_dat = write_pfam(stripped, base / "pfam")
+    hmm_dir = base / "hmm"
+    hmm_dir.mkdir()
+    run_setup(hmm_dir, path_pfam_a=path_hmm, path_pfam_dat=path_dat, quiet=True)
+    return hmm_dir
+
+
+@pytest.mark.parametrize(
+    "no_cutoffs,block_size",
+    # Without the cutoffs, a block must span the input to match `find`
+    [(False, 7), (False, 1000), (True, 1000)],
+)
+def test_annotations_match_run_find(
+    request, tmp_path, hmm_dir, proteome, no_cutoffs, block_size
+):
+    if no_cutoffs:
+        hmm_dir = request.getfixturevalue("hmm_dir_no_cutoffs")
+    res = run_find(
+        [proteome],
+        hmm_dir,
+        tmp_path,
+        hmm_dir / f"{PFAM_PK_NAME}.hmm",
+        ann_type=CATEGORIES,
+        chains_format="archive",
+        quiet=True,
+    )
+    with ChainArchive(res.chains[proteome]) as archive:
+        expected = [tree(c) for c in archive]
+    assert expected
+
+    with TKPFinder(hmm_dir, categories=CATEGORIES, block_size=block_size) as finder:
+        assert finder.pk_hmm.cutoffs.trusted_available() != no_cutoffs
+        chains = [tree(c) for c in finder.find(proteome)]
+
+    assert chains == expected
+
+
+def test_count_input(proteome):
+    with SequenceFile(proteome, format="fasta") as f:
+        pairs = [(s.name, s.sequence) for s in f]
+
+    assert count_input(proteome) == ([proteome], len(pairs))
+    assert count_input([str(proteome), *pairs[:2]])[1] == len(pairs) + 2
+    # One-shot iterables are read into memory
+    sequences, num = count_input(iter(pairs))
+    assert sequences == pairs and num == len(pairs)
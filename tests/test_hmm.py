@@ -0,0 +1,36 @@
+import pytest
+from pyhmmer.easel import SequenceFile
+
+from tkp_finder.hmm import BatchHMMer
+
+
+@pytest.fixture(scope="module")
+def seqs(proteome) -> list[str]:
+    with SequenceFile(proteome, format="fasta") as f:
+        return [s.sequence for s in f]
+
+
+def search(hmm, seqs: list[str], cpus: int, **kwargs) -> BatchHMMer:
+    hmmer = BatchHMMer([("PK", hmm)], bit_cutoffs=None, cpus=cpus)
+    hmmer.search(hmmer.digitize(seqs), **kwargs)
+    return hmmer
+
+
+def domains(hmmer: BatchHMMer) -> list[tuple]:
+    return sorted(
+        (hit.name, d.env_from, d.env_to, d.i_evalue, d.c_evalue, d.reported)
+        for hit in hmmer.hits_[0]
+        for d in hit.domains
+    )
+
+
+@pytest.mark.parametrize("kwargs", [{}, {"domZ": 10}], ids=["default", "domZ"])
+def test_sharded_search_matches_whole(profiles, seqs, kwargs):
+    hmm = profiles[0].hmm
+    whole, sharded = search(hmm, seqs, 1, **kwargs), search(hmm, seqs, 4, **kwargs)
+
+    (hits_whole,), (hits_sharded,) = whole.hits_, sharded.hits_
+    assert hits_whole.domZ > 0
+    assert (hits_sharded.Z, hits_sharded.domZ) == (hits_whole.Z, hits_whole.domZ)
+    assert domains(sharded) == domains(whole)
+    assert sorted(sharded.iter_hits()) == sorted(whole.iter_hits())
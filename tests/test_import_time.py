@@ -0,0 +1,66 @@
+"""
+The CLI imports its heavy dependencies only once a command needs them
+(see :mod:`tkp_finder.cli`). Each check runs in a fresh interpreter, and the
+heavy modules are those newly loaded by the measured code, so the modules
+imported at the interpreter's startup (e.g., by a `sitecustomize`) are not
+counted against it.
+"""
+import json
+import subprocess
+import sys
+
+import pytest
+
+HEAVY_MODULES = ("pandas", "numpy", "pyhmmer", "lXtractor")
+
+_PROBE = """
+import json, sys, time
+before = set(sys.modules)
+started = time.perf_counter()
+{code}
+elapsed = time.perf_counter() - started
+loaded = {{m.split(".")[0] for m in set(sys.modules) - before}}
+print(json.dumps({{"elapsed": elapsed, "loaded": sorted(loaded)}}), file=sys.stderr)
+"""
+
+
+def probe(code: str) -> tuple[float, set[str]]:
+    """
+    :param code: Code to run in a new interpreter.
+    :return: The seconds taken by the `code` and the top-level packages it
+        imported.
+    """
+    proc = subprocess.run(
+        [sys.executable, "-c", _PROBE.format(code=code)],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    res = json.loads(proc.stderr.strip().splitlines()[-1])
+    return res["elapsed"], set(res["loaded"])
+
+
+@pytest.mark.parametrize(
+    "code,budget",
+    [
+        ("import tkp_finder.cli", 0.2),
+        (
+            "from tkp_finder.cli import tkp_finder\n"
+            "tkp_finder(['--help'], standalone_mode=False)",
+            0.35,
+        ),
+        (
+            "from tkp_finder.cli import tkp_finder\n"
+            "tkp_finder(['find', '--help'], standalone_mode=False)",
+            0.35,
+        ),
+    ],
+    ids=["import", "help", "find-help"],
+)
+def test_cli_is_light(code, budget):
+    # The best of several runs to tolerate a busy machine
+    runs = [probe(code) for _ in range(3)]
+    elapsed = min(x for x, _ in runs)
+    loaded = set.union(*(x for _, x in runs))
+    assert not loaded & set(HEAVY_MODULES)
+    assert elapsed < budget
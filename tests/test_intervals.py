@@ -0,0 +1,95 @@
+from itertools import combinations
+
+import numpy as np
+import pytest
+
+from tkp_finder.intervals import select_non_overlapping
+
+
+def overlap(a: tuple[int, int], b: tuple[int, int]) -> bool:
+    # Closed intervals
+    return a[0] <= b[1] and b[0] <= a[1]
+
+
+def brute_force(starts, ends, scores) -> float:
+    """
+    :return: The best total score of non-overlapping intervals of one group.
+    """
+    intervals = list(zip(starts, ends))
+    best = 0.0
+    for k in range(1, len(intervals) + 1):
+        for idx in combinations(range(len(intervals)), k):
+            if any(overlap(intervals[i], intervals[j]) for i, j in combinations(idx, 2)):
+                continue
+            best = max(best, sum(scores[i] for i in idx))
+    return best
+
+
+def check(groups, starts, ends, scores):
+    groups, starts, ends, scores = map(np.asarray, (groups, starts, ends, scores))
+    selected = select_non_overlapping(groups, starts, ends, scores)
+
+    assert selected.dtype == bool and len(selected) == len(starts)
+    assert (scores[selected] > 0).all()
+    for g in np.unique(groups):
+        is_group = groups == g
+        chosen = np.flatnonzero(selected & is_group)
+        for i, j in combinations(chosen, 2):
+            assert not overlap((starts[i], ends[i]), (starts[j], ends[j]))
+        assert scores[chosen].sum() == brute_force(
+            starts[is_group], ends[is_group], scores[is_group]
+        )
+    return selected
+
+
+@pytest.mark.parametrize(
+    "starts,ends,scores,expected",
+    [
+        # Touching boundaries overlap
+        ([1, 5], [5, 8], [1, 2], [False, True]),
+        ([1, 6], [5, 8], [1, 2], [True, True]),
+        # Zero-length intervals
+        ([3, 3], [3, 3], [1, 2], [False, True]),
+        ([1, 5, 9], [5, 5, 9], [2, 1, 1], [True, False, True]),
+        ([1, 2], [4, 2], [1, 1.5], [False, True]),
+        # Non-positive scores are never selected
+        ([1, 10], [5, 12], [0, -1], [False, False]),
+        # Two short intervals beat a long one covering both
+        ([1, 1, 6], [10, 5, 10], [3, 2, 2], [False, True, True]),
+    ],
+)
+def test_cases(starts, ends, scores, expected):
+    selected = check(np.zeros(len(starts), dtype=int), starts, ends, scores)
+    assert selected.tolist() == expected
+
+
+def test_ties():
+    # Equal totals: either the long interval or both of the short ones
+    selected = check([0, 0, 0], [1, 1, 6], [10, 5, 10], [4, 2, 2])
+    assert selected.tolist() in ([True, False, False], [False, True, True])
+    # Identical intervals
+    selected = check([0, 0, 0], [2, 2, 2], [6, 6, 6], [1, 1, 1])
+    assert selected.sum() == 1
+
+
+def test_groups_are_independent():
+    # Overlapping coordinates in distinct, unsorted groups
+    selected = check([1, 0, 1, 0], [1, 1, 3, 3], [5, 5, 8, 8], [1, 1, 2, 2])
+    assert selected.tolist() == [False, False, True, True]
+
+
+def test_empty():
+    assert len(select_non_overlapping(*[np.array([], dtype=int)] * 4)) == 0
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_random(seed):
+    rng = np.random.default_rng(seed)
+    n = rng.integers(1, 25)
+    # Small coordinates and integer scores make touching, zero-length and
+    # tied intervals frequent
+    starts = rng.integers(-3, 15, n)
+    ends = starts + rng.integers(0, 6, n)
+    scores = rng.integers(-1, 4, n).astype(float)
+    groups = rng.integers(0, 3, n) * 7 - 5
+    check(groups, starts, ends, scores)
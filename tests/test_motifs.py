@@ -0,0 +1,120 @@
+import pickle
+
+import pytest
+from lXtractor.core.chain import ChainList, ChainSequence
+
+from tkp_finder.constants import MOTIF, PK_NAME, PPK_NAME
+from tkp_finder.tkp_finder import (
+    VARIABLES,
+    annotate_ppks,
+    calculate_variables,
+    extract_motifs,
+    find_tkps,
+    is_ppk,
+)
+
+POSITIONS = [v.p for v in VARIABLES]
+
+
+def annotate_ppks_by_variables(chains: ChainList) -> ChainList:
+    """
+    Annotate PPKs as before :func:`extract_motifs`: by calculating the motif
+    residues as sequence variables, missing ones filled with "X".
+    """
+    pks = chains.filter(lambda x: PK_NAME in x)
+    vs_df = calculate_variables(pks, VARIABLES, PK_NAME).fillna("X")
+    id2motif = {x[0]: "".join(x[1:]) for x in vs_df.itertuples(index=False)}
+    for c in chains:
+        chain_motif = id2motif.get(c.id)
+        if chain_motif is None:
+            c.meta["motif"] = "-"
+            continue
+        if any(m != "X" and m != x for m, x in zip(MOTIF, chain_motif)):
+            c.name = c.name.replace(PK_NAME, PPK_NAME)
+        c.meta["motif"] = chain_motif
+    return chains
+
+
+def pk_chain(
+    name: str, motif: str, gaps: tuple[int, ...] = (), insert: int = 0
+) -> ChainSequence:
+    """
+    :param name: A chain name.
+    :param motif: Residues at the motif positions.
+    :param gaps: Profile positions missing from the alignment.
+    :param insert: The number of unaligned residues preceding the domain.
+    :return: A chain with the PK numbering of a 150-long profile.
+    """
+    residues, numbering = ["G"] * insert, [None] * insert
+    for p in range(1, 151):
+        if p in gaps:
+            continue
+        residues.append(motif[POSITIONS.index(p)] if p in POSITIONS else "A")
+        numbering.append(p)
+    c = ChainSequence.from_string("".join(residues), name=name)
+    c.add_seq(PK_NAME, numbering)
+    return c
+
+
+def synthetic_chains() -> ChainList:
+    return ChainList(
+        [
+            pk_chain(f"{PK_NAME}_1", "KEHRDDFG"),
+            pk_chain(f"{PK_NAME}_2", "KEHRDDFG", insert=7),
+            # A pseudo kinase lacking the HRD Asp
+            pk_chain(f"{PK_NAME}_3", "KEHRNDFG"),
+            # Gaps at fixed and variable motif positions
+            pk_chain(f"{PK_NAME}_4", "KEHRDDFG", gaps=(30,)),
+            pk_chain(f"{PK_NAME}_5", "KEHRDDFG", gaps=(48, 121, 142, 143)),
+            pk_chain(f"{PK_NAME}_6", "KEHRDDFG", gaps=(123, 141), insert=3),
+            # Without the PK numbering
+            ChainSequence.from_string("MKVLAAG", name="Other_1"),
+        ]
+    )
+
+
+@pytest.fixture(scope="module")
+def discovered(proteome, profiles) -> ChainList:
+    chains = find_tkps(proteome, profiles[0].hmm, min_cov=0.5, min_score=0.0)
+    children = chains.collapse_children()
+    assert len(children.filter(lambda x: PK_NAME in x)) > 0
+    return children
+
+
+def test_extract_motifs():
+    chains = synthetic_chains()
+    assert extract_motifs(chains[:-1], POSITIONS) == [
+        "KEHRDDFG",
+        "KEHRDDFG",
+        "KEHRNDFG",
+        "XEHRDDFG",
+        "KXXRDDXX",
+        "KEHRXXFG",
+    ]
+    assert extract_motifs([], POSITIONS) == []
+    # Missing fixed residues make a pseudo kinase
+    assert is_ppk(
+        ["KEHRDDFG", "KEHRNDFG", "XEHRDDFG", "KXXRDDXX", "KEHRXXFG"]
+    ).tolist() == [False, True, True, False, True]
+
+
+@pytest.mark.parametrize("source", ["synthetic", "discovered"])
+def test_annotate_ppks_matches_variables(source, request):
+    chains = (
+        synthetic_chains() if source == "synthetic" else request.getfixturevalue(source)
+    )
+    expected = annotate_ppks_by_variables(pickle.loads(pickle.dumps(chains)))
+    annotated = annotate_ppks(pickle.loads(pickle.dumps(chains)))
+
+    assert [(c.name, c.meta["motif"]) for c in annotated] == [
+        (c.name, c.meta["motif"]) for c in expected
+    ]
+    names = {c.name.partition("_")[0] for c in expected}
+    assert PPK_NAME in names
+    if source == "synthetic":
+        assert PK_NAME in names
+
+
+def test_annotate_ppks_validates_motif():
+    with pytest.raises(ValueError, match="must have 8 residues"):
+        annotate_ppks(synthetic_chains(), motif="KXXXDD")
@@ -0,0 +1,27 @@
+import pytest
+
+from tkp_finder.tkp_finder import yield_parallel
+
+
+def square(x: int) -> int:
+    if x < 0:
+        raise ValueError(x)
+    return x * x
+
+
+@pytest.mark.parametrize("num_proc,lookahead", [(1, 0), (2, 2)])
+def test_yield_parallel_bounds_submitted(num_proc, lookahead):
+    pulled = []
+
+    def objs():
+        for x in [1, 2, -3, 4, 5, 6, 7]:
+            pulled.append(x)
+            yield x
+
+    results = []
+    for res in yield_parallel(square, num_proc, objs(), lookahead=lookahead):
+        results.append(res)
+        # The objects in flight besides the yielded ones
+        assert len(pulled) - len(results) <= num_proc + lookahead
+
+    assert results == [1, 4, None, 16, 25, 36, 49]
@@ -0,0 +1,191 @@
+import json
+import threading
+import time
+from http.client import HTTPConnection
+from http.server import ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+import tkp_finder.tkp_finder as tf
+from tkp_finder.constants import PFAM_PK_NAME
+from tkp_finder.serve import FinderService, RequestHandler, parse_job
+
+CATEGORIES = ["Family", "Domain"]
+
+
+class Client:
+    def __init__(self, port: int):
+        self.port = port
+
+    def request(self, method: str, path: str, body: bytes | None = None):
+        conn = HTTPConnection("127.0.0.1", self.port, timeout=60)
+        try:
+            conn.request(method, path, body)
+            resp = conn.getresponse()
+            return resp.status, json.loads(resp.read()), resp.headers
+        finally:
+            conn.close()
+
+    def post(self, payload, path: str = "/jobs"):
+        body = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+        status, res, _ = self.request("POST", path, body)
+        return status, res
+
+    def get(self, path: str):
+        status, res, _ = self.request("GET", path)
+        return status, res
+
+    def poll(self, job_id: str, timeout: float = 120) -> dict:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            status, job = self.get(f"/jobs/{job_id}")
+            assert status == 200
+            if job["status"] in ("completed", "failed"):
+                return job
+            time.sleep(0.1)
+        raise TimeoutError(f"The job {job_id} isn't done in {timeout}s")
+
+
+@pytest.fixture
+def gate(tmp_path, monkeypatch) -> Path:
+    """
+    Jobs of the service started afterward wait for the file to exist.
+    """
+    path = tmp_path / "gate"
+    run_find = tf.run_find
+
+    def gated(*args, **kwargs):
+        while not path.exists():
+            time.sleep(0.05)
+        return run_find(*args, **kwargs)
+
+    # Inherited by the forked workers
+    monkeypatch.setattr(tf, "run_find", gated)
+    return path
+
+
+@pytest.fixture
+def client(tmp_path, hmm_dir, gate):
+    service = FinderService(
+        hmm_dir,
+        hmm_dir / f"{PFAM_PK_NAME}.hmm",
+        tmp_path / "jobs",
+        categories=CATEGORIES,
+        defaults={"ann_type": CATEGORIES},
+    )
+    server = ThreadingHTTPServer(("127.0.0.1", 0), RequestHandler)
+    server.service = service
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    with service:
+        thread.start()
+        try:
+            yield Client(server.server_address[1])
+        finally:
+            # Let the gated jobs finish before stopping the workers
+            gate.touch()
+            server.shutdown()
+            server.server_close()
+
+
+def test_parse_job(tmp_path, proteome, monkeypatch):
+    monkeypatch.chdir(proteome.parent)
+    kwargs = parse_job({"fasta": proteome.name, "threads": 2}, tmp_path / "out")
+    assert kwargs == {"fasta": [proteome], "output": tmp_path / "out", "threads": 2}
+
+    kwargs = parse_job(
+        {"fasta": [str(proteome)], "output": "custom", "ann_type": "Family"},
+        tmp_path / "out",
+    )
+    assert kwargs["output"] == proteome.parent / "custom"
+    assert kwargs["ann_type"] == ["Family"]
+
+    for payload, match in [
+        ([str(proteome)], "JSON object"),
+        ({}, "non-empty list"),
+        ({"fasta": []}, "non-empty list"),
+        ({"fasta": str(tmp_path / "missing.fa")}, "does not exist"),
+        ({"fasta": str(proteome), "num_proc": 2}, "Unsupported options"),
+        ({"fasta": str(proteome), "threads": 0}, "Invalid `threads`"),
+        ({"fasta": str(proteome), "threads": True}, "Invalid `threads`"),
+        ({"fasta": str(proteome), "min_hmm_score": "1"}, "Invalid `min_hmm_score`"),
+        ({"fasta": str(proteome), "ann_type": ["PFAM"]}, "Invalid `ann_type`"),
+    ]:
+        with pytest.raises(ValueError, match=match):
+            parse_job(payload, tmp_path / "out")
+
+
+def test_run_job(tmp_path, client, gate, hmm_dir, proteome):
+    status, health = client.get("/health")
+    assert status == 200
+    assert health["status"] == "ok"
+    assert health["workers"] == 1
+    assert health["categories"] == CATEGORIES
+    assert health["db_fingerprint"]
+    assert health["jobs"] == {}
+
+    status, job = client.post({"fasta": str(proteome)})
+    assert status == 202
+    assert job["status"] in ("queued", "running")
+    assert job["output"] == str(tmp_path / "jobs" / job["id"])
+    assert "result" not in job
+
+    # The job is unfinished until the gate is opened
+    status, other = client.post({"fasta": str(proteome), "output": job["output"]})
+    assert status == 400
+    assert job["id"] in other["error"]
+    _, jobs = client.get("/jobs")
+    assert [x["id"] for x in jobs["jobs"]] == [job["id"]]
+
+    gate.touch()
+    job = client.poll(job["id"])
+    assert job["status"] == "completed", job["error"]
+
+    expected = tf.run_find(
+        [proteome],
+        hmm_dir,
+        tmp_path / "expected",
+        hmm_dir / f"{PFAM_PK_NAME}.hmm",
+        ann_type=CATEGORIES,
+        quiet=True,
+    )
+    assert sum(expected.num_tkps.values()) > 0
+    result = job["result"]
+    assert result["num_tkps"] == {str(k): v for k, v in expected.num_tkps.items()}
+    assert len(result["summary"]) == len(expected.summary)
+    assert (Path(job["output"]) / "summary.tsv").read_text() == (
+        tmp_path / "expected" / "summary.tsv"
+    ).read_text()
+
+    # The output dir of a finished job may be reused
+    status, job = client.post(
+        {"fasta": str(proteome), "output": job["output"]}, "/jobs?wait=1"
+    )
+    assert status == 200
+    assert job["status"] == "completed", job["error"]
+    assert job["result"]["num_tkps"] == result["num_tkps"]
+
+    _, health = client.get("/health")
+    assert health["jobs"] == {"completed": 2}
+
+
+def test_invalid_requests(client, tmp_path, proteome):
+    for payload in [
+        b"{",
+        b"[]",
+        {"fasta": str(tmp_path / "missing.fa")},
+        {"fasta": str(proteome), "unknown": 1},
+        {"fasta": str(proteome), "tm_jobs": -1},
+    ]:
+        status, res = client.post(payload)
+        assert status == 400, payload
+        assert res["error"]
+
+    status, res = client.post({"fasta": str(proteome)}, "/other")
+    assert status == 404
+    status, res = client.get("/jobs/unknown")
+    assert status == 404
+    assert res == {"error": "No job unknown"}
+
+    _, jobs = client.get("/jobs")
+    assert jobs == {"jobs": []}
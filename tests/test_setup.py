@@ -0,0 +1,87 @@
+from pathlib import Path
+
+from benchmarks.data import write_pfam
+from tkp_finder.constants import DB_DIR_NAME
+from tkp_finder.hmm import database_fingerprint, decode_name, encode_name, read_manifest
+from tkp_finder.tkp_finder import run_setup
+
+
+def setup(base: Path, profiles) -> dict:
+    path_hmm, path_dat = write_pfam(profiles, base / "pfam")
+    hmm_dir = base / "hmm"
+    hmm_dir.mkdir(exist_ok=True)
+    run_setup(
+        hmm_dir,
+        path_pfam_a=path_hmm,
+        path_pfam_dat=path_dat,
+        split_profiles=True,
+        quiet=True,
+    )
+    manifest = read_manifest(hmm_dir / DB_DIR_NAME)
+    assert database_fingerprint(hmm_dir) == manifest["fingerprint"]
+    return manifest
+
+
+def stats(hmm_dir: Path) -> dict[str, tuple[int, int]]:
+    """
+    :return: The inode and mtime of each profile file and database.
+    """
+    paths = [
+        *(hmm_dir / "profiles").glob("*/*.hmm"),
+        *(hmm_dir / DB_DIR_NAME).glob("*.h3m"),
+    ]
+    return {
+        str(p.relative_to(hmm_dir)): (p.stat().st_ino, p.stat().st_mtime_ns)
+        for p in paths
+    }
+
+
+def accession(p) -> str:
+    return decode_name(p.hmm.accession).split(".")[0]
+
+
+def test_incremental_setup(tmp_path, profiles):
+    hmm_dir = tmp_path / "hmm"
+    manifest = setup(tmp_path, profiles)
+    before = stats(hmm_dir)
+
+    # Rerunning on the same release rewrites nothing
+    assert setup(tmp_path, profiles) == manifest
+    assert stats(hmm_dir) == before
+
+    # Change a Family profile, add another one and remove a Motif one
+    family = [p for p in profiles if p.category == "Family"]
+    changed = family[0].hmm.copy()
+    changed.description = encode_name("A changed description")
+    added = family[1].hmm.copy()
+    added.name, added.accession = encode_name("Added"), encode_name("PF87777.1")
+    removed = next(p for p in profiles if p.category == "Motif")
+    updated = [
+        family[0]._replace(hmm=changed) if p is family[0] else p
+        for p in profiles
+        if p is not removed
+    ]
+    updated.append(family[1]._replace(hmm=added))
+
+    new_manifest = setup(tmp_path, updated)
+    after = stats(hmm_dir)
+
+    assert new_manifest["fingerprint"] != manifest["fingerprint"]
+    changed_paths = {
+        f"profiles/Family/{accession(family[0])}.hmm",
+        "profiles/Family/PF87777.hmm",
+        f"{DB_DIR_NAME}/Family.hmm.h3m",
+        f"{DB_DIR_NAME}/Motif.hmm.h3m",
+    }
+    assert f"profiles/Motif/{accession(removed)}.hmm" in before.keys() - after.keys()
+    assert {k for k in after if after[k] != before.get(k)} == changed_paths
+
+    entries = new_manifest["categories"]
+    assert "PF87777" in entries["Family"]["profiles"]
+    assert accession(removed) not in entries["Motif"]["profiles"]
+    for category in ("Domain", "Repeat"):
+        assert entries[category] == manifest["categories"][category]
+
+    # The fingerprint is stable as long as the profiles are
+    assert setup(tmp_path, updated)["fingerprint"] == new_manifest["fingerprint"]
+    assert stats(hmm_dir) == after
@@ -0,0 +1,29 @@
+from pathlib import Path
+
+import pandas as pd
+
+from tkp_finder.tkp_finder import format_summaries, write_summary
+
+#: Annotations of a few proteins with Pfam entries and the formatted summary
+#: written by the per-group implementation preceding the vectorized one
+DATA_DIR = Path(__file__).parent / "data" / "summaries"
+
+
+def test_format_summaries_matches_baseline(tmp_path):
+    df = pd.read_csv(DATA_DIR / "annotations.tsv", sep="\t")
+    write_summary(format_summaries(df, DATA_DIR), tmp_path, "summary_fmt")
+    assert (tmp_path / "summary_fmt.tsv").read_bytes() == (
+        DATA_DIR / "summary_fmt.tsv"
+    ).read_bytes()
+
+
+def test_format_summaries_ignores_row_order():
+    df = pd.read_csv(DATA_DIR / "annotations.tsv", sep="\t")
+    expected = format_summaries(df, DATA_DIR)
+    shuffled = df.sample(frac=1, random_state=0).reset_index(drop=True)
+    pd.testing.assert_frame_equal(format_summaries(shuffled, DATA_DIR), expected)
+
+
+def test_format_empty_summaries():
+    df = pd.read_csv(DATA_DIR / "annotations.tsv", sep="\t").iloc[:0]
+    assert format_summaries(df, DATA_DIR).empty
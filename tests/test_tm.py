@@ -0,0 +1,118 @@
+import pytest
+from lXtractor.core.chain import ChainSequence
+
+from tkp_finder.tm import HydropathyTM
+
+
+def test_collected_jobs_are_released():
+    chains = [
+        ChainSequence.from_string(seq, name=f"s{i}")
+        for i, seq in enumerate(["MKVLAAGIVLLLAVSLAQKR", "MSTAVEKRLL", "MKKLEPQ"])
+    ]
+    with HydropathyTM(window=5) as tm:
+        first = tm.submit(chains[:2], max_bytes=1)
+        # The second submission waits for the first one's jobs
+        second = tm.submit(chains, max_bytes=1)
+        assert len(second) == 3
+
+        children = list(tm.collect(chains[:2], first))
+        assert len(children) > 0
+        # Still awaited by the second submission
+        assert len(tm._submitted) == 3
+
+        list(tm.collect(chains, second))
+        assert not tm._submitted and not tm._digests and not tm._users
+
+
+def tm_protein(*parts: str) -> str:
+    """
+    :param parts: Loops interleaved with 19-long hydrophobic helices:
+        a loop's "+" marks a Lys, and the other residues are polar.
+    :return: A protein sequence.
+    """
+    return ("L" * 19).join(x.replace("+", "K").replace(".", "S") for x in parts)
+
+
+def segments(tm: HydropathyTM, seq: str) -> list[tuple[int, int, str]]:
+    return [(s.start, s.end, s.name) for s in tm.predict(seq)]
+
+
+def test_predict_single_helix():
+    tm = HydropathyTM()
+    # Positive N-terminus
+    seq = tm_protein("M++.+.+.....", "." * 30)
+    assert segments(tm, seq) == [
+        (1, 12, "inside"),
+        (13, 31, "TMhelix"),
+        (32, 61, "outside"),
+    ]
+    # Positive C-terminus
+    seq = tm_protein("M" + "." * 20, "...++.+...")
+    assert segments(tm, seq) == [
+        (1, 21, "outside"),
+        (22, 40, "TMhelix"),
+        (41, 50, "inside"),
+    ]
+
+
+def test_predict_multiple_helices():
+    tm = HydropathyTM()
+    # Inside and outside loops alternate; the positive one is inside
+    seq = tm_protein("M" + "." * 9, ".++.+.", "." * 8, "+.+..")
+    assert segments(tm, seq) == [
+        (1, 10, "outside"),
+        (11, 29, "TMhelix"),
+        (30, 35, "inside"),
+        (36, 54, "TMhelix"),
+        (55, 62, "outside"),
+        (63, 81, "TMhelix"),
+        (82, 86, "inside"),
+    ]
+    # Helices at the termini have no loops there
+    seq = tm_protein("", ".+.+..", "")
+    assert segments(tm, seq) == [
+        (1, 19, "TMhelix"),
+        (20, 25, "inside"),
+        (26, 44, "TMhelix"),
+    ]
+
+
+def test_predict_globular():
+    tm = HydropathyTM()
+    globular = "MSKDEPLTNQGAVRSEDIKTGLHNPESWKDQTRAEGSVNPQDKLTSEAGRH"
+    short = "LLLLLLLLLL"
+    for seq in (globular, short):
+        assert segments(tm, seq) == [(1, len(seq), "inside")]
+
+
+def test_predictions_run_inline():
+    chains = [
+        ChainSequence.from_string(tm_protein("M++.+.+", "." * 20), name="tm"),
+        ChainSequence.from_string("MSKDEPLTNQGAVRSEDIKT", name="globular"),
+    ]
+    with HydropathyTM() as tm:
+        futures = tm.submit(chains, max_bytes=1)
+        assert len(futures) == 2
+        assert all(f.done() for f in futures)
+        assert tm._executor is None
+        children = list(tm.collect(chains, futures))
+
+    assert [(c.parent.name, c.name, c.start, c.end) for c in children] == [
+        ("tm", "TM_inside", 1, 7),
+        ("tm", "TM_TMhelix", 8, 26),
+        ("tm", "TM_outside", 27, 46),
+        ("globular", "TM_inside", 1, 20),
+    ]
+
+
+def test_failed_prediction_fails_collect(monkeypatch):
+    chains = [ChainSequence.from_string("MSKDEPLTNQ", name="s")]
+
+    def fail(seq):
+        raise ValueError("Invalid sequence")
+
+    with HydropathyTM() as tm:
+        monkeypatch.setattr(tm, "predict", fail)
+        futures = tm.submit(chains)
+        with pytest.raises(RuntimeError, match="1/1 HydropathyTM jobs failed"):
+            list(tm.collect(chains, futures))
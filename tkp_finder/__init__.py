@@ -3,5 +3,23 @@
 # SPDX-License-Identifier: MIT
 
 # from .deeptm import DeepTMHMM
-from .tkp_finder import find_tkps, discover_and_annotate, VARIABLES
 
+# The pipeline is imported on the first access, so that the CLI and
+# the workers importing the package don't load its heavy dependencies
+_LAZY = {
+    "find_tkps": "tkp_finder.tkp_finder",
+    "discover_and_annotate": "tkp_finder.tkp_finder",
+    "VARIABLES": "tkp_finder.tkp_finder",
+    "TKPFinder": "tkp_finder.finder",
+}
+
+
+def __getattr__(name: str):
+    if name in _LAZY:
+        import importlib
+
+        return getattr(importlib.import_module(_LAZY[name]), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+__all__ = list(_LAZY)
@@ -0,0 +1,185 @@
+import json
+import logging
+import sqlite3
+import zlib
+from collections import abc
+from itertools import groupby
+from pathlib import Path
+
+from lXtractor.core.chain import ChainSequence
+
+from tkp_finder.constants import ARCHIVE_SUFFIX
+
+LOGGER = logging.getLogger(__name__)
+
+_COLUMNS = "node, root, parent, id, name, start, end, seqs, meta"
+
+
+def _to_json(obj):
+    # numpy scalars
+    if hasattr(obj, "item"):
+        return obj.item()
+    return str(obj)
+
+
+def _dumps(obj) -> str:
+    return json.dumps(obj, default=_to_json)
+
+
+class ChainArchive:
+    """
+    A single-file SQLite archive of chain sequences with their children and
+    meta, an alternative to a `ChainIO` dump creating a directory per chain
+    and per child.
+
+    Each chain and each of its descendants is stored as a row. A child only
+    stores the sequences it does not inherit from its parent, e.g., the
+    numbering of a domain hit, so the archive stays compact. Meta values
+    keep their JSON types rather than being converted to strings.
+    Variables are not stored.
+
+    Chains are written in bulk by :meth:`write` and can be accessed by their
+    ids (:meth:`get`, ``archive[chain_id]``) or iterated over lazily.
+    Each access reconstructs a fresh :class:`ChainSequence` tree.
+
+    >>> with ChainArchive(path) as archive:  # doctest: +SKIP
+    ...     archive.write(chains)
+    ...     chain = archive[chains[0].id]
+    """
+
+    def __init__(self, path: Path, timeout: float = 600):
+        """
+        :param path: A path to the archive file. Created if missing.
+        :param timeout: Seconds to wait for a lock held by another process.
+        """
+        self.path = path
+        path.parent.mkdir(exist_ok=True, parents=True)
+        self.con = sqlite3.connect(path, timeout=timeout)
+        self.con.execute(
+            "CREATE TABLE IF NOT EXISTS chains ("
+            "node INTEGER PRIMARY KEY, root INTEGER NOT NULL, parent INTEGER, "
+            "id TEXT NOT NULL, name TEXT, start INTEGER NOT NULL, "
+            "end INTEGER NOT NULL, seqs BLOB NOT NULL, meta TEXT NOT NULL)"
+        )
+        self.con.execute("CREATE INDEX IF NOT EXISTS chains_root ON chains (root)")
+        self.con.execute(
+            "CREATE INDEX IF NOT EXISTS chains_id ON chains (id) WHERE parent IS NULL"
+        )
+        self.con.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.con.close()
+
+    def __len__(self) -> int:
+        query = "SELECT COUNT(*) FROM chains WHERE parent IS NULL"
+        return self.con.execute(query).fetchone()[0]
+
+    def __contains__(self, chain_id: str) -> bool:
+        return self._root(chain_id) is not None
+
+    def __getitem__(self, chain_id: str) -> ChainSequence:
+        chain = self.get(chain_id)
+        if chain is None:
+            raise KeyError(chain_id)
+        return chain
+
+    def __iter__(self) -> abc.Iterator[ChainSequence]:
+        cursor = self.con.execute(f"SELECT {_COLUMNS} FROM chains ORDER BY node")
+        for _, rows in groupby(cursor, key=lambda x: x[1]):
+            yield self._build(rows)
+
+    def ids(self) -> list[str]:
+        """
+        :return: Ids of the stored chains in the order they were written.
+        """
+        query = "SELECT id FROM chains WHERE parent IS NULL ORDER BY node"
+        return [x for x, in self.con.execute(query)]
+
+    def _root(self, chain_id: str) -> int | None:
+        query = "SELECT node FROM chains WHERE parent IS NULL AND id = ?"
+        row = self.con.execute(query, [chain_id]).fetchone()
+        return None if row is None else row[0]
+
+    def get(self, chain_id: str) -> ChainSequence | None:
+        """
+        :param chain_id: An id of a top-level chain.
+        :return: The chain with its children or ``None`` if it's missing.
+        """
+        root = self._root(chain_id)
+        if root is None:
+            return None
+        query = f"SELECT {_COLUMNS} FROM chains WHERE root = ? ORDER BY node"
+        return self._build(self.con.execute(query, [root]))
+
+    @staticmethod
+    def _build(rows: abc.Iterable[tuple]) -> ChainSequence:
+        # Rows are ordered so that parents precede their children
+        nodes = {}
+        for node, _, parent, _, name, start, end, seqs, meta in rows:
+            seqs = json.loads(zlib.decompress(seqs))
+            if parent is None:
+                obj = ChainSequence(start, end, name, seqs=seqs)
+            else:
+                obj = nodes[parent].spawn_child(start, end, name)
+                for k, v in seqs.items():
+                    obj.add_seq(k, v)
+            obj.meta = json.loads(meta)
+            nodes[node] = obj
+        return next(iter(nodes.values()))
+
+    def _rows(
+        self, chains: abc.Iterable[ChainSequence], node: int
+    ) -> abc.Generator[tuple, None, None]:
+        # Nodes are numbered so that parents precede their children and
+        # siblings keep their order
+        for c in chains:
+            root = node
+            node += 1
+            # (node, parent node, chain, fields of the parent)
+            stack = [(root, None, c, ())]
+            while stack:
+                i, parent, obj, inherited = stack.pop()
+                seqs = {k: obj[k] for k in obj.fields if k not in inherited}
+                yield (
+                    i,
+                    root,
+                    parent,
+                    obj.id,
+                    obj.name,
+                    obj.start,
+                    obj.end,
+                    zlib.compress(_dumps(seqs).encode("utf-8")),
+                    _dumps(obj.meta),
+                )
+                children = [
+                    (node + j, i, child, obj.fields)
+                    for j, child in enumerate(obj.children)
+                ]
+                node += len(children)
+                stack.extend(reversed(children))
+
+    def write(self, chains: abc.Iterable[ChainSequence]) -> int:
+        """
+        Write chains with all their descendants in a single transaction.
+
+        :param chains: Chain sequences to write.
+        :return: The number of written rows.
+        """
+        start = self.con.execute("SELECT COALESCE(MAX(node), -1) FROM chains")
+        node = start.fetchone()[0] + 1
+        with self.con:
+            cursor = self.con.executemany(
+                f"INSERT INTO chains ({_COLUMNS}) VALUES ({','.join('?' * 9)})",
+                self._rows(chains, node),
+            )
+        return cursor.rowcount
+
+
+if __name__ == "__main__":
+    raise RuntimeError
@@ -0,0 +1,180 @@
+import hashlib
+import json
+import logging
+import sqlite3
+from collections import abc, defaultdict
+from itertools import groupby
+from pathlib import Path
+
+from more_itertools import chunked
+from pyhmmer.easel import DigitalSequence, DigitalSequenceBlock
+
+from tkp_finder.hmm import BatchHMMer, DomainHit
+
+LOGGER = logging.getLogger(__name__)
+
+# SQLite's default limit on the number of host parameters is 999
+_MAX_PARAMS = 900
+
+
+class AnnotationCache:
+    """
+    A persistent cache of domain hits in an SQLite database.
+
+    The hits are stored per sequence, keyed by the sequence's digest and a
+    stage key, which should encompass everything affecting the search
+    results: the profiles' checksum, the cutoffs and the thresholds
+    (see :func:`stage_key`). A sequence without hits is stored with an
+    empty list, so that it isn't searched again.
+
+    Only the hits of the searches with bit score cutoffs are cached: the
+    ones reported by E-values depend on the other sequences searched along
+    (see :func:`search_cached`).
+
+    The database can be shared between processes.
+    """
+
+    def __init__(self, path: Path, timeout: float = 600):
+        """
+        :param path: A path to the database file. Created if missing.
+        :param timeout: Seconds to wait for a lock held by another process.
+        """
+        self.path = path
+        path.parent.mkdir(exist_ok=True, parents=True)
+        self.con = sqlite3.connect(path, timeout=timeout)
+        self.con.execute("PRAGMA journal_mode=WAL")
+        self.con.execute(
+            "CREATE TABLE IF NOT EXISTS hits ("
+            "seq BLOB NOT NULL, stage TEXT NOT NULL, hits TEXT NOT NULL, "
+            "PRIMARY KEY (stage, seq)) WITHOUT ROWID"
+        )
+        self.con.commit()
+        #: label => [the number of cached sequences, the total number of sequences]
+        self.stats: dict[str, list[int]] = defaultdict(lambda: [0, 0])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.con.close()
+
+    def get(
+        self, stage: str, digests: abc.Iterable[bytes]
+    ) -> dict[bytes, list[tuple]]:
+        """
+        :param stage: A stage key.
+        :param digests: Sequence digests.
+        :return: A mapping from the cached digests to the stored hits.
+        """
+        res = {}
+        for chunk in chunked(set(digests), _MAX_PARAMS):
+            query = (
+                f"SELECT seq, hits FROM hits WHERE stage = ? "
+                f"AND seq IN ({','.join('?' * len(chunk))})"
+            )
+            for seq, hits in self.con.execute(query, [stage, *chunk]):
+                res[seq] = [tuple(x) for x in json.loads(hits)]
+        return res
+
+    def put(self, stage: str, items: abc.Iterable[tuple[bytes, list[tuple]]]):
+        """
+        :param stage: A stage key.
+        :param items: Pairs of a sequence digest and the hits to store.
+        """
+        with self.con:
+            self.con.executemany(
+                "INSERT OR REPLACE INTO hits VALUES (?, ?, ?)",
+                ((seq, stage, json.dumps(hits)) for seq, hits in items),
+            )
+
+    def update_stats(self, label: str, num_cached: int, num_total: int):
+        self.stats[label][0] += num_cached
+        self.stats[label][1] += num_total
+
+    def report(self) -> str:
+        return "; ".join(
+            f"{label}: {cached}/{total} ({cached / total:.1%})"
+            for label, (cached, total) in self.stats.items()
+            if total
+        )
+
+
+def seq_digest(seq: DigitalSequence) -> bytes:
+    return hashlib.blake2b(bytes(seq.sequence), digest_size=16).digest()
+
+
+def text_digest(seq: str) -> bytes:
+    return hashlib.blake2b(seq.encode("ascii"), digest_size=16).digest()
+
+
+def stage_key(*parts) -> str:
+    """
+    :param parts: JSON-serializable values identifying a search.
+    :return: A digest of the parts.
+    """
+    return hashlib.sha256(json.dumps(parts).encode("utf-8")).hexdigest()
+
+
+def search_cached(
+    annotator: BatchHMMer,
+    seqs: DigitalSequenceBlock,
+    cache: AnnotationCache | None,
+    stage: str,
+    label: str = "hits",
+    callback: abc.Callable | None = None,
+    **kwargs,
+) -> list[DomainHit]:
+    """
+    Search the sequences missing from the cache and fetch the rest from it.
+
+    If the `annotator` uses E-values (see :attr:`BatchHMMer.uses_evalues`),
+    the cache is bypassed: the hits of a sequence depend on the `Z` and
+    `domZ` of the search, so the hits cached by another search or computed
+    for a subset of `seqs` may differ from the ones of searching `seqs`.
+
+    :param annotator: An annotator to search with.
+    :param seqs: A block of digital sequences named by their index, as
+        expected by :meth:`BatchHMMer.iter_hits`.
+    :param cache: An annotation cache. If ``None``, search all sequences.
+    :param stage: A stage key of the search (see :func:`stage_key`).
+    :param label: A label to record the cache hit rate under.
+    :param callback: Passed to :meth:`BatchHMMer.search`.
+    :param kwargs: Passed to :meth:`BatchHMMer.iter_hits`.
+    :return: A list of accepted domain hits sorted by the sequence index.
+    """
+    if cache is None or annotator.uses_evalues:
+        annotator.search(seqs, callback)
+        return sorted(annotator.iter_hits(**kwargs), key=lambda x: x.seq_idx)
+
+    digests = list(map(seq_digest, seqs))
+    cached = cache.get(stage, digests)
+    missing = [i for i, d in enumerate(digests) if d not in cached]
+    cache.update_stats(label, len(seqs) - len(missing), len(seqs))
+
+    hits = [
+        DomainHit(i, *x)
+        for i, d in enumerate(digests)
+        if d in cached
+        for x in cached[d]
+    ]
+
+    if missing:
+        block = DigitalSequenceBlock(annotator.alphabet, (seqs[i] for i in missing))
+        # Keep the E-values as if searching the whole block
+        annotator.search(block, callback, Z=annotator.kwargs.get("Z", len(seqs)))
+        new_hits = sorted(annotator.iter_hits(**kwargs), key=lambda x: x.seq_idx)
+        by_seq = {
+            i: [x[1:] for x in group]
+            for i, group in groupby(new_hits, key=lambda x: x.seq_idx)
+        }
+        cache.put(stage, ((digests[i], by_seq.get(i, [])) for i in missing))
+        hits.extend(new_hits)
+
+    return sorted(hits, key=lambda x: x.seq_idx)
+
+
+if __name__ == "__main__":
+    raise RuntimeError
@@ -0,0 +1,123 @@
+import hashlib
+import json
+import logging
+import os
+import pickle
+import shutil
+import typing as t
+from collections import abc
+from pathlib import Path
+
+LOGGER = logging.getLogger(__name__)
+
+CHECKPOINTS_DIR_NAME = ".checkpoints"
+PARAMS_NAME = "params.json"
+#: The final stage of a unit: all the per-unit processing is finished
+DONE = "done"
+
+
+class Checkpoints:
+    """
+    Persists the intermediate results of a run, so that it can be resumed.
+
+    Results are stored per unit of work (an input file or its shard) and per
+    stage. Each checkpoint is written to a temporary file first and then
+    atomically moved in place, so an interrupted run never leaves a partially
+    written checkpoint behind.
+
+    The object holds no open resources and can be passed to worker processes.
+    """
+
+    def __init__(self, base: Path):
+        """
+        :param base: A directory to store the checkpoints in.
+        """
+        self.base = base
+
+    def init(self, params: dict[str, t.Any], resume: bool = False):
+        """
+        Prepare the checkpoints directory for a run.
+
+        :param params: JSON-serializable run parameters affecting the results.
+        :param resume: Keep the existing checkpoints if they were produced with
+            the same `params`. Otherwise, discard any existing checkpoints.
+        :raises ValueError: If resuming a run with different parameters.
+        """
+        params_path = self.base / PARAMS_NAME
+        params = json.loads(json.dumps(params, default=str))
+        if resume and params_path.exists():
+            existing = json.loads(params_path.read_text())
+            diff = sorted(
+                k
+                for k in existing.keys() | params.keys()
+                if existing.get(k) != params.get(k)
+            )
+            if diff:
+                raise ValueError(
+                    f"Cannot resume a run with different parameters: {diff}. "
+                    f"Start a new run without `--resume` or use another output."
+                )
+            LOGGER.info(f"Resuming from the checkpoints in {self.base}")
+            return
+        if resume:
+            LOGGER.warning(f"No checkpoints to resume from in {self.base}")
+        self.clear()
+        self.base.mkdir(parents=True)
+        params_path.write_text(json.dumps(params, indent=2))
+
+    def clear(self):
+        if self.base.exists():
+            shutil.rmtree(self.base)
+
+    def unit_dir(self, unit: t.Any) -> Path:
+        """
+        :param unit: An input path or its shard.
+        :return: A directory of the unit's checkpoints. The name accounts for
+            the input file's size and modification time, so that checkpoints
+            of a modified input are not reused.
+        """
+        path = unit if isinstance(unit, Path) else unit.path
+        stat = path.stat()
+        key = f"{unit}:{stat.st_size}:{stat.st_mtime_ns}"
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+        return self.base / f"{path.stem}-{digest}"
+
+    def save(self, unit: t.Any, stage: str, obj: t.Any):
+        base = self.unit_dir(unit)
+        base.mkdir(exist_ok=True, parents=True)
+        path = base / f"{stage}.pkl"
+        tmp = path.with_suffix(f".tmp{os.getpid()}")
+        with tmp.open("wb") as f:
+            pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+    def load(self, unit: t.Any, stage: str) -> t.Any | None:
+        """
+        :return: A saved object or ``None`` if there is no such checkpoint.
+        """
+        path = self.unit_dir(unit) / f"{stage}.pkl"
+        if not path.exists():
+            return None
+        with path.open("rb") as f:
+            return pickle.load(f)
+
+    def latest(
+        self, unit: t.Any, stages: abc.Sequence[str]
+    ) -> tuple[int, t.Any | None]:
+        """
+        Find the latest completed stage.
+
+        :param unit: An input path or its shard.
+        :param stages: An ordered sequence of stages.
+        :return: An index of the latest stage having a checkpoint and its
+            object, or ``(-1, None)`` if no stage was completed.
+        """
+        base = self.unit_dir(unit)
+        for i in reversed(range(len(stages))):
+            if (base / f"{stages[i]}.pkl").exists():
+                return i, self.load(unit, stages[i])
+        return -1, None
+
+
+if __name__ == "__main__":
+    raise RuntimeError
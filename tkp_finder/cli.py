@@ -0,0 +1,730 @@
+"""
+The command-line interface.
+
+Only click and :mod:`tkp_finder.constants` are imported here, so that
+invoking the help or failing argument validation is fast. The pipeline in
+:mod:`tkp_finder.tkp_finder` and its heavy dependencies are imported by
+a command once the arguments are validated.
+"""
+import importlib.util
+import logging
+from pathlib import Path
+
+import click
+
+from tkp_finder.checkpoint import CHECKPOINTS_DIR_NAME
+from tkp_finder.constants import (
+    ANNOTATION_CATEGORIES,
+    ARCHIVE_SUFFIX,
+    BATCH_BYTES,
+    BLOCK_SIZE,
+    DATASET_FORMATS,
+    DB_DIR_NAME,
+    MAX_JOBS,
+    MOTIF,
+    OUTPUT_FORMATS,
+    PFAM_PK_NAME,
+    PK_NAME,
+    PPK_NAME,
+    SHARD_SIZE,
+    TM_BACKEND_NAMES,
+)
+
+LOGGER = logging.getLogger("tkp-finder")
+
+
+def setup_logger(logger: logging.Logger | None, level: int | None):
+    if logger is None:
+        logger = logging.getLogger("tkp-finder")
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setLevel(level or logging.WARNING)
+        formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
+        handler.setFormatter(formatter)
+        logger.addHandler(handler)
+        logger.setLevel(level or logging.WARNING)
+    return logger
+
+
+@click.group(
+    "tkp_finder",
+    context_settings=dict(
+        help_option_names=["-h", "--help"], ignore_unknown_options=True
+    ),
+    no_args_is_help=True,
+    invoke_without_command=True,
+)
+def tkp_finder():
+    """
+    A command-line tool to discover and annotate tandem protein kinases.
+
+    It's based on the [lXtractor](https://github.com/edikedik/lXtractor) library.
+
+    GitHub: <https://github.com/edikedik/tkp-finder>
+    Author: Ivan Reveguk <ivan.reveguk@gmail.com>
+    """
+    pass
+
+
+@tkp_finder.command("setup", no_args_is_help=True)
+@click.option(
+    "-H",
+    "--hmm_dir",
+    type=click.Path(dir_okay=True, file_okay=False, writable=True),
+    help=(
+        "Path to a directory to store hmm-related data. "
+        "By default, will create an `hmm` "
+        "dir in the current directory."
+    ),
+)
+@click.option(
+    "-d",
+    "--download",
+    is_flag=True,
+    default=False,
+    show_default=True,
+    help="If the flag is on, download the Pfam data from interpro."
+)
+@click.option(
+    "-p",
+    "--plants",
+    is_flag=True,
+    default=False,
+    show_default=True,
+    help="If the flag is on, use Plant PK family-type HMMs."
+)
+@click.option(
+    "-q",
+    "--quiet",
+    is_flag=True,
+    default=False,
+    show_default=True,
+    help="Disable verbose output."
+)
+@click.option(
+    "-s",
+    "--split_profiles",
+    is_flag=True,
+    default=False,
+    show_default=True,
+    help=(
+        "If the flag is on, also write each profile into a separate file "
+        "under `profiles/<Type>`. Otherwise, only the pressed per-type "
+        "databases are written."
+    ),
+)
+@click.option(
+    "--path_pfam_a",
+    type=click.Path(dir_okay=False, file_okay=True, exists=True),
+    help=(
+        "A path to downloaded Pfam-A HMM profiles, plain or gzip-compressed. "
+        "By default, if `download` is ``False``,"
+        "will try to find it within the `hmm_dir`."
+    ),
+)
+@click.option(
+    "--path_pfam_dat",
+    type=click.Path(dir_okay=False, file_okay=True, exists=True),
+    help=(
+        "A path to downloaded Pfam-A (meta)data file, plain or gzip-compressed. "
+        "By default, if `download` is ``False``,"
+        "will try to find it within the `hmm_dir`."
+    ),
+)
+@click.option(
+    "--path_plants",
+    type=click.Path(dir_okay=False, file_okay=True, exists=True),
+    help=(
+        "A path to downloaded Plant HMMs. "
+        "By default, if `download` is ``False``,"
+        "will try to find it within the `hmm_dir`."
+    ),
+)
+@click.option(
+    "--metrics_out",
+    type=click.Path(dir_okay=False, file_okay=True, writable=True),
+    help=(
+        "A path to write a JSON report with the wall and CPU time, "
+        "the number of profiles and the peak RSS of each setup stage."
+    ),
+)
+def setup(
+    hmm_dir,
+    download,
+    plants,
+    quiet,
+    split_profiles,
+    path_pfam_a,
+    path_pfam_dat,
+    path_plants,
+    metrics_out,
+):
+    """
+    Command to initialize the HMM data needed for TKPs' annotation.
+
+    For a fist-time usage, invoke `tkp-finder setup -H hmm -d`.
+    """
+    level = logging.WARNING if quiet else logging.INFO
+    setup_logger(None, level=level)
+    LOGGER.info("Running setup")
+
+    hmm_dir = Path.cwd() / "hmm" if hmm_dir is None else Path(hmm_dir)
+    hmm_dir.mkdir(exist_ok=True, parents=True)
+
+    from tkp_finder.tkp_finder import run_setup
+
+    run_setup(
+        hmm_dir,
+        download=download,
+        plants=plants,
+        split_profiles=split_profiles,
+        path_pfam_a=path_pfam_a,
+        path_pfam_dat=path_pfam_dat,
+        path_plants=path_plants,
+        quiet=quiet,
+        metrics_out=None if metrics_out is None else Path(metrics_out),
+    )
+    LOGGER.info("Finished setup")
+
+
+@tkp_finder.command(
+    "find", context_settings={"ignore_unknown_options": True}, no_args_is_help=True
+)
+@click.argument("fasta", nargs=-1, type=click.Path())
+@click.option(
+    "-H",
+    "--hmm_dir",
+    type=click.Path(exists=True, dir_okay=True, file_okay=False),
+    help="Directory with HMM profiles. Expected to contain HMM databases (`db` dir) "
+    "or `profiles` dir and target PK profile (PF00069.hmm). "
+    "See `tkp-finder setup` on how to prepare this dir."
+)
+@click.option(
+    "-a",
+    "--ann_type",
+    multiple=True,
+    type=click.Choice(ANNOTATION_CATEGORIES),
+    default=["Family", "Domain", "Motif", "TM"],
+    show_default=True,
+    help=(
+        "Which HMM types to use for annotating the discovered TKPs. "
+        "The names must correspond to "
+        "databases or folders within the `hmm_dir`."
+    ),
+)
+@click.option(
+    "-p",
+    "--pk_profile",
+    type=click.Path(exists=True, file_okay=True, dir_okay=False),
+    help=(
+        "A path to the PK HMM profile. "
+        "By default, will try to find it within the `hmm_dir`."
+    ),
+)
+@click.option(
+    "-m",
+    "--motif",
+    default=MOTIF,
+    show_default=True,
+    help=(
+        "A motif to discriminate between PKs and pseudo PKs. "
+        "This corresponds to the following "
+        "conserved elements: "
+        "(1) b3-Lys "
+        "(2) aC-helix Glu "
+        "(3-4-5) HRD motif "
+        "(6-7-8) DFG motif."
+    ),
+)
+@click.option(
+    "-o",
+    "--output",
+    type=click.Path(file_okay=False, dir_okay=True, writable=True),
+    help=(
+        "Output directory to store the results. "
+        "Be default, will store within `./tkp-finder`."
+    ),
+)
+@click.option(
+    "-O",
+    "--output_format",
+    type=click.Choice(OUTPUT_FORMATS),
+    multiple=True,
+    default=("tsv",),
+    show_default=True,
+    help=(
+        "A format of the summary tables: `summary` (a row per annotation) and "
+        "`summary_fmt` (a row per protein). Can be used multiple times. "
+        "`parquet` and `arrow` (Arrow IPC) write typed zstd-compressed "
+        "datasets partitioned by `InputName`, e.g., "
+        "`summary.parquet/InputName=<input>/`. These require `pyarrow`."
+    ),
+)
+@click.option(
+    "--chains_format",
+    type=click.Choice(["dirs", "archive"]),
+    default="dirs",
+    show_default=True,
+    help=(
+        "How to save the found chains. `dirs` writes a directory tree per "
+        "chain with a subdirectory per child annotation. `archive` writes a "
+        f"single indexed SQLite file per input, `<input>{ARCHIVE_SUFFIX}`, "
+        "readable by `tkp_finder.archive.ChainArchive`."
+    ),
+)
+@click.option(
+    "--pk_map_name",
+    default=PK_NAME,
+    show_default=True,
+    help="Use this name for the protein kinase domain."
+)
+@click.option(
+    "--ppk_map_name",
+    default=PPK_NAME,
+    show_default=True,
+    help="Use this name for pseudo protein kinases."
+)
+@click.option(
+    "-ms",
+    "--min_pk_domain_size",
+    type=int,
+    default=150,
+    show_default=True,
+    help="The minimum number of amino acid residues within a PK domain."
+)
+@click.option(
+    "--min_pk_domains",
+    type=int,
+    default=2,
+    help="The number of domains to classify a protein as TKP."
+)
+@click.option(
+    "-mS",
+    "--min_hmm_score",
+    type=float,
+    default=0.0,
+    show_default=True,
+    help="Min BitScore of a domain."
+)
+@click.option(
+    "-mc",
+    "--min_hmm_cov",
+    type=float,
+    default=0.5,
+    show_default=True,
+    help="Min coverage by an HMM profile."
+)
+@click.option(
+    "--timeout",
+    type=int,
+    default=300,
+    help="For parallel processing, indicate timeout for getting results "
+    "of a single process."
+)
+@click.option(
+    "-n",
+    "--num_proc",
+    type=int,
+    default=None,
+    help=(
+        "The number of cpus for data parallelism: "
+        "each input fasta is split into shards of `shard_size` "
+        "annotated within separate processes."
+    ),
+)
+@click.option(
+    "--shard_size",
+    type=click.IntRange(min=1),
+    default=SHARD_SIZE,
+    show_default=True,
+    help=(
+        "For parallel processing, the approximate size (in MB) of a shard of "
+        "input sequences processed by a single process."
+    ),
+)
+@click.option(
+    "-T",
+    "--threads",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    help=(
+        "The number of threads for HMM searches within a single process. "
+        "Applies to both the PK discovery and annotation passes and "
+        "is independent of `num_proc`: each process uses this many threads."
+    ),
+)
+@click.option(
+    "--block_size",
+    type=click.IntRange(min=1),
+    default=BLOCK_SIZE,
+    show_default=True,
+    help=(
+        "The number of sequences read and searched at once during the PK "
+        "domain discovery. Bounds the memory usage for large inputs."
+    ),
+)
+@click.option(
+    "-C",
+    "--cache",
+    type=click.Path(dir_okay=False, file_okay=True, writable=True),
+    default=None,
+    help=(
+        "A path to an annotation cache (SQLite database), created if missing. "
+        "HMM hits and TM predictions of previously seen sequences "
+        "are taken from the cache, so that only new sequences are processed. "
+        "Hits of profiles lacking the trusted cutoffs depend on the whole "
+        "input and aren't cached. "
+        "For instance, use `cache.sqlite` within the `hmm_dir`."
+    ),
+)
+@click.option(
+    "--tm_backend",
+    type=click.Choice(TM_BACKEND_NAMES),
+    default="deeptmhmm",
+    show_default=True,
+    help=(
+        "A backend predicting TM segments for the `TM` annotation type. "
+        "`deeptmhmm` submits jobs to the DeepTMHMM server hosted by BioLib "
+        "and requires network access. `local` is a fast offline predictor "
+        "based on the hydropathy profile and the positive-inside rule."
+    ),
+)
+@click.option(
+    "--tm_batch_size",
+    type=click.IntRange(min=1),
+    default=BATCH_BYTES // 2**10,
+    show_default=True,
+    help=(
+        "The maximum size (in KB) of the fasta payload of a single TM job. "
+        "For DeepTMHMM, should be as large as possible, although too large "
+        "files are blocked by the server. "
+        "They did not specify the file size limit though..."
+    ),
+)
+@click.option(
+    "--tm_jobs",
+    type=click.IntRange(min=1),
+    default=MAX_JOBS,
+    show_default=True,
+    help=(
+        "The maximum number of concurrently running TM jobs. "
+        "The jobs are submitted as soon as an input is processed, "
+        "overlapping with the processing of the remaining inputs."
+    ),
+)
+@click.option(
+    "-r",
+    "--resume",
+    is_flag=True,
+    default=False,
+    help=(
+        "Resume an interrupted run. The results of each input (or its shard) "
+        f"and each annotation stage are checkpointed into `{CHECKPOINTS_DIR_NAME}` "
+        "within the output dir. With this flag, the completed work is loaded "
+        "from there instead of being repeated. The checkpoints are removed "
+        "once the run completes."
+    ),
+)
+@click.option(
+    "--metrics_out",
+    type=click.Path(dir_okay=False, file_okay=True, writable=True),
+    help=(
+        "A path to write a JSON report with metrics of each stage "
+        "(discovery, annotation by each category, TM jobs, writing) of each "
+        "input: wall and CPU time, processed sequences and residues, hits "
+        "before and after resolving overlaps, scanned profiles, and peak RSS. "
+        "The report also sums up the stages across the inputs and lists "
+        "the slowest profiles. In parallel mode, the workers' metrics are "
+        "reported per shard."
+    ),
+)
+@click.option(
+    "-q",
+    "--quiet",
+    is_flag=True,
+    default=False,
+    help="Disable stdout logging and progress bar."
+)
+def find(
+    fasta,
+    hmm_dir,
+    ann_type,
+    pk_profile,
+    motif,
+    output,
+    output_format,
+    chains_format,
+    pk_map_name,
+    ppk_map_name,
+    min_pk_domain_size,
+    min_pk_domains,
+    min_hmm_score,
+    min_hmm_cov,
+    timeout,
+    num_proc,
+    shard_size,
+    threads,
+    block_size,
+    cache,
+    tm_backend,
+    tm_batch_size,
+    tm_jobs,
+    resume,
+    quiet,
+    metrics_out,
+):
+    """
+    The command finds TKPs in a list of input fasta files.
+
+    It first discovers proteins with `>=min_domains` PK domains.
+    For these proteins, it uses Pfam-A profiles separated into categories
+    (see `hmm_type` option)
+    to produce non-overlapping annotations within each hmm type
+    (maximizing the cumulative BitScore).
+
+    All the extracted profiles are saved as a nested collection of files.
+    Additionally, for each input fasta, it produces the aggregated `summary.tsv`.
+    """
+    level = logging.WARNING if quiet else logging.INFO
+    setup_logger(None, level=level)
+
+    datasets = sorted(set(output_format) & set(DATASET_FORMATS))
+    if datasets and importlib.util.find_spec("pyarrow") is None:
+        raise click.UsageError(
+            f"Output formats {datasets} require `pyarrow`: pip install pyarrow"
+        )
+
+    fasta = [Path(f) for f in fasta]
+    if not fasta:
+        raise ValueError("No inputs provided. Use -h or --help to invoke help.")
+    for f in fasta:
+        if not f.exists():
+            raise ValueError(f"File {f} does not exist")
+    if hmm_dir is None:
+        hmm_dir = Path.cwd() / "hmm"
+        LOGGER.info(f"Assuming hmm dir to be {hmm_dir}")
+        if not hmm_dir.exists():
+            raise ValueError(f"HMM dir {hmm_dir} does not exist.")
+    else:
+        hmm_dir = Path(hmm_dir)
+    if not (hmm_dir / DB_DIR_NAME).is_dir() and not (hmm_dir / "profiles").is_dir():
+        raise ValueError(
+            f"Expected to find `{DB_DIR_NAME}` or `profiles` dir in {hmm_dir}"
+        )
+    if output is None:
+        output = Path.cwd() / "tkp-finder"
+        output.mkdir(exist_ok=True)
+        LOGGER.info(f"Setting output dir to {output}")
+    else:
+        output = Path(output)
+    if pk_profile is None:
+        pk_profile = hmm_dir / f"{PFAM_PK_NAME}.hmm"
+        if not pk_profile.exists():
+            raise ValueError(
+                f"Expected to find profile {PFAM_PK_NAME} within {hmm_dir}"
+            )
+
+    from tkp_finder.tkp_finder import run_find
+
+    run_find(
+        fasta,
+        hmm_dir,
+        output,
+        Path(pk_profile),
+        ann_type=list(ann_type),
+        motif=motif,
+        output_format=output_format,
+        chains_format=chains_format,
+        pk_map_name=pk_map_name,
+        ppk_map_name=ppk_map_name,
+        min_pk_domain_size=min_pk_domain_size,
+        min_pk_domains=min_pk_domains,
+        min_hmm_score=min_hmm_score,
+        min_hmm_cov=min_hmm_cov,
+        timeout=timeout,
+        num_proc=num_proc,
+        shard_size=shard_size,
+        threads=threads,
+        block_size=block_size,
+        cache=None if cache is None else Path(cache),
+        tm_backend=tm_backend,
+        tm_batch_size=tm_batch_size,
+        tm_jobs=tm_jobs,
+        resume=resume,
+        quiet=quiet,
+        metrics_out=None if metrics_out is None else Path(metrics_out),
+    )
+
+
+@tkp_finder.command("serve", no_args_is_help=True)
+@click.option(
+    "-H",
+    "--hmm_dir",
+    type=click.Path(exists=True, dir_okay=True, file_okay=False),
+    required=True,
+    help="Directory with HMM profiles prepared by `tkp-finder setup`.",
+)
+@click.option(
+    "-a",
+    "--ann_type",
+    multiple=True,
+    type=click.Choice(ANNOTATION_CATEGORIES),
+    default=["Family", "Domain", "Motif", "TM"],
+    show_default=True,
+    help=(
+        "Annotation types of the jobs not specifying their own `ann_type`. "
+        "The profiles of these types are loaded by each worker at startup; "
+        "other types are loaded on the first job using them."
+    ),
+)
+@click.option(
+    "-p",
+    "--pk_profile",
+    type=click.Path(exists=True, file_okay=True, dir_okay=False),
+    help=(
+        "A path to the PK HMM profile. "
+        "By default, will try to find it within the `hmm_dir`."
+    ),
+)
+@click.option(
+    "-o",
+    "--output",
+    type=click.Path(file_okay=False, dir_okay=True, writable=True),
+    help=(
+        "A directory with the outputs of the jobs not specifying their own "
+        "`output`, each written into `<output>/<job id>`. "
+        "By default, will store within `./tkp-finder-jobs`."
+    ),
+)
+@click.option(
+    "--host",
+    default="127.0.0.1",
+    show_default=True,
+    help="A host to listen on.",
+)
+@click.option(
+    "--port",
+    type=click.IntRange(min=0, max=65535),
+    default=8765,
+    show_default=True,
+    help="A port to listen on.",
+)
+@click.option(
+    "--socket",
+    "socket_path",
+    type=click.Path(dir_okay=False, file_okay=True, writable=True),
+    help="A Unix socket to listen on instead of the `host` and `port`.",
+)
+@click.option(
+    "-w",
+    "--workers",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    help=(
+        "The number of worker processes, i.e., jobs running concurrently. "
+        "Each worker holds its own copy of the profiles."
+    ),
+)
+@click.option(
+    "-T",
+    "--threads",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    help="The number of threads for HMM searches of a single job.",
+)
+@click.option(
+    "-C",
+    "--cache",
+    type=click.Path(dir_okay=False, file_okay=True, writable=True),
+    default=None,
+    help="An annotation cache shared by the jobs (see `tkp-finder find`).",
+)
+@click.option(
+    "--tm_backend",
+    type=click.Choice(TM_BACKEND_NAMES),
+    default="deeptmhmm",
+    show_default=True,
+    help="A backend predicting TM segments (see `tkp-finder find`).",
+)
+@click.option(
+    "-q",
+    "--quiet",
+    is_flag=True,
+    default=False,
+    help="Disable stdout logging."
+)
+def serve(
+    hmm_dir,
+    ann_type,
+    pk_profile,
+    output,
+    host,
+    port,
+    socket_path,
+    workers,
+    threads,
+    cache,
+    tm_backend,
+    quiet,
+):
+    """
+    The command runs a long-lived service annotating TKPs in jobs submitted
+    over a local HTTP API, so that the profiles are loaded only once.
+
+    A job is a JSON object with the `fasta` paths and, optionally,
+    the `output` dir and the options of `tkp-finder find` (except for the
+    `hmm_dir`, `pk_profile` and parallelism):
+
+    curl -d '{"fasta": ["/data/batch.fasta"]}' localhost:8765/jobs?wait=1
+
+    `POST /jobs` responds with the job's id, status, and, with `?wait=1`, its
+    result: the numbers of TKPs, the output locations and the formatted
+    summary. `GET /jobs/<id>` polls a job; `GET /health` checks the service.
+    """
+    level = logging.WARNING if quiet else logging.INFO
+    setup_logger(None, level=level)
+
+    hmm_dir = Path(hmm_dir)
+    if not (hmm_dir / DB_DIR_NAME).is_dir() and not (hmm_dir / "profiles").is_dir():
+        raise ValueError(
+            f"Expected to find `{DB_DIR_NAME}` or `profiles` dir in {hmm_dir}"
+        )
+    if pk_profile is None:
+        pk_profile = hmm_dir / f"{PFAM_PK_NAME}.hmm"
+        if not pk_profile.exists():
+            raise ValueError(
+                f"Expected to find profile {PFAM_PK_NAME} within {hmm_dir}"
+            )
+    output = Path.cwd() / "tkp-finder-jobs" if output is None else Path(output)
+
+    ann_type = list(ann_type)
+    if "ALL" in ann_type:
+        ann_type = list(ANNOTATION_CATEGORIES[:-1])
+    defaults = dict(ann_type=ann_type, threads=threads, tm_backend=tm_backend)
+    if cache is not None:
+        defaults["cache"] = Path(cache).absolute()
+
+    from tkp_finder.serve import FinderService, serve as serve_api
+
+    service = FinderService(
+        hmm_dir.absolute(),
+        Path(pk_profile).absolute(),
+        output.absolute(),
+        categories=[x for x in ann_type if x != "TM"],
+        workers=workers,
+        defaults=defaults,
+    )
+    with service:
+        serve_api(
+            service,
+            host=host,
+            port=port,
+            socket_path=None if socket_path is None else Path(socket_path),
+        )
+
+
+if __name__ == "__main__":
+    tkp_finder()
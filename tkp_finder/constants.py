@@ -0,0 +1,57 @@
+"""
+Names and defaults shared by the command-line interface and the pipeline.
+
+This module must stay free of third-party imports: it is loaded by
+:mod:`tkp_finder.cli` before any of the heavy dependencies are.
+"""
+
+PFAM_A_URL = "https://ftp.ebi.ac.uk/pub/databases/Pfam/current_release/Pfam-A.hmm.gz"
+PFAM_DAT_URL = (
+    "https://ftp.ebi.ac.uk/pub/databases/Pfam/current_release/Pfam-A.hmm.dat.gz"
+)
+PLANT_HMM_URL = (
+    "https://raw.githubusercontent.com/edikedik/tkp-finder/master"
+    "/Appendix_4/Plant_Pkinase_fam.hmm"
+)
+PFAM_A_NAME = "Pfam-A.hmm"
+PFAM_DAT_NAME = "Pfam-A.hmm.dat"
+PLANT_HMM_NAME = "Plant_Pkinase_fam.hmm"
+PFAM_PK_NAME = "PF00069"
+#: A name of the dir with pressed HMM databases within the `hmm_dir`
+DB_DIR_NAME = "db"
+RUN_INFO_NAME = "run_info.json"
+#: A suffix of the archive files written by `find`
+ARCHIVE_SUFFIX = ".chains.db"
+
+PK_NAME = "PK"
+PPK_NAME = "PPK"
+GAP_NAME = "X"
+UNK_HMM = "unknown"
+MOTIF = "KXXXDDXX"
+BLOCK_SIZE = 10000
+SHARD_SIZE = 64
+ANNOTATION_CATEGORIES = (
+    "Coiled-coil",
+    "Disordered",
+    "Domain",
+    "Family",
+    "Motif",
+    "Repeat",
+    "TM",
+    "ALL",
+)
+
+#: Output format => (`pyarrow.dataset` format, extension)
+DATASET_FORMATS = {"parquet": ("parquet", ".parquet"), "arrow": ("ipc", ".arrow")}
+OUTPUT_FORMATS = ("tsv", *DATASET_FORMATS)
+
+#: Names of the backends in :data:`tkp_finder.tkp_finder.TM_BACKENDS`
+TM_BACKEND_NAMES = ("deeptmhmm", "local")
+#: The default size of a single TM job's fasta payload in bytes
+BATCH_BYTES = 2**18
+#: The default number of concurrently running TM jobs
+MAX_JOBS = 8
+
+
+if __name__ == "__main__":
+    raise RuntimeError
@@ -1,30 +1,84 @@
 import logging
-import operator as op
+import threading
+import time
 from collections import abc
-from itertools import filterfalse, chain
+from itertools import filterfalse
 from pathlib import Path
 from tempfile import NamedTemporaryFile
-from time import sleep
+from types import ModuleType
 
-from lXtractor.core.chain import ChainSequence, ChainList
+from lXtractor.core.chain import ChainSequence
 from lXtractor.core.segment import Segment
 from lXtractor.util.seq import write_fasta
-from more_itertools import peekable, zip_equal, chunked
-from tqdm.auto import tqdm
+from more_itertools import peekable
+
+from tkp_finder.cache import AnnotationCache, stage_key
+from tkp_finder.tm import TMBackend, MAX_JOBS
 
 LOGGER = logging.getLogger(__name__)
 
+#: The name of the BioLib application
+APP_NAME = "DTU/DeepTMHMM"
+
+
+class DeepTMHMM(TMBackend):
+    """
+    A remote TM backend: a client of the DeepTMHMM application hosted by
+    BioLib.
 
-class DeepTMHMM:
-    def __init__(self, token: str | None = None):
-        import biolib
+    The application is loaded once per instance when the first job is run.
+    Jobs are polled with backoff and resubmitted on failure.
+    """
+
+    name = "DeepTMHMM"
+
+    def __init__(
+        self,
+        token: str | None = None,
+        max_jobs: int = MAX_JOBS,
+        retries: int = 2,
+        poll_interval: float = 2,
+        max_poll_interval: float = 60,
+        biolib: ModuleType | None = None,
+        cache: AnnotationCache | None = None,
+    ):
+        """
+        :param token: BioLib API token.
+        :param max_jobs: The maximum number of concurrently running jobs.
+        :param retries: The number of times a failed job is resubmitted.
+        :param poll_interval: The initial interval between polling a job's
+            status in seconds. The interval grows exponentially with each poll.
+        :param max_poll_interval: The maximum interval between polls.
+        :param biolib: A module implementing `biolib`'s interface
+            (`load` and `set_api_token`). By default, import `biolib`.
+            Use it to substitute the remote server, e.g., in tests.
+        :param cache: An annotation cache to store the predictions in.
+            Must be used from the thread calling :meth:`submit` and
+            :meth:`collect`.
+        """
+        if biolib is None:
+            import biolib
+
+            biolib.biolib_logging.logger.setLevel(logging.CRITICAL)
 
         if token:
             biolib.set_api_token(token)
 
-        biolib.biolib_logging.logger.setLevel(logging.CRITICAL)
+        super().__init__(max_jobs, cache)
+        self.cache_stage = stage_key("deeptm", APP_NAME)
         self.biolib = biolib
-        self.interface = biolib.load("DTU/DeepTMHMM")
+        self.retries = retries
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self._interface = None
+        self._interface_lock = threading.Lock()
+
+    @property
+    def interface(self):
+        with self._interface_lock:
+            if self._interface is None:
+                self._interface = self.biolib.load(APP_NAME)
+        return self._interface
 
     def run(
         self,
@@ -90,62 +144,39 @@ class DeepTMHMM:
         chunks = inp.split("//")
         return map(parse_chunk, chunks)
 
-    def annotate(
-        self,
-        chains: abc.Iterable[ChainSequence],
-        category: str = "DeepTMHMM",
-        chunk_size: int | None = None,
-        **kwargs,
-    ) -> abc.Generator[ChainSequence]:
-        if not isinstance(chains, ChainList):
-            chains: ChainList[ChainSequence] = ChainList(chains)
-        if chunk_size is None or chunk_size >= len(chains):
-            LOGGER.info("Running a single job")
-            results = self.run(chains)
-        else:
-            LOGGER.info("Submitting parallel jobs")
-            jobs = []
-            with self.biolib.Experiment("tkp-finder"):
-                for i, chunk in enumerate(chunked(chains, chunk_size), start=1):
-                    jobs.append((i, self.run(chunk, blocking=False, parse=False)))
-            experiment = self.biolib.get_experiment("tkp-finder")
-            LOGGER.info(f"Submitted {i} jobs: {experiment.show_jobs()}")
-            outputs = []
-            bar = tqdm(total=len(jobs), desc="Waiting for jobs")
-            while jobs:
-                for x in jobs:
-                    i, j = x
-                    if j.is_finished():
-                        try:
-                            outputs.append(
-                                (
-                                    i,
-                                    self.parse_output_gff(
-                                        j.get_output_file("/TMRs.gff3").get_data()
-                                    ),
-                                )
-                            )
-                        except Exception as e:
-                            LOGGER.exception(e)
-                            LOGGER.warning(
-                                f"Failed to complete a job {j.id} due to {e}"
-                            )
-                        jobs.remove(x)
-                        bar.update(1)
-                if jobs:
-                    sleep(2)
-
-            bar.close()
-            results = list(
-                chain.from_iterable(
-                    map(op.itemgetter(1), sorted(outputs, key=op.itemgetter(0)))
+    def wait(self, job):
+        """
+        Poll the job until it is finished with an exponentially growing
+        interval.
+        """
+        interval = self.poll_interval
+        while not job.is_finished():
+            time.sleep(interval)
+            interval = min(interval * 1.5, self.max_poll_interval)
+
+    def run_batch(self, batch: list[tuple[str, str]]) -> dict[str, list[Segment]]:
+        """
+        Run a single job, resubmitting it up to :attr:`retries` times
+        if it fails.
+
+        :param batch: Pairs of (header, sequence).
+        :return: A mapping from headers to the parsed segments.
+        """
+        for attempt in range(self.retries + 1):
+            try:
+                job = self.run(batch, blocking=False, parse=False)
+                self.wait(job)
+                return dict(
+                    self.parse_output_gff(job.get_output_file("/TMRs.gff3").get_data())
                 )
-            )
-
-        for (c_id, segments), c in zip_equal(results, chains):
-            assert c_id == c.id, "IDs and order are preserved"
-            for s in segments:
-                yield c.spawn_child(s.start, s.end, f"{category}_{s.name}", **kwargs)
+            except Exception as e:
+                if attempt == self.retries:
+                    raise
+                LOGGER.warning(
+                    f"A job of {len(batch)} sequences failed due to {e}; "
+                    f"resubmitting (attempt {attempt + 2}/{self.retries + 1})"
+                )
+                time.sleep(self.poll_interval * 2**attempt)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,16 @@
+"""
+File helpers importable without the scientific dependencies.
+"""
+import gzip
+import typing as t
+from pathlib import Path
+
+
+def open_binary(path: Path) -> t.BinaryIO:
+    """
+    :param path: A path to a file, possibly gzip-compressed.
+    :return: A binary file handle decompressing the file on the fly.
+    """
+    with path.open("rb") as f:
+        is_gzip = f.read(2) == b"\x1f\x8b"
+    return gzip.open(path, "rb") if is_gzip else path.open("rb")
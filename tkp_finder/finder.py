@@ -0,0 +1,315 @@
+"""
+An in-process API to find TKPs with the profiles loaded once.
+"""
+import logging
+import typing as t
+from collections import abc
+from pathlib import Path
+
+from lXtractor.core.chain import ChainList, ChainSequence
+from lXtractor.variables.base import SequenceVariable
+from more_itertools import chunked
+from pyhmmer.easel import DigitalSequenceBlock, SequenceFile, TextSequence
+
+from tkp_finder.cache import AnnotationCache
+from tkp_finder.constants import (
+    ANNOTATION_CATEGORIES,
+    BLOCK_SIZE,
+    MOTIF,
+    PFAM_PK_NAME,
+    PK_NAME,
+    PPK_NAME,
+)
+from tkp_finder.hmm import ProfileStore, decode_name, encode_name
+from tkp_finder.metrics import Metrics
+from tkp_finder.tkp_finder import (
+    TM_BACKENDS,
+    VARIABLES,
+    annotate_by_deep_tm,
+    annotate_by_hmms,
+    annotate_ppks,
+    count_sequences,
+    iter_tkps,
+)
+from tkp_finder.tm import TMBackend
+
+LOGGER = logging.getLogger("tkp-finder")
+
+#: Sequences accepted by :meth:`TKPFinder.find`
+SequencesT = (
+    Path
+    | str
+    | abc.Iterable[Path | str | tuple[str, str] | ChainSequence]
+)
+
+
+def iter_sequences(sequences: SequencesT) -> abc.Generator[tuple[str, str], None, None]:
+    """
+    :param sequences: A path to a fasta file or an iterable over paths to
+        fasta files, `(name, sequence)` pairs and chain sequences in any mix.
+    :return: A generator over `(name, sequence)` pairs. The names of fasta
+        records are their headers' first words.
+    """
+    if isinstance(sequences, (Path, str)):
+        sequences = [sequences]
+    for x in sequences:
+        if isinstance(x, (Path, str)):
+            with SequenceFile(Path(x), format="fasta") as f:
+                for seq in f:
+                    yield decode_name(seq.name), seq.sequence
+        elif isinstance(x, ChainSequence):
+            yield x.name, x.seq1
+        else:
+            name, seq = x
+            yield name, seq
+
+
+def count_input(sequences: SequencesT) -> tuple[SequencesT, int]:
+    """
+    Count the sequences, reading them into memory only if they can't be
+    iterated over twice.
+
+    :param sequences: Sequences (see :func:`iter_sequences`).
+    :return: The `sequences`, turned into a list if they are a one-shot
+        iterable, and their number. Fasta files are counted by their headers
+        without parsing the records.
+    """
+    if isinstance(sequences, (Path, str)):
+        sequences = [sequences]
+    elif not isinstance(sequences, abc.Collection):
+        sequences = list(sequences)
+    num = sum(
+        count_sequences(Path(x)) if isinstance(x, (Path, str)) else 1
+        for x in sequences
+    )
+    return sequences, num
+
+
+class TKPFinder:
+    """
+    Find and annotate TKPs like `tkp-finder find`, but within the current
+    process and without writing any outputs.
+
+    The profiles are loaded at the initialization, and the annotators,
+    the cache and the TM backend are kept, so that repeated :meth:`find`
+    calls pay only for the search. An instance must not be used by several
+    threads at once.
+
+    The TKPs are annotated block by block, while `tkp-finder find`
+    annotates the TKPs of an input (or of its shard) at once. The hits of
+    the category profiles lacking the trusted cutoffs are reported by
+    E-values, which are thus computed for the TKPs of a block, so their
+    annotations may differ unless a single block spans the input. The
+    annotations by the profiles with the cutoffs, such as the Pfam-A ones,
+    are the same.
+
+    >>> with TKPFinder(Path("hmm"), categories=["Family", "Domain"]) as finder:  # doctest: +SKIP
+    ...     for c in finder.find([("seq1", "MSTAV..."), ("seq2", "MKKLE...")]):
+    ...         print(c.name, [x.name for x in c.children])
+    """
+
+    def __init__(
+        self,
+        hmm_dir: Path,
+        pk_profile: Path | None = None,
+        categories: abc.Iterable[str] = ("Family", "Domain", "Motif"),
+        min_pk_domain_size: int = 150,
+        min_pk_domains: int = 2,
+        min_hmm_score: float = 0.0,
+        min_hmm_cov: float = 0.5,
+        motif: str = MOTIF,
+        pk_map_name: str = PK_NAME,
+        ppk_map_name: str = PPK_NAME,
+        seq_variables: abc.Sequence[SequenceVariable] = VARIABLES,
+        threads: int = 1,
+        block_size: int = BLOCK_SIZE,
+        cache: Path | None = None,
+        tm_backend: str | TMBackend = "deeptmhmm",
+    ):
+        """
+        :param hmm_dir: A directory prepared by `tkp-finder setup`.
+        :param pk_profile: A path to the PK HMM profile. By default, the one
+            within the `hmm_dir`.
+        :param categories: Annotation types, as in `tkp-finder find`.
+        :param min_pk_domain_size: The minimum size of a PK domain.
+        :param min_pk_domains: The number of PK domains of a TKP.
+        :param min_hmm_score: The minimum bit score of a domain.
+        :param min_hmm_cov: The minimum coverage of a domain by its profile.
+        :param motif: A motif of a catalytically active PK
+            (see :func:`~tkp_finder.tkp_finder.annotate_ppks`).
+        :param pk_map_name: A name of the PK domains.
+        :param ppk_map_name: A name of the pseudo PK domains.
+        :param seq_variables: Variables of the motif's positions.
+        :param threads: The number of threads for HMM searches.
+        :param block_size: The number of sequences searched at once. The TKPs
+            found in a block are yielded once the block is annotated.
+        :param cache: A path to an annotation cache (see `tkp-finder find`).
+        :param tm_backend: A TM backend instance or a name of one of the
+            :data:`~tkp_finder.tkp_finder.TM_BACKENDS`, used if the
+            `categories` include "TM".
+        """
+        categories = list(categories)
+        if "ALL" in categories:
+            categories = list(ANNOTATION_CATEGORIES[:-1])
+        self.categories = [x for x in categories if x != "TM"]
+        self.min_pk_domain_size = min_pk_domain_size
+        self.min_pk_domains = min_pk_domains
+        self.min_hmm_score = min_hmm_score
+        self.min_hmm_cov = min_hmm_cov
+        self.motif = motif
+        self.pk_map_name = pk_map_name
+        self.ppk_map_name = ppk_map_name
+        self.seq_variables = seq_variables
+        self.threads = threads
+        self.block_size = block_size
+
+        self.pk_profile = Path(pk_profile or hmm_dir / f"{PFAM_PK_NAME}.hmm")
+        self.profiles = ProfileStore(hmm_dir).preload(self.categories)
+        self.pk_hmm = self.profiles.file(self.pk_profile)
+        self.cache = None if cache is None else AnnotationCache(Path(cache))
+
+        self.tm: TMBackend | None = None
+        self._owns_tm = False
+        if "TM" in categories:
+            if isinstance(tm_backend, str):
+                self.tm = TM_BACKENDS[tm_backend](cache=self.cache)
+                self._owns_tm = True
+            else:
+                self.tm = tm_backend
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """
+        Close the cache and the TM backend, unless the latter was provided.
+        """
+        if self.tm is not None and self._owns_tm:
+            self.tm.close()
+        if self.cache is not None:
+            LOGGER.info(f"Cache hit rates: {self.cache.report()}")
+            self.cache.close()
+            self.cache = None
+
+    def read_blocks(
+        self, sequences: SequencesT
+    ) -> abc.Generator[tuple[list[str], DigitalSequenceBlock], None, None]:
+        """
+        :param sequences: Sequences (see :func:`iter_sequences`).
+        :return: A generator over pairs of sequence names and digital
+            sequence blocks of at most :attr:`block_size` sequences named by
+            their index within a block.
+        """
+        alphabet = self.pk_hmm.alphabet
+        for batch in chunked(iter_sequences(sequences), self.block_size):
+            block = DigitalSequenceBlock(
+                alphabet,
+                (
+                    TextSequence(name=encode_name(str(i)), sequence=seq).digitize(
+                        alphabet
+                    )
+                    for i, (_, seq) in enumerate(batch)
+                ),
+            )
+            yield [name for name, _ in batch], block
+
+    def find(
+        self, sequences: SequencesT, metrics: Metrics | None = None
+    ) -> abc.Generator[ChainSequence, None, None]:
+        """
+        Find and annotate TKPs block by block.
+
+        :param sequences: A path to a fasta file or an iterable over paths,
+            `(name, sequence)` pairs and chain sequences
+            (see :func:`iter_sequences`). Consumed lazily. If the PK profile
+            lacks the trusted cutoffs, the discovery relies on E-values
+            computed for all the `sequences`, like `tkp-finder find` does
+            for an input. The `sequences` are then counted beforehand (see
+            :func:`count_input`).
+        :param metrics: Metrics to record the stages of each block in.
+        :return: A generator over new chain sequences of the TKPs, annotated
+            like the ones found by `tkp-finder find` (see the notes on the
+            profiles without cutoffs above). The TKPs of
+            a block are yielded once the block is annotated. Repeated
+            sequences are yielded once.
+        """
+        if metrics is None:
+            # Collected, but discarded
+            metrics = Metrics()
+        pk_checksum = (
+            None if self.cache is None else self.profiles.file_checksum(self.pk_profile)
+        )
+        seen: set[str] = set()
+        num_seqs = None
+        if not self.pk_hmm.cutoffs.trusted_available():
+            sequences, num_seqs = count_input(sequences)
+
+        for i, block in enumerate(self.read_blocks(sequences)):
+            inp = f"block{i}"
+            with metrics.stage(inp, "discovery") as m:
+                m.count("profiles")
+                chains = ChainList(
+                    next(
+                        iter_tkps(
+                            [block],
+                            self.pk_hmm,
+                            min_size=self.min_pk_domain_size,
+                            min_domains=self.min_pk_domains,
+                            min_cov=self.min_hmm_cov,
+                            min_score=self.min_hmm_score,
+                            map_name=self.pk_map_name,
+                            threads=self.threads,
+                            num_seqs=num_seqs,
+                            cache=self.cache,
+                            checksum=pk_checksum,
+                            metrics=m,
+                            seen=seen,
+                        )
+                    )
+                )
+            if len(chains) == 0:
+                continue
+
+            for category in self.categories:
+                with metrics.stage(inp, f"annotation:{category}") as m:
+                    chains = annotate_by_hmms(
+                        chains,
+                        hmms=self.profiles[category],
+                        hmm_type=category,
+                        min_score=self.min_hmm_score,
+                        min_cov_hmm=self.min_hmm_cov,
+                        threads=self.threads,
+                        cache=self.cache,
+                        checksum=(
+                            None
+                            if self.cache is None
+                            else self.profiles.checksum(category)
+                        ),
+                        resolve_overlaps=True,
+                        metrics=m,
+                    )
+
+            with metrics.stage(inp, "ppk") as m:
+                m.count("sequences", len(chains))
+                annotate_ppks(
+                    chains.collapse_children(),
+                    [v.p for v in self.seq_variables],
+                    pk_name=self.pk_map_name,
+                    ppk_name=self.ppk_map_name,
+                    motif=self.motif,
+                )
+
+            if self.tm is not None:
+                # As in `find`, after the PPKs are named
+                with metrics.stage(inp, "annotation:TM") as m:
+                    m.count("sequences", len(chains))
+                    annotate_by_deep_tm(chains, self.tm, category="TM")
+
+            yield from chains
+
+
+if __name__ == "__main__":
+    raise RuntimeError
@@ -0,0 +1,1054 @@
+import hashlib
+import io
+import json
+import logging
+import multiprocessing
+import operator as op
+import os
+import queue
+import shutil
+import threading
+import typing as t
+from collections import abc, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import suppress
+from itertools import count, islice
+from pathlib import Path
+
+import numpy as np
+from pyhmmer.easel import Alphabet, DigitalSequenceBlock, SequenceFile, TextSequence
+from pyhmmer.hmmer import hmmsearch, hmmpress
+from pyhmmer.plan7 import HMM, HMMFile, TopHits, Alignment, Domain, OptimizedProfile
+from tqdm.auto import tqdm
+
+from tkp_finder.constants import DB_DIR_NAME
+from tkp_finder.files import open_binary
+from tkp_finder.intervals import select_non_overlapping
+
+if t.TYPE_CHECKING:
+    # Press workers import this module, but never need lXtractor
+    from lXtractor.core.chain import ChainSequence
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_FORMAT = 2
+#: A subdirectory of the databases' dir to press the databases in
+STAGING_DIR_NAME = ".staging"
+PRESSED_EXT = (".h3m", ".h3i", ".h3f", ".h3p")
+
+LOGGER = logging.getLogger(__name__)
+
+_ProfileT = HMM | OptimizedProfile
+
+
+class DomainHit(t.NamedTuple):
+    """
+    An accepted domain hit of a profile.
+    """
+
+    #: An index of the sequence within the searched block
+    seq_idx: int
+    #: An index of the profile within :attr:`BatchHMMer.hmms`
+    profile_idx: int
+    #: A map name of the hit, i.e., `{prefix}_{name}`
+    map_name: str
+    #: An index of the domain within the sequence's hit, starting from 1
+    dom_i: int
+    #: Start of the domain within the sequence
+    start: int
+    #: End of the domain within the sequence
+    end: int
+    score: float
+    pvalue: float
+    bias: float
+    #: The profile numbering of the sequence covered by the domain
+    numbering: list[int | None]
+    cov_seq: float
+    cov_hmm: float
+
+
+class HitTable:
+    """
+    A columnar table of domain hits.
+
+    Scalar fields of :class:`DomainHit` are stored as numpy arrays, and map
+    names are stored once per distinct name. Filtering and overlap
+    resolution operate on the arrays, so that chain children are spawned
+    (see :meth:`spawn`) only for the hits that survive them.
+    """
+
+    #: Numeric columns and their types
+    COLUMNS = {
+        "seq_idx": np.int64,
+        "profile_idx": np.int32,
+        "dom_i": np.int32,
+        "start": np.int64,
+        "end": np.int64,
+        "score": np.float64,
+        "pvalue": np.float64,
+        "bias": np.float64,
+        "cov_seq": np.float64,
+        "cov_hmm": np.float64,
+    }
+
+    def __init__(
+        self,
+        columns: dict[str, np.ndarray],
+        name_idx: np.ndarray,
+        names: list[str],
+        numbering: list[list[int | None]],
+    ):
+        """
+        :param columns: A mapping from :attr:`COLUMNS` to arrays.
+        :param name_idx: An index of each hit's map name within `names`.
+        :param names: Distinct map names.
+        :param numbering: Profile numbering of each hit.
+        """
+        self.columns = columns
+        self.name_idx = name_idx
+        self.names = names
+        self.numbering = numbering
+
+    def __len__(self) -> int:
+        return len(self.name_idx)
+
+    def __getitem__(self, column: str) -> np.ndarray:
+        return self.columns[column]
+
+    @classmethod
+    def from_hits(cls, hits: abc.Iterable[DomainHit]) -> "HitTable":
+        hits = list(hits)
+        name2idx = {}
+        name_idx = np.fromiter(
+            (name2idx.setdefault(h.map_name, len(name2idx)) for h in hits),
+            dtype=np.int32,
+            count=len(hits),
+        )
+        columns = {
+            col: np.fromiter(
+                map(op.attrgetter(col), hits), dtype=dtype, count=len(hits)
+            )
+            for col, dtype in cls.COLUMNS.items()
+        }
+        return cls(columns, name_idx, list(name2idx), [h.numbering for h in hits])
+
+    def select(self, idx: np.ndarray) -> "HitTable":
+        """
+        :param idx: A boolean mask or an array of indices.
+        :return: A new table with the selected hits.
+        """
+        if idx.dtype == bool:
+            idx = np.flatnonzero(idx)
+        return HitTable(
+            {k: v[idx] for k, v in self.columns.items()},
+            self.name_idx[idx],
+            self.names,
+            [self.numbering[i] for i in idx],
+        )
+
+    def resolve_overlaps(self, values: np.ndarray | None = None) -> "HitTable":
+        """
+        Keep non-overlapping hits of each sequence with the maximum
+        cumulative value.
+
+        :param values: Values of hits. By default, use the scores.
+        :return: A new table with the selected hits.
+        """
+        if values is None:
+            values = self["score"]
+        return self.select(
+            select_non_overlapping(self["seq_idx"], self["start"], self["end"], values)
+        )
+
+    def __iter__(self) -> abc.Iterator[DomainHit]:
+        rows = zip(*(self.columns[c].tolist() for c in self.COLUMNS))
+        for row, name_i, numbering in zip(
+            rows, self.name_idx.tolist(), self.numbering
+        ):
+            yield DomainHit(
+                map_name=self.names[name_i],
+                numbering=numbering,
+                **dict(zip(self.COLUMNS, row)),
+            )
+
+    def spawn(
+        self, chains: abc.Sequence["ChainSequence"], **kwargs
+    ) -> abc.Generator["ChainSequence", None, None]:
+        """
+        Spawn children for the hits in the table.
+
+        :param chains: Chains indexed by the hits' `seq_idx`.
+        :param kwargs: Passed to :func:`spawn_hit`.
+        :return: A generator over spawned children.
+        """
+        for hit in self:
+            yield spawn_hit(chains[hit.seq_idx], hit, **kwargs)
+
+
+class BatchHMMer:
+    """
+    Search a collection of HMM profiles against a shared block of sequences
+    in a single pass.
+
+    Unlike `lXtractor.ext.hmm.PyHMMer` working with a single model, the
+    sequences are digitized once and all profiles are searched against them
+    by `pyhmmer.hmmer.hmmsearch`. Each profile is searched against the full
+    block, so the E-values are computed the same way as for a one-profile
+    search.
+
+    With `cpus > 1`, the profiles are distributed across threads. If there
+    are fewer profiles than threads (e.g., a single PK profile), the
+    sequence block is split into shards searched concurrently, and the
+    hits of each profile are merged. The shards are searched with `Z` set
+    to the size of the whole block, but `domZ` is left to each shard's
+    pipeline, which counts the sequences passing the reporting threshold.
+    `TopHits.merge` sums these counts and re-applies the thresholds, so the
+    merged hits have the `domZ`, the E-values and the reported domains of
+    a search over the whole block. An explicitly passed `domZ` is kept as
+    is, like in an unsharded search.
+    """
+
+    def __init__(
+        self,
+        hmms: abc.Iterable[tuple[str, _ProfileT]],
+        bit_cutoffs: str | None = "trusted",
+        cpus: int = 1,
+        **kwargs,
+    ):
+        """
+        :param hmms: An iterable over `(name, hmm)` pairs, where `hmm` is
+            either an `HMM` or an `OptimizedProfile` loaded from a pressed
+            database. The name is used to compose the map names of the
+            spawned children.
+        :param bit_cutoffs: Use these model-specific cutoffs. The profiles
+            missing them are searched without cutoffs.
+        :param cpus: The number of threads to search with.
+        :param kwargs: Passed to the `Pipeline` of each search.
+        """
+        self.hmms: list[tuple[str, _ProfileT]] = list(hmms)
+        if not self.hmms:
+            raise ValueError("No HMM profiles provided")
+        self.alphabet = self.hmms[0][1].alphabet
+        self.bit_cutoffs = bit_cutoffs
+        self.cpus = cpus
+        self.kwargs = kwargs
+        #: Hits of each profile resulting from the most recent search
+        self.hits_: list[TopHits] | None = None
+
+    def digitize(self, seqs: abc.Iterable[str]) -> DigitalSequenceBlock:
+        """
+        :param seqs: An iterable over sequences.
+        :return: A block of digital sequences named by their index in `seqs`.
+        """
+        return DigitalSequenceBlock(
+            self.alphabet,
+            (
+                TextSequence(name=encode_name(str(i)), sequence=s).digitize(self.alphabet)
+                for i, s in enumerate(seqs)
+            ),
+        )
+
+    def _has_cutoffs(self) -> list[bool]:
+        return [
+            getattr(hmm.cutoffs, f"{self.bit_cutoffs}_available")()
+            for _, hmm in self.hmms
+        ]
+
+    @property
+    def uses_evalues(self) -> bool:
+        """
+        Whether any profile is searched without bit score cutoffs. The hits
+        of such a profile are reported by E-values and thus depend on the
+        whole searched block rather than on each sequence alone.
+        """
+        return self.bit_cutoffs is None or not all(self._has_cutoffs())
+
+    def search(
+        self,
+        seqs: DigitalSequenceBlock,
+        callback: abc.Callable[[_ProfileT, int], None] | None = None,
+        **kwargs,
+    ) -> list[TopHits]:
+        """
+        :param seqs: A block of digital sequences.
+        :param callback: Called after each profile is searched.
+        :param kwargs: Passed to the `Pipeline`, taking precedence over the
+            ones passed during the initialization.
+        :return: Top hits for each profile in the order of :attr:`hmms`.
+        """
+        if self.bit_cutoffs is None:
+            groups = [(list(range(len(self.hmms))), {})]
+        else:
+            has_cutoffs = self._has_cutoffs()
+            groups = [
+                (
+                    [i for i, x in enumerate(has_cutoffs) if x],
+                    {"bit_cutoffs": self.bit_cutoffs},
+                ),
+                ([i for i, x in enumerate(has_cutoffs) if not x], {}),
+            ]
+
+        hits: list[TopHits | None] = [None] * len(self.hmms)
+        for idx, options in groups:
+            if not idx:
+                continue
+            queries = [self.hmms[i][1] for i in idx]
+            results = self._search(
+                queries, seqs, callback, **options, **self.kwargs | kwargs
+            )
+            for i, res in zip(idx, results, strict=True):
+                hits[i] = res
+
+        self.hits_ = hits
+        return hits
+
+    def _search(
+        self,
+        queries: list[_ProfileT],
+        seqs: DigitalSequenceBlock,
+        callback: abc.Callable[[_ProfileT, int], None] | None,
+        **options,
+    ) -> abc.Iterable[TopHits]:
+        num_shards = min(self.cpus // len(queries), len(seqs))
+        if num_shards <= 1:
+            return hmmsearch(
+                queries, seqs, cpus=self.cpus, callback=callback, **options
+            )
+
+        # Each shard's `domZ` is the number of its sequences passing the
+        # reporting threshold, evaluated with the whole block's `Z`, so the
+        # merge sums them into the `domZ` of the whole block.
+        options = {"Z": len(seqs), **options}
+
+        def search_shard(shard: DigitalSequenceBlock) -> list[TopHits]:
+            return list(
+                hmmsearch(queries, shard, cpus=self.cpus // num_shards, **options)
+            )
+
+        bounds = [len(seqs) * i // num_shards for i in range(num_shards + 1)]
+        shards = [seqs[start:end] for start, end in zip(bounds, bounds[1:])]
+        with ThreadPoolExecutor(num_shards) as executor:
+            results = list(executor.map(search_shard, shards))
+
+        merged = [fst.merge(*rest) for fst, *rest in zip(*results)]
+        if callback is not None:
+            for q in queries:
+                callback(q, len(queries))
+        return merged
+
+    def iter_hits(
+        self,
+        prefix: str | None = None,
+        min_score: float | None = None,
+        min_size: int | None = None,
+        min_cov_hmm: float | None = None,
+        min_cov_seq: float | None = None,
+    ) -> abc.Generator[DomainHit, None, None]:
+        """
+        Iterate over the accepted domain hits of the most recent search.
+
+        :param prefix: A prefix of the map names.
+        :param min_score: Min hit score.
+        :param min_size: Min hit size.
+        :param min_cov_hmm: Min HMM model coverage.
+        :param min_cov_seq: Min coverage of a sequence by the HMM model nodes.
+        :return: A generator over domain hits grouped by profile.
+        """
+
+        def accept_domain(d: Domain, cov_hmm: float, cov_seq: float) -> bool:
+            acc_cov_hmm = min_cov_hmm is None or cov_hmm >= min_cov_hmm
+            acc_cov_seq = min_cov_seq is None or cov_seq >= min_cov_seq
+            acc_score = min_score is None or d.score >= min_score
+            acc_size = min_size is None or (
+                d.alignment.target_to - d.alignment.target_from >= min_size
+            )
+            return acc_cov_hmm and acc_cov_seq and acc_score and acc_size
+
+        if self.hits_ is None:
+            raise ValueError("No hits: run the `search` first")
+
+        for profile_idx, ((name, hmm), hits) in enumerate(
+            zip(self.hmms, self.hits_, strict=True)
+        ):
+            map_name = name if prefix is None else f"{prefix}_{name}"
+            for hit in hits:
+                seq_idx = int(decode_name(hit.name))
+
+                for dom_i, dom in enumerate(hit.domains, start=1):
+                    aln = dom.alignment
+                    num = [hmm_i for seq_i, hmm_i in enumerate_numbering(aln) if seq_i]
+                    n = sum(1 for x in num if x is not None)
+                    cov_seq = n / len(num)
+                    cov_hmm = n / hmm.M
+
+                    if not accept_domain(dom, cov_hmm, cov_seq):
+                        continue
+
+                    yield DomainHit(
+                        seq_idx,
+                        profile_idx,
+                        map_name,
+                        dom_i,
+                        aln.target_from,
+                        aln.target_to,
+                        dom.score,
+                        dom.pvalue,
+                        dom.bias,
+                        num,
+                        cov_seq,
+                        cov_hmm,
+                    )
+
+    def annotate(
+        self,
+        chains: abc.Sequence["ChainSequence"],
+        prefix: str | None = None,
+        min_score: float | None = None,
+        min_size: int | None = None,
+        min_cov_hmm: float | None = None,
+        min_cov_seq: float | None = None,
+        callback: abc.Callable[[_ProfileT, int], None] | None = None,
+        **kwargs,
+    ) -> abc.Generator["ChainSequence", None, None]:
+        """
+        Annotate chains by domain hits of every profile.
+
+        The children and their meta are the same as the ones produced by
+        `PyHMMer.annotate` with the `new_map_name` set to `{prefix}_{name}`.
+
+        :param chains: A sequence of chains to annotate.
+        :param prefix: A prefix of the map names.
+        :param min_score: Min hit score.
+        :param min_size: Min hit size.
+        :param min_cov_hmm: Min HMM model coverage.
+        :param min_cov_seq: Min coverage of a sequence by the HMM model nodes.
+        :param callback: Called after each profile is searched.
+        :param kwargs: Passed to the `spawn_child` method.
+        :return: A generator over spawned children.
+        """
+        if len(chains) == 0:
+            return
+
+        self.search(self.digitize(c.seq1 for c in chains), callback)
+
+        for hit in self.iter_hits(prefix, min_score, min_size, min_cov_hmm, min_cov_seq):
+            yield spawn_hit(chains[hit.seq_idx], hit, **kwargs)
+
+
+def spawn_hit(obj: "ChainSequence", hit: DomainHit, **kwargs) -> "ChainSequence":
+    """
+    Spawn a child from the domain hit, setting the map to profile's numbering
+    and the hit's meta data.
+
+    :param obj: A chain sequence the hit belongs to.
+    :param hit: A domain hit.
+    :param kwargs: Passed to the `spawn_child` method.
+    :return: The spawned child.
+    """
+    map_name = hit.map_name
+    sub = obj.spawn_child(hit.start, hit.end, f"{map_name}_{hit.dom_i}", **kwargs)
+    sub.add_seq(map_name, hit.numbering)
+    sub.meta[f"{map_name}_pvalue"] = hit.pvalue
+    sub.meta[f"{map_name}_score"] = hit.score
+    sub.meta[f"{map_name}_bias"] = hit.bias
+    sub.meta[f"{map_name}_cov_seq"] = hit.cov_seq
+    sub.meta[f"{map_name}_cov_hmm"] = hit.cov_hmm
+    return sub
+
+
+class HMMRecord(t.NamedTuple):
+    """
+    A raw HMMER3 text record of a profile.
+    """
+
+    name: str
+    accession: str | None
+    #: The record's text, including the terminating `//` line
+    data: bytes
+
+
+def iter_hmm_records(f: t.BinaryIO) -> abc.Generator[HMMRecord, None, None]:
+    """
+    Split an HMMER3 text stream into records without parsing the profiles.
+
+    :param f: A binary file handle, e.g., obtained via :func:`~tkp_finder.files.open_binary`.
+    :return: A generator over records.
+    """
+    lines, name, acc, in_header = [], None, None, True
+    for line in f:
+        lines.append(line)
+        if in_header:
+            if line.startswith(b"NAME "):
+                name = line[5:].strip().decode("utf-8")
+            elif line.startswith(b"ACC "):
+                acc = line[4:].strip().decode("utf-8")
+            elif line.startswith(b"HMM "):
+                in_header = False
+        elif line.startswith(b"//"):
+            if name is None:
+                raise ValueError("Encountered an HMM record without NAME")
+            yield HMMRecord(name, acc, b"".join(lines))
+            lines, name, acc, in_header = [], None, None, True
+
+
+def _press_worker(path: Path, batches, results):
+    def hmms():
+        for batch in iter(batches.get, None):
+            with HMMFile(io.BytesIO(batch)) as f:
+                yield from f
+
+    try:
+        for ext in PRESSED_EXT:
+            path.with_name(path.name + ext).unlink(missing_ok=True)
+        results.put((path, hmmpress(hmms(), path), None))
+    except Exception as e:
+        results.put((path, 0, repr(e)))
+
+
+class DatabaseWriter:
+    """
+    Collect HMMs into per-category binary databases.
+
+    Each category is pressed by its own worker process, which receives the
+    profiles as raw text records in batches and presses them
+    (`.h3m`, `.h3i`, `.h3f`, `.h3p`) as they arrive. Hence, categories are
+    pressed in parallel, and no intermediate text files are written.
+
+    The databases are pressed into a staging directory first. On
+    :meth:`press`, only the categories whose profiles were added, removed
+    or changed since the previous manifest replace the existing databases,
+    and the databases of the categories no longer present are removed.
+    The manifest records the names, versions and checksums of the profiles
+    in the database order, and a fingerprint of all the databases
+    (see :func:`manifest_fingerprint`).
+    """
+
+    def __init__(
+        self,
+        db_dir: Path,
+        processes: bool = True,
+        batch_bytes: int = 2**22,
+        max_batches: int = 8,
+    ):
+        """
+        :param db_dir: A directory to write the databases to.
+        :param processes: Press in worker processes. Otherwise, use threads.
+        :param batch_bytes: The approximate size of a batch of records
+            sent to a worker.
+        :param max_batches: The maximum number of batches waiting for a
+            worker. Bounds the memory if a worker is slower than the input.
+        """
+        self.db_dir = db_dir
+        self.staging_dir = db_dir / STAGING_DIR_NAME
+        self.previous = read_manifest(db_dir)
+        self._previous_checksums = {
+            (c, n): x
+            for c, e in (self.previous or {"categories": {}})["categories"].items()
+            for n, x in zip(e["profiles"], e.get("checksums", []))
+        }
+        self.names: dict[str, list[str]] = defaultdict(list)
+        self.versions: dict[str, list[str | None]] = defaultdict(list)
+        self.checksums: dict[str, list[str]] = defaultdict(list)
+        self.batch_bytes = batch_bytes
+        self.max_batches = max_batches
+        self._ctx = multiprocessing.get_context() if processes else threading
+        self._results = multiprocessing.Queue() if processes else queue.Queue()
+        #: category => (worker, queue of batches)
+        self._workers = {}
+        #: category => records of the current batch
+        self._batches: dict[str, list[bytes]] = defaultdict(list)
+        self._batch_sizes: dict[str, int] = defaultdict(int)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        for worker, batches in self._workers.values():
+            if isinstance(worker, threading.Thread):
+                # Threads can't be terminated: drop the pending batches
+                # and let the worker finish
+                with suppress(queue.Empty):
+                    while True:
+                        batches.get_nowait()
+                batches.put(None)
+            else:
+                worker.terminate()
+            worker.join()
+        self._workers = {}
+
+    def _queue(self, category: str):
+        if category not in self._workers:
+            self.staging_dir.mkdir(exist_ok=True, parents=True)
+            if self._ctx is threading:
+                batches = queue.Queue(self.max_batches)
+            else:
+                batches = self._ctx.Queue(self.max_batches)
+            worker = self._ctx.Thread if self._ctx is threading else self._ctx.Process
+            worker = worker(
+                target=_press_worker,
+                args=(self.staging_dir / f"{category}.hmm", batches, self._results),
+                daemon=True,
+            )
+            worker.start()
+            self._workers[category] = (worker, batches)
+        return self._workers[category]
+
+    def _send(self, category: str, batch: bytes | None):
+        worker, batches = self._queue(category)
+        while True:
+            try:
+                batches.put(batch, timeout=1)
+                return
+            except queue.Full:
+                if not worker.is_alive():
+                    raise RuntimeError(f"A worker pressing {category} failed")
+
+    def _flush(self, category: str):
+        if self._batches[category]:
+            self._send(category, b"".join(self._batches[category]))
+            self._batches[category] = []
+            self._batch_sizes[category] = 0
+
+    def previous_checksum(self, category: str, name: str) -> str | None:
+        """
+        :return: A checksum of the profile in the previous manifest or
+            ``None`` if it wasn't there.
+        """
+        return self._previous_checksums.get((category, name))
+
+    def add(self, category: str, name: str, hmm: HMM) -> str:
+        buffer = io.BytesIO()
+        hmm.write(buffer)
+        version = decode_name(hmm.accession) if hmm.accession else None
+        return self.add_record(category, name, buffer.getvalue(), version)
+
+    def add_record(
+        self, category: str, name: str, record: bytes, version: str | None = None
+    ) -> str:
+        """
+        :param category: A category of the profile.
+        :param name: A name of the profile to record in the manifest.
+        :param record: An HMMER3 text record of the profile.
+        :param version: A version of the profile, e.g., its versioned
+            accession.
+        :return: The profile's checksum.
+        """
+        self._queue(category)
+        self._batches[category].append(record)
+        self._batch_sizes[category] += len(record)
+        checksum = hashlib.sha256(record).hexdigest()
+        self.names[category].append(name)
+        self.versions[category].append(version)
+        self.checksums[category].append(checksum)
+        if self._batch_sizes[category] >= self.batch_bytes:
+            self._flush(category)
+        return checksum
+
+    def _is_current(self, category: str) -> bool:
+        # Whether the existing database of a category holds the same profiles
+        if self.previous is None or category not in self.previous["categories"]:
+            return False
+        entry = self.previous["categories"][category]
+        return (
+            entry["profiles"] == self.names[category]
+            and entry.get("checksums") == self.checksums[category]
+            and all(
+                (self.db_dir / f"{entry['db']}{ext}").exists() for ext in PRESSED_EXT
+            )
+        )
+
+    def _log_changes(self, category: str):
+        entry = {} if self.previous is None else self.previous["categories"]
+        entry = entry.get(category, {})
+        old = dict(zip(entry.get("profiles", []), entry.get("checksums", [])))
+        new = dict(zip(self.names[category], self.checksums[category]))
+        changed = sum(1 for k in old.keys() & new.keys() if old[k] != new[k])
+        LOGGER.info(
+            f"Updating {category}: {len(new.keys() - old.keys())} added, "
+            f"{len(old.keys() - new.keys())} removed, {changed} changed profiles"
+        )
+
+    def press(self, verbose: bool = False) -> dict:
+        """
+        Wait for the categories to be pressed and write the manifest.
+
+        :param verbose: Display a progress bar.
+        :return: The manifest.
+        """
+        for category in list(self._workers):
+            self._flush(category)
+            self._send(category, None)
+
+        pressed = {}
+        bar = tqdm(
+            total=len(self._workers),
+            desc="Pressing HMM databases",
+            disable=not verbose,
+        )
+        while len(pressed) < len(self._workers):
+            try:
+                path, num_pressed, error = self._results.get(timeout=1)
+            except queue.Empty:
+                # A worker may have exited without reporting, e.g., if killed
+                pending = [
+                    w
+                    for c, (w, _) in self._workers.items()
+                    if self.staging_dir / f"{c}.hmm" not in pressed
+                ]
+                if all(w.is_alive() for w in pending):
+                    continue
+                try:
+                    path, num_pressed, error = self._results.get(timeout=10)
+                except queue.Empty:
+                    raise RuntimeError("A worker pressing HMM databases failed")
+            if error is not None:
+                raise RuntimeError(f"Failed to press {path}: {error}")
+            pressed[path] = num_pressed
+            bar.update(1)
+        bar.close()
+        for worker, _ in self._workers.values():
+            worker.join()
+        self._workers = {}
+
+        for category in sorted(self.names):
+            staged = self.staging_dir / f"{category}.hmm"
+            num_pressed = pressed[staged]
+            if num_pressed != len(self.names[category]):
+                raise RuntimeError(
+                    f"Pressed {num_pressed} profiles for {category}, "
+                    f"expected {len(self.names[category])}"
+                )
+
+        previous = {} if self.previous is None else self.previous["categories"]
+        categories = {}
+        for category in sorted(self.names):
+            staged = self.staging_dir / f"{category}.hmm"
+            path = self.db_dir / f"{category}.hmm"
+            if self._is_current(category):
+                LOGGER.info(f"{category} profiles are up to date")
+                checksum = previous[category].get("checksum")
+            else:
+                self._log_changes(category)
+                for ext in PRESSED_EXT:
+                    os.replace(f"{staged}{ext}", f"{path}{ext}")
+                LOGGER.info(
+                    f"Pressed {pressed[staged]} {category} profiles into {path}"
+                )
+                checksum = None
+            categories[category] = {
+                "db": path.name,
+                "checksum": checksum or file_checksum(Path(f"{path}.h3m")),
+                "profiles": self.names[category],
+                "versions": self.versions[category],
+                "checksums": self.checksums[category],
+            }
+        if self.staging_dir.exists():
+            shutil.rmtree(self.staging_dir)
+
+        for category, entry in previous.items():
+            if category not in categories:
+                LOGGER.info(f"Removing {category} profiles")
+                for ext in PRESSED_EXT:
+                    (self.db_dir / f"{entry['db']}{ext}").unlink(missing_ok=True)
+
+        manifest = {"format": MANIFEST_FORMAT, "categories": categories}
+        manifest["fingerprint"] = manifest_fingerprint(manifest)
+        write_manifest(manifest, self.db_dir)
+        self.previous = manifest
+        return manifest
+
+
+def read_manifest(db_dir: Path) -> dict | None:
+    """
+    :param db_dir: A directory with pressed databases.
+    :return: The manifest or ``None`` if it doesn't exist.
+    """
+    path = db_dir / MANIFEST_NAME
+    if not path.exists():
+        return None
+    with path.open() as f:
+        return json.load(f)
+
+
+def write_manifest(manifest: dict, db_dir: Path) -> Path:
+    path = db_dir / MANIFEST_NAME
+    tmp = path.with_suffix(".tmp")
+    with tmp.open("w") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp, path)
+    return path
+
+
+def manifest_fingerprint(manifest: dict) -> str:
+    """
+    :param manifest: A manifest of the databases.
+    :return: A digest of the names and checksums of all the profiles or,
+        for older manifests lacking them, of the databases' checksums.
+    """
+    parts = {
+        c: list(zip(e["profiles"], e["checksums"])) if "checksums" in e
+        else e.get("checksum")
+        for c, e in sorted(manifest["categories"].items())
+    }
+    return hashlib.sha256(json.dumps(parts).encode("utf-8")).hexdigest()
+
+
+def database_fingerprint(hmm_dir: Path) -> str:
+    """
+    :param hmm_dir: A directory prepared by `tkp-finder setup`.
+    :return: A fingerprint of the profiles :func:`load_profiles` would load
+        across all categories.
+    """
+    manifest = read_manifest(hmm_dir / DB_DIR_NAME)
+    if manifest is not None:
+        return manifest.get("fingerprint") or manifest_fingerprint(manifest)
+    profiles_dir = hmm_dir / "profiles"
+    categories = sorted(
+        p.name for p in profiles_dir.glob("*") if p.is_dir()
+    )
+    parts = {c: profiles_checksum(hmm_dir, c) for c in categories}
+    return hashlib.sha256(json.dumps(parts).encode("utf-8")).hexdigest()
+
+
+def load_database(
+    db_dir: Path, category: str, manifest: dict | None = None
+) -> list[tuple[str, OptimizedProfile]]:
+    """
+    :param db_dir: A directory with pressed databases.
+    :param category: The name of the category.
+    :param manifest: A loaded manifest. If not provided, will read it
+        from the `db_dir`.
+    :return: A list of `(name, profile)` pairs.
+    """
+    manifest = manifest or read_manifest(db_dir)
+    if manifest is None or category not in manifest["categories"]:
+        raise KeyError(f"No database for {category} in {db_dir}")
+    entry = manifest["categories"][category]
+    with HMMFile(db_dir / entry["db"]) as f:
+        if not f.is_pressed():
+            raise ValueError(f"Database {entry['db']} in {db_dir} is not pressed")
+        profiles = list(f.optimized_profiles())
+    return list(zip(entry["profiles"], profiles, strict=True))
+
+
+def read_from_database(db_dir: Path, category: str, name: str) -> HMM:
+    """
+    :param db_dir: A directory with pressed databases.
+    :param category: The name of the category.
+    :param name: The name of the profile as recorded in the manifest.
+    :return: The HMM read from the binary `.h3m` file.
+    """
+    manifest = read_manifest(db_dir)
+    if manifest is None or category not in manifest["categories"]:
+        raise KeyError(f"No database for {category} in {db_dir}")
+    entry = manifest["categories"][category]
+    try:
+        idx = entry["profiles"].index(name)
+    except ValueError as e:
+        raise KeyError(f"No profile {name} in the {category} database") from e
+    with HMMFile(db_dir / f"{entry['db']}.h3m") as f:
+        return next(islice(f, idx, None))
+
+
+def load_profiles(hmm_dir: Path, category: str) -> list[tuple[str, _ProfileT]]:
+    """
+    Load the profiles of a category, preferring the pressed database
+    prepared by `tkp-finder setup`. If there is none, fall back to the
+    per-profile files in `profiles/<category>`.
+
+    :param hmm_dir: A directory prepared by `tkp-finder setup`.
+    :param category: The name of the category.
+    :return: A list of `(name, profile)` pairs.
+    """
+    db_dir = hmm_dir / DB_DIR_NAME
+    manifest = read_manifest(db_dir)
+    if manifest is not None and category in manifest["categories"]:
+        return load_database(db_dir, category, manifest)
+    return list(load_hmms((hmm_dir / "profiles" / category).glob("*hmm")))
+
+
+class ProfileStore:
+    """
+    Profiles of an `hmm_dir` and single-profile files loaded on the first
+    access and kept in memory, so that repeated searches don't re-read them.
+
+    When pickled, e.g., to be sent to a worker process, only the `hmm_dir`
+    is kept, and the worker loads its own profiles.
+
+    >>> profiles = ProfileStore(hmm_dir).preload(["Family", "Domain"])  # doctest: +SKIP
+    >>> name, profile = profiles["Family"][0]  # doctest: +SKIP
+    """
+
+    def __init__(self, hmm_dir: Path):
+        """
+        :param hmm_dir: A directory prepared by `tkp-finder setup`.
+        """
+        self.hmm_dir = hmm_dir
+        self._fingerprint: str | None = None
+        self._categories: dict[str, list[tuple[str, _ProfileT]]] = {}
+        self._files: dict[Path, HMM] = {}
+        self._checksums: dict[str | Path, str] = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        return {"hmm_dir": self.hmm_dir}
+
+    def __setstate__(self, state):
+        self.__init__(state["hmm_dir"])
+
+    def __contains__(self, category: str) -> bool:
+        return category in self._categories
+
+    @property
+    def fingerprint(self) -> str:
+        """
+        The fingerprint of the `hmm_dir` (see :func:`database_fingerprint`)
+        at the first access, which normally precedes loading the profiles.
+        """
+        with self._lock:
+            if self._fingerprint is None:
+                self._fingerprint = database_fingerprint(self.hmm_dir)
+            return self._fingerprint
+
+    def __getitem__(self, category: str) -> list[tuple[str, _ProfileT]]:
+        """
+        :param category: The name of the category.
+        :return: Profiles of the category (see :func:`load_profiles`).
+        """
+        with self._lock:
+            if category not in self._categories:
+                self._categories[category] = load_profiles(self.hmm_dir, category)
+            return self._categories[category]
+
+    def preload(self, categories: abc.Iterable[str]) -> "ProfileStore":
+        """
+        :param categories: Names of the categories to load.
+        :return: The store itself.
+        """
+        LOGGER.info(f"Loading profiles of {self.hmm_dir} ({self.fingerprint})")
+        for category in categories:
+            profiles = self[category]
+            LOGGER.info(f"Loaded {len(profiles)} {category} profiles")
+        return self
+
+    def checksum(self, category: str) -> str:
+        """
+        :param category: The name of the category.
+        :return: The checksum of its profiles (see :func:`profiles_checksum`).
+        """
+        with self._lock:
+            if category not in self._checksums:
+                self._checksums[category] = profiles_checksum(self.hmm_dir, category)
+            return self._checksums[category]
+
+    def file(self, path: Path) -> HMM:
+        """
+        :param path: A path to a file with a single profile, e.g., the PK one.
+        :return: The profile.
+        """
+        path = Path(path).absolute()
+        with self._lock:
+            if path not in self._files:
+                with HMMFile(path) as f:
+                    self._files[path] = f.read()
+            return self._files[path]
+
+    def file_checksum(self, path: Path) -> str:
+        """
+        :param path: A path to a file with a single profile.
+        :return: The file's checksum (see :func:`file_checksum`).
+        """
+        path = Path(path).absolute()
+        with self._lock:
+            if path not in self._checksums:
+                self._checksums[path] = file_checksum(path)
+            return self._checksums[path]
+
+
+def read_blocks(
+    path: Path | t.BinaryIO, alphabet: Alphabet, block_size: int
+) -> abc.Generator[tuple[list[str], DigitalSequenceBlock], None, None]:
+    """
+    Read sequences in blocks of bounded size.
+
+    :param path: A path to a fasta file or a file opened in binary mode.
+    :param alphabet: The alphabet to digitize the sequences with.
+    :param block_size: The max number of sequences in a block.
+    :return: A generator over pairs of sequence names and digital sequence
+        blocks. The sequences within a block are renamed by their index,
+        as expected by :meth:`BatchHMMer.iter_hits`.
+    """
+    with SequenceFile(path, digital=True, alphabet=alphabet, format="fasta") as f:
+        while block := f.read_block(sequences=block_size):
+            names = [decode_name(s.name) for s in block]
+            for i, s in enumerate(block):
+                s.name = encode_name(str(i))
+            yield names, block
+
+
+def file_checksum(*paths: Path) -> str:
+    """
+    :param paths: Paths to files.
+    :return: A sha256 hex digest of the files' contents.
+    """
+    h = hashlib.sha256()
+    for path in paths:
+        with path.open("rb") as f:
+            while chunk := f.read(2**20):
+                h.update(chunk)
+    return h.hexdigest()
+
+
+def profiles_checksum(hmm_dir: Path, category: str) -> str:
+    """
+    :param hmm_dir: A directory prepared by `tkp-finder setup`.
+    :param category: The name of the category.
+    :return: A checksum of the profiles :func:`load_profiles` would load.
+    """
+    db_dir = hmm_dir / DB_DIR_NAME
+    manifest = read_manifest(db_dir)
+    if manifest is not None and category in manifest["categories"]:
+        entry = manifest["categories"][category]
+        if "checksum" in entry:
+            return entry["checksum"]
+        return file_checksum(db_dir / f"{entry['db']}.h3m")
+    return file_checksum(*sorted((hmm_dir / "profiles" / category).glob("*hmm")))
+
+
+def load_hmms(paths: abc.Iterable[Path]) -> abc.Generator[tuple[str, HMM], None, None]:
+    """
+    :param paths: Paths to HMM files, each holding a single model.
+    :return: A generator over `(name, hmm)` pairs, where the name is the
+        file's stem.
+    """
+    for path in paths:
+        with HMMFile(path) as f:
+            yield path.stem, f.read()
+
+
+def enumerate_numbering(
+    a: Alignment,
+) -> abc.Generator[tuple[int | None, int | None], None, None]:
+    hmm_pool, seq_pool = count(a.hmm_from), count(a.target_from)
+    for hmm_c, seq_c in zip(a.hmm_sequence, a.target_sequence):
+        hmm_i = None if hmm_c == "." else next(hmm_pool)
+        seq_i = None if seq_c == "-" else next(seq_pool)
+        yield seq_i, hmm_i
+
+
+def decode_name(x: str | bytes) -> str:
+    # pyhmmer<0.11 uses bytes for names and accessions
+    return x.decode("utf-8") if isinstance(x, bytes) else x
+
+
+def encode_name(x: str) -> str | bytes:
+    return x if _STR_NAMES else x.encode("utf-8")
+
+
+_STR_NAMES = isinstance(TextSequence().name, str)
+
+
+if __name__ == "__main__":
+    raise RuntimeError
@@ -0,0 +1,72 @@
+import numpy as np
+
+
+def select_non_overlapping(
+    groups: np.ndarray, starts: np.ndarray, ends: np.ndarray, scores: np.ndarray
+) -> np.ndarray:
+    """
+    Select a maximum-score subset of non-overlapping intervals within each
+    group (weighted interval scheduling).
+
+    Intervals are closed, i.e., ``[1, 5]`` and ``[5, 8]`` overlap, as
+    in :meth:`lXtractor.core.segment.Segment.overlaps`. The solution is exact
+    and takes O(n log n) time for all groups at once. Intervals with
+    a non-positive score are never selected.
+
+    :param groups: An integer array assigning intervals to independent groups,
+        e.g., to the chains they belong to.
+    :param starts: Interval starts.
+    :param ends: Interval ends (inclusive).
+    :param scores: Interval scores to maximize the sum of.
+    :return: A boolean mask of the selected intervals.
+    """
+    n = len(starts)
+    selected = np.zeros(n, dtype=bool)
+    if n == 0:
+        return selected
+
+    groups = np.asarray(groups, dtype=np.int64)
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.asarray(ends, dtype=np.int64)
+    scores = np.asarray(scores, dtype=np.float64)
+
+    # Offset the coordinates so that groups occupy disjoint ranges and
+    # a single sorted array serves all of them.
+    span = int(max(ends.max(), starts.max()) - min(ends.min(), starts.min())) + 2
+    base = min(ends.min(), starts.min())
+    key_start = (groups - groups.min()) * span + (starts - base)
+    key_end = (groups - groups.min()) * span + (ends - base)
+
+    order = np.lexsort((key_end,))
+    key_start, key_end = key_start[order], key_end[order]
+    group_sorted, w = groups[order], scores[order]
+
+    # The number of intervals ending strictly before each interval's start.
+    # It never reaches into a previous group due to the offsets.
+    p = np.searchsorted(key_end, key_start, side="left")
+
+    # best[k] is the best total over the first k intervals. Totals carry over
+    # from the previous groups, which shifts both alternatives equally.
+    best = np.zeros(n + 1, dtype=np.float64)
+    for j in range(n):
+        take = w[j] + best[p[j]]
+        best[j + 1] = take if take > best[j] else best[j]
+
+    # Trace back each group from its last interval
+    is_last = np.append(group_sorted[1:] != group_sorted[:-1], True)
+    group_first = np.searchsorted(group_sorted, group_sorted, side="left")
+    for last in np.flatnonzero(is_last):
+        first = group_first[last]
+        j = last
+        while j >= first:
+            if w[j] + best[p[j]] > best[j]:
+                selected[order[j]] = True
+                j = p[j] - 1
+            else:
+                j -= 1
+
+    return selected
+
+
+if __name__ == "__main__":
+    raise RuntimeError
@@ -0,0 +1,204 @@
+import json
+import os
+import sys
+import time
+import typing as t
+from collections import abc, defaultdict
+from contextlib import contextmanager, suppress
+from pathlib import Path
+
+#: The number of the slowest profiles listed in a report
+TOP_PROFILES = 20
+#: Counters of a stage, reported even if they weren't recorded
+COUNTERS = ("sequences", "residues", "hits", "hits_kept", "profiles")
+
+
+def reset_peak_rss():
+    # Linux >= 4.0 resets the peak RSS (VmHWM) of a process on writing "5"
+    with suppress(OSError):
+        Path("/proc/self/clear_refs").write_text("5")
+
+
+def peak_rss() -> int | None:
+    """
+    :return: The peak resident set size of this process in bytes since the
+        last :func:`reset_peak_rss` or, where it can't be reset, since
+        the process start.
+    """
+    with suppress(OSError):
+        for line in Path("/proc/self/status").read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) * 2**10
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 2**10
+
+
+class StageMetrics:
+    """
+    Timings and counters of a single stage of processing a single input.
+    """
+
+    def __init__(self, inp: str, stage: str):
+        """
+        :param inp: An input's name, e.g., a fasta file or its shard.
+        :param stage: A stage name, e.g., "discovery" or "annotation:Family".
+        """
+        self.input = inp
+        self.stage = stage
+        self.pid = os.getpid()
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+        self.peak_rss: int | None = None
+        self.counters: dict[str, int] = defaultdict(int)
+        #: Profile name => seconds spent searching it
+        self.profile_times: dict[str, float] = defaultdict(float)
+
+    def count(self, name: str, value: int = 1):
+        self.counters[name] += value
+
+    def profile_timer(
+        self, names: abc.Mapping[int, str]
+    ) -> abc.Callable[[t.Any, int], None]:
+        """
+        Make a callback for `pyhmmer.hmmer.hmmsearch` attributing the time
+        elapsed since the previous call to the searched profile. With
+        multiple threads, the times are approximate.
+
+        :param names: A mapping from the ids of the profile objects to
+            their names.
+        :return: A callback taking the searched profile.
+        """
+        last = time.perf_counter()
+
+        def callback(hmm, *_):
+            nonlocal last
+            now = time.perf_counter()
+            self.profile_times[names.get(id(hmm), "unknown")] += now - last
+            last = now
+
+        return callback
+
+    def as_dict(self) -> dict[str, t.Any]:
+        return {
+            "input": self.input,
+            "stage": self.stage,
+            "pid": self.pid,
+            "wall_time": self.wall_time,
+            "cpu_time": self.cpu_time,
+            "peak_rss_mb": None if self.peak_rss is None else self.peak_rss / 2**20,
+            **{k: self.counters.get(k, 0) for k in COUNTERS},
+            **{k: v for k, v in self.counters.items() if k not in COUNTERS},
+        }
+
+
+class Metrics:
+    """
+    Collects :class:`StageMetrics` of a run. The object is picklable, so
+    the metrics collected by worker processes can be sent back and merged.
+
+    >>> metrics = Metrics()
+    >>> with metrics.stage("input.fasta", "discovery") as m:
+    ...     m.count("sequences", 10)
+    >>> metrics.report()["stages"][0]["sequences"]
+    10
+    """
+
+    def __init__(self):
+        self.stages: list[StageMetrics] = []
+
+    def __len__(self) -> int:
+        return len(self.stages)
+
+    @contextmanager
+    def stage(self, inp: t.Any, stage: str) -> abc.Generator[StageMetrics, None, None]:
+        """
+        Time a stage and record its peak RSS. Stages must not be nested.
+
+        :param inp: An input, converted to its name by `str`.
+        :param stage: A stage name.
+        :return: A context manager yielding the metrics to fill counters in.
+        """
+        m = StageMetrics(str(inp), stage)
+        reset_peak_rss()
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield m
+        finally:
+            m.wall_time = time.perf_counter() - wall
+            m.cpu_time = time.process_time() - cpu
+            m.peak_rss = peak_rss()
+            self.stages.append(m)
+
+    def merge(self, other: "Metrics"):
+        """
+        :param other: Metrics to add, e.g., the ones collected by a worker.
+        """
+        self.stages.extend(other.stages)
+
+    def report(self, top_profiles: int = TOP_PROFILES) -> dict[str, t.Any]:
+        """
+        :param top_profiles: The number of the slowest profiles to list.
+        :return: A JSON-serializable report with the metrics of each stage
+            of each input (`stages`), the metrics of each stage summed over
+            the inputs (`totals`) and the slowest profiles summed over the
+            inputs (`slowest_profiles`). The peak RSS is the maximum.
+        """
+        totals: dict[str, dict[str, t.Any]] = {}
+        for m in self.stages:
+            x = m.as_dict()
+            total = totals.setdefault(
+                m.stage, {"stage": m.stage, "runs": 0, "peak_rss_mb": None}
+            )
+            total["runs"] += 1
+            for k, v in x.items():
+                if k in ("input", "stage", "pid"):
+                    continue
+                if k == "peak_rss_mb":
+                    if v is not None:
+                        total[k] = max(v, total[k] or 0)
+                else:
+                    total[k] = total.get(k, 0) + v
+
+        profiles = defaultdict(float)
+        for m in self.stages:
+            for name, seconds in m.profile_times.items():
+                profiles[(m.stage, name)] += seconds
+        slowest = sorted(profiles.items(), key=lambda x: x[1], reverse=True)
+
+        return {
+            "stages": [m.as_dict() for m in self.stages],
+            "totals": list(totals.values()),
+            "slowest_profiles": [
+                {"stage": stage, "profile": name, "time": seconds}
+                for (stage, name), seconds in slowest[:top_profiles]
+            ],
+        }
+
+    def write(self, path: Path, **meta) -> Path:
+        """
+        :param path: A path to write the JSON report to.
+        :param meta: Fields to add to the report, e.g., the parameters.
+        :return: The `path`.
+        """
+        path.parent.mkdir(exist_ok=True, parents=True)
+        path.write_text(json.dumps({**meta, **self.report()}, indent=2, default=str))
+        return path
+
+
+def collect_metrics(fn: abc.Callable, obj: t.Any) -> tuple[t.Any, Metrics]:
+    """
+    Call `fn(obj, metrics=metrics)` with fresh :class:`Metrics`. Use to
+    collect the metrics of worker processes, which can't share an object.
+
+    :return: The result of the call and the collected metrics.
+    """
+    metrics = Metrics()
+    return fn(obj, metrics=metrics), metrics
+
+
+if __name__ == "__main__":
+    raise RuntimeError
@@ -0,0 +1,207 @@
+import csv
+import io
+import os
+import sqlite3
+import typing as t
+from collections import abc
+from pathlib import Path
+
+from more_itertools import chunked
+
+from tkp_finder.files import open_binary
+
+ENTRIES_DB_NAME = "pfam_entries.db"
+ENTRIES_TSV_NAME = "pfam_entries.tsv"
+
+# SQLite's default limit on the number of host parameters is 999
+_MAX_PARAMS = 900
+#: Pfam-A.hmm.dat tags => fields of :class:`PfamEntry`
+_DAT_TAGS = {
+    "ID": "id",
+    "AC": "accession",
+    "DE": "description",
+    "TP": "type",
+    "CL": "clan",
+}
+
+
+class PfamEntry(t.NamedTuple):
+    #: An accession without the version, e.g., "PF00069"
+    accession: str
+    id: str
+    description: str
+    #: One of the Pfam types, such as "Family" or "Domain"
+    type: str
+    clan: str | None = None
+
+
+def parse_pfam_entries(path: Path) -> list[PfamEntry]:
+    """
+    :param path: A path to `Pfam-A.hmm.dat`, possibly gzip-compressed.
+    :return: A list of entries in the order of the file.
+    """
+    entries, fields = [], {}
+    with io.TextIOWrapper(open_binary(path), encoding="utf-8") as f:
+        for line in f:
+            if line.startswith("#=GF "):
+                tag = line[5:7]
+                if tag in _DAT_TAGS:
+                    fields[_DAT_TAGS[tag]] = line[7:].strip()
+            elif line.startswith("//"):
+                fields["accession"] = fields["accession"].split(".")[0]
+                entries.append(PfamEntry(**fields))
+                fields = {}
+    return entries
+
+
+class PfamEntries:
+    """
+    An indexed SQLite store of Pfam entries written by `tkp-finder setup`.
+
+    Lookups by accession take a single index probe, so only the accessions
+    in question are ever loaded.
+
+    >>> with PfamEntries(hmm_dir / ENTRIES_DB_NAME) as entries:  # doctest: +SKIP
+    ...     entries["PF00069"].type
+    'Domain'
+    """
+
+    def __init__(self, path: Path):
+        """
+        :param path: A path to the database file. Created if missing.
+        """
+        self.path = path
+        self.con = sqlite3.connect(path)
+        self.con.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "accession TEXT PRIMARY KEY, id TEXT NOT NULL, "
+            "description TEXT NOT NULL, type TEXT NOT NULL, clan TEXT) "
+            "WITHOUT ROWID"
+        )
+        self.con.execute("CREATE INDEX IF NOT EXISTS entries_clan ON entries (clan)")
+        self.con.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.con.close()
+
+    def __len__(self) -> int:
+        return self.con.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def __iter__(self) -> abc.Iterator[PfamEntry]:
+        query = "SELECT accession, id, description, type, clan FROM entries"
+        return map(PfamEntry._make, self.con.execute(query))
+
+    def __contains__(self, accession: str) -> bool:
+        return self.get(accession) is not None
+
+    def __getitem__(self, accession: str) -> PfamEntry:
+        entry = self.get(accession)
+        if entry is None:
+            raise KeyError(accession)
+        return entry
+
+    def get(self, accession: str) -> PfamEntry | None:
+        query = (
+            "SELECT accession, id, description, type, clan FROM entries "
+            "WHERE accession = ?"
+        )
+        row = self.con.execute(query, [accession]).fetchone()
+        return None if row is None else PfamEntry._make(row)
+
+    def lookup(
+        self, accessions: abc.Iterable[str], field: str = "description"
+    ) -> dict[str, t.Any]:
+        """
+        :param accessions: Accessions to look up. Missing ones are skipped.
+        :param field: One of the :class:`PfamEntry` fields.
+        :return: A mapping from the accessions to the field's values.
+        """
+        if field not in PfamEntry._fields:
+            raise ValueError(f"Unknown field {field}")
+        res = {}
+        for chunk in chunked(set(accessions), _MAX_PARAMS):
+            query = (
+                f"SELECT accession, {field} FROM entries "
+                f"WHERE accession IN ({','.join('?' * len(chunk))})"
+            )
+            res.update(self.con.execute(query, chunk))
+        return res
+
+    def clan_members(self, clan: str) -> list[str]:
+        """
+        :param clan: A clan accession, e.g., "CL0016".
+        :return: Accessions of the clan's entries.
+        """
+        query = "SELECT accession FROM entries WHERE clan = ? ORDER BY accession"
+        return [x for x, in self.con.execute(query, [clan])]
+
+    def write(self, entries: abc.Iterable[PfamEntry]):
+        """
+        Replace the stored entries.
+
+        :param entries: Entries to store.
+        """
+        with self.con:
+            self.con.execute("DELETE FROM entries")
+            self.con.executemany(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)", entries
+            )
+
+
+def write_entries(hmm_dir: Path, entries: abc.Sequence[PfamEntry]) -> bool:
+    """
+    Write the entries into :data:`ENTRIES_DB_NAME` and, for compatibility,
+    :data:`ENTRIES_TSV_NAME` within `hmm_dir`, unless they are up to date.
+
+    :param hmm_dir: A directory prepared by `tkp-finder setup`.
+    :param entries: Parsed entries.
+    :return: ``True`` if the files were written.
+    """
+    path = hmm_dir / ENTRIES_DB_NAME
+    if path.exists():
+        with PfamEntries(path) as existing:
+            if sorted(existing) == sorted(entries):
+                return False
+
+    tmp = path.with_suffix(f".tmp{os.getpid()}")
+    tmp.unlink(missing_ok=True)
+    with PfamEntries(tmp) as store:
+        store.write(entries)
+    os.replace(tmp, path)
+
+    with (hmm_dir / ENTRIES_TSV_NAME).open("w", newline="") as f:
+        writer = csv.writer(f, delimiter="\t", lineterminator="\n")
+        writer.writerow(["ID", "Accession", "Description", "Type"])
+        writer.writerows((e.id, e.accession, e.description, e.type) for e in entries)
+    return True
+
+
+def read_descriptions(hmm_dir: Path, accessions: abc.Iterable[str]) -> dict[str, str]:
+    """
+    :param hmm_dir: A directory prepared by `tkp-finder setup`.
+    :param accessions: Accessions to look up.
+    :return: A mapping from the found accessions to their descriptions.
+        Directories prepared by older versions lacking the
+        :data:`ENTRIES_DB_NAME` are read from :data:`ENTRIES_TSV_NAME`.
+    """
+    path = hmm_dir / ENTRIES_DB_NAME
+    if path.exists():
+        with PfamEntries(path) as entries:
+            return entries.lookup(accessions, "description")
+    accessions = set(accessions)
+    with (hmm_dir / ENTRIES_TSV_NAME).open(newline="") as f:
+        return {
+            row["Accession"]: row["Description"]
+            for row in csv.DictReader(f, delimiter="\t")
+            if row["Accession"] in accessions
+        }
+
+
+if __name__ == "__main__":
+    raise RuntimeError
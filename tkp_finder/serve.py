@@ -0,0 +1,542 @@
+"""
+A long-lived service running `find` jobs with the profiles kept in memory.
+
+Worker processes load the profiles once at startup and then run the jobs
+submitted over a local HTTP API served on a TCP port or a Unix socket:
+
+- ``POST /jobs`` submits a job: a JSON object with the `fasta` path(s) and,
+  optionally, the `output` dir and any of the :data:`JOB_OPTIONS`. Responds
+  with the queued job (``202``) or, with ``?wait=1``, with the completed job
+  (``200``).
+- ``GET /jobs/<id>`` returns a job: its status and, once it is done, its
+  result or error.
+- ``GET /jobs`` lists the jobs.
+- ``GET /health`` returns the status of the service.
+
+Like :mod:`tkp_finder.cli`, this module doesn't import the pipeline: only
+the workers do.
+"""
+import json
+import logging
+import os
+import signal
+import socket
+import socketserver
+import sys
+import threading
+import time
+import typing as t
+from collections import Counter, OrderedDict, abc
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+from uuid import uuid4
+
+from tkp_finder.__about__ import __version__
+from tkp_finder.constants import ANNOTATION_CATEGORIES, OUTPUT_FORMATS, TM_BACKEND_NAMES
+
+LOGGER = logging.getLogger("tkp-finder")
+
+#: The number of finished jobs kept to be queried
+MAX_FINISHED_JOBS = 1000
+#: The maximum size of a submitted job in bytes
+MAX_REQUEST_BYTES = 2**20
+
+#: Profiles loaded by :func:`init_worker` within a worker process
+_PROFILES = None
+
+
+def _typed(tp: type) -> abc.Callable[[t.Any], t.Any]:
+    def convert(x):
+        # JSON has no separate integer type for floats, and bools are ints
+        expected = (int, float) if tp is float else tp
+        if not isinstance(x, expected) or (isinstance(x, bool) and tp is not bool):
+            raise ValueError(f"expected {tp.__name__}, got {x!r}")
+        return tp(x)
+
+    return convert
+
+
+def _positive(x: t.Any) -> int:
+    x = _typed(int)(x)
+    if x < 1:
+        raise ValueError(f"expected a positive integer, got {x}")
+    return x
+
+
+def _path(x: t.Any) -> Path:
+    return Path(_typed(str)(x))
+
+
+def _choice(choices: abc.Sequence[str], multiple: bool = False):
+    def convert(x):
+        xs = [x] if isinstance(x, str) or not multiple else x
+        if not isinstance(xs, list) or not xs:
+            raise ValueError(f"expected a list of {choices}, got {x!r}")
+        for y in xs:
+            if y not in choices:
+                raise ValueError(f"expected one of {choices}, got {y!r}")
+        return xs if multiple else xs[0]
+
+    return convert
+
+
+#: `find` options a job may set => a function validating and converting
+#: the JSON value. Parallelism is fixed by the service: a job runs within a
+#: single worker process, using the service's `threads` unless specified.
+JOB_OPTIONS: dict[str, abc.Callable[[t.Any], t.Any]] = {
+    "ann_type": _choice(ANNOTATION_CATEGORIES, multiple=True),
+    "motif": _typed(str),
+    "output_format": _choice(OUTPUT_FORMATS, multiple=True),
+    "chains_format": _choice(("dirs", "archive")),
+    "pk_map_name": _typed(str),
+    "ppk_map_name": _typed(str),
+    "min_pk_domain_size": _typed(int),
+    "min_pk_domains": _typed(int),
+    "min_hmm_score": _typed(float),
+    "min_hmm_cov": _typed(float),
+    "threads": _positive,
+    "block_size": _positive,
+    "cache": _path,
+    "tm_backend": _choice(TM_BACKEND_NAMES),
+    "tm_batch_size": _positive,
+    "tm_jobs": _positive,
+    "resume": _typed(bool),
+    "metrics_out": _path,
+}
+
+
+def parse_job(payload: t.Any, output: Path) -> dict[str, t.Any]:
+    """
+    :param payload: A decoded job submitted to the service.
+    :param output: The job's output dir, unless the `payload` has one.
+    :return: Keyword arguments of :func:`tkp_finder.tkp_finder.run_find`.
+    :raise ValueError: If the `payload` is invalid. Relative paths are
+        resolved against the service's working directory.
+    """
+    if not isinstance(payload, dict):
+        raise ValueError("A job must be a JSON object")
+    unknown = set(payload) - {"fasta", "output", *JOB_OPTIONS}
+    if unknown:
+        raise ValueError(f"Unsupported options {sorted(unknown)}")
+
+    fasta = payload.get("fasta")
+    if isinstance(fasta, str):
+        fasta = [fasta]
+    if not fasta or not isinstance(fasta, list):
+        raise ValueError("`fasta` must be a path or a non-empty list of paths")
+    kwargs = {"fasta": [_path(f).absolute() for f in fasta]}
+    for f in kwargs["fasta"]:
+        if not f.is_file():
+            raise ValueError(f"File {f} does not exist")
+    kwargs["output"] = (
+        _path(payload["output"]) if "output" in payload else output
+    ).absolute()
+
+    for name, convert in JOB_OPTIONS.items():
+        if name in payload:
+            try:
+                kwargs[name] = convert(payload[name])
+            except (TypeError, ValueError) as e:
+                raise ValueError(f"Invalid `{name}`: {e}") from e
+    return kwargs
+
+
+def init_worker(hmm_dir: Path, pk_profile: Path, categories: abc.Sequence[str]):
+    """
+    Import the pipeline and load the profiles of a worker process.
+    """
+    global _PROFILES
+    # Interrupting the service is handled by the main process
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    from tkp_finder.hmm import ProfileStore
+    # The pipeline's dependencies are imported once per worker
+    import tkp_finder.tkp_finder  # noqa: F401
+
+    _PROFILES = ProfileStore(hmm_dir).preload(categories)
+    _PROFILES.file(pk_profile)
+
+
+def worker_info() -> dict[str, t.Any]:
+    return {"pid": os.getpid(), "db_fingerprint": _PROFILES.fingerprint}
+
+
+def run_job(kwargs: dict[str, t.Any]) -> dict[str, t.Any]:
+    """
+    Run :func:`tkp_finder.tkp_finder.run_find` within a worker process.
+
+    :param kwargs: Keyword arguments of `run_find` except for the `hmm_dir`.
+    :return: The JSON-serializable result.
+    """
+    from tkp_finder.tkp_finder import run_find
+
+    started = time.time()
+    res = run_find(hmm_dir=_PROFILES.hmm_dir, profiles=_PROFILES, quiet=True, **kwargs)
+    summary = res.summary.astype(object).where(res.summary.notna(), None)
+    return {
+        "output": res.output,
+        "num_tkps": {str(k): v for k, v in res.num_tkps.items()},
+        "chains": {str(k): v for k, v in res.chains.items()},
+        "summaries": res.summaries,
+        "summary": summary.to_dict("records"),
+        "pid": os.getpid(),
+        "run_time": time.time() - started,
+    }
+
+
+class Job:
+    """
+    A job submitted to :class:`FinderService`.
+    """
+
+    def __init__(self, kwargs: dict[str, t.Any], job_id: str | None = None):
+        """
+        :param kwargs: Keyword arguments of `run_find` (see :func:`parse_job`).
+        :param job_id: A unique identifier. By default, a random one.
+        """
+        self.id = job_id or uuid4().hex
+        self.kwargs = kwargs
+        self.submitted = time.time()
+        self.finished: float | None = None
+        self.result: dict[str, t.Any] | None = None
+        self.error: str | None = None
+        self.future: Future | None = None
+        #: Set once the job is finished
+        self.done = threading.Event()
+
+    @property
+    def status(self) -> str:
+        if self.done.is_set():
+            return "failed" if self.error is not None else "completed"
+        if self.future is not None and self.future.running():
+            return "running"
+        return "queued"
+
+    def as_dict(self, result: bool = True) -> dict[str, t.Any]:
+        """
+        :param result: Include the result.
+        :return: A JSON-serializable description of the job.
+        """
+        res = {
+            "id": self.id,
+            "status": self.status,
+            "fasta": self.kwargs["fasta"],
+            "output": self.kwargs["output"],
+            "submitted": self.submitted,
+            "finished": self.finished,
+            "error": self.error,
+        }
+        if result:
+            res["result"] = self.result
+        return res
+
+
+class FinderService:
+    """
+    Run `find` jobs within a pool of worker processes, each holding the
+    profiles loaded at startup.
+
+    >>> with FinderService(hmm_dir, pk_profile, Path("jobs")) as service:  # doctest: +SKIP
+    ...     job = service.submit({"fasta": "proteome.fasta"})
+    ...     job.done.wait()
+    """
+
+    def __init__(
+        self,
+        hmm_dir: Path,
+        pk_profile: Path,
+        output: Path,
+        categories: abc.Sequence[str] = ("Family", "Domain", "Motif"),
+        workers: int = 1,
+        defaults: dict[str, t.Any] | None = None,
+    ):
+        """
+        :param hmm_dir: A directory prepared by `tkp-finder setup`.
+        :param pk_profile: A path to the PK HMM profile.
+        :param output: A directory with the outputs of the jobs without
+            an explicit `output`, written into the `<output>/<job id>` dirs.
+        :param categories: Profile categories loaded at startup. Other
+            categories are loaded by a worker on the first job using them.
+        :param workers: The number of worker processes, i.e., jobs running
+            concurrently.
+        :param defaults: Default values of the :data:`JOB_OPTIONS`.
+        """
+        self.hmm_dir = hmm_dir
+        self.pk_profile = pk_profile
+        self.output = output
+        self.categories = list(categories)
+        self.workers = workers
+        self.defaults = defaults or {}
+        self.jobs: OrderedDict[str, Job] = OrderedDict()
+        self.db_fingerprint: str | None = None
+        self.started: float | None = None
+        self._lock = threading.Lock()
+        self._executor: ProcessPoolExecutor | None = None
+        self._broken = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def start(self):
+        """
+        Start the workers and wait for them to load the profiles.
+        """
+        LOGGER.info(f"Starting {self.workers} workers loading {self.categories}")
+        started = time.perf_counter()
+        self._executor = ProcessPoolExecutor(
+            self.workers,
+            initializer=init_worker,
+            initargs=(self.hmm_dir, self.pk_profile, self.categories),
+        )
+        futures = [self._executor.submit(worker_info) for _ in range(self.workers)]
+        wait(futures)
+        # Fails if a worker couldn't load the profiles
+        infos = [f.result() for f in futures]
+        self.db_fingerprint = infos[0]["db_fingerprint"]
+        self.started = time.time()
+        LOGGER.info(
+            f"Workers are ready in {time.perf_counter() - started:.1f}s; "
+            f"profiles fingerprint: {self.db_fingerprint}"
+        )
+
+    def close(self):
+        """
+        Cancel the queued jobs, wait for the running ones and stop the workers.
+        """
+        if self._executor is not None:
+            LOGGER.info("Stopping the workers")
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def submit(self, payload: t.Any) -> Job:
+        """
+        :param payload: A decoded job (see :func:`parse_job`).
+        :return: The queued job.
+        :raise ValueError: If the job is invalid or its output dir is used
+            by another unfinished job.
+        :raise RuntimeError: If the service isn't running.
+        """
+        if self._executor is None or self._broken:
+            raise RuntimeError("The service isn't running")
+        job_id = uuid4().hex
+        kwargs = {
+            "pk_profile": self.pk_profile,
+            **self.defaults,
+            **parse_job(payload, self.output / job_id),
+        }
+        with self._lock:
+            for other in self.jobs.values():
+                if not other.done.is_set() and other.kwargs["output"] == kwargs["output"]:
+                    raise ValueError(
+                        f"Output {kwargs['output']} is used by the job {other.id}"
+                    )
+            job = Job(kwargs, job_id)
+            try:
+                job.future = self._executor.submit(run_job, kwargs)
+            except BrokenProcessPool as e:
+                self._broken = True
+                raise RuntimeError("The workers are broken") from e
+            self.jobs[job.id] = job
+        LOGGER.info(f"Queued the job {job.id} for {len(kwargs['fasta'])} inputs")
+        job.future.add_done_callback(lambda f: self._finish(job, f))
+        return job
+
+    def _finish(self, job: Job, future: Future):
+        if future.cancelled():
+            job.error = "Cancelled"
+        elif (e := future.exception()) is not None:
+            job.error = f"{type(e).__name__}: {e}"
+            if isinstance(e, BrokenProcessPool):
+                self._broken = True
+        else:
+            job.result = future.result()
+        job.finished = time.time()
+        job.done.set()
+        if job.error is None:
+            LOGGER.info(
+                f"Completed the job {job.id} in {job.finished - job.submitted:.1f}s"
+            )
+        else:
+            LOGGER.error(f"Failed the job {job.id}: {job.error}")
+
+        with self._lock:
+            finished = [x.id for x in self.jobs.values() if x.done.is_set()]
+            for job_id in finished[: max(len(finished) - MAX_FINISHED_JOBS, 0)]:
+                del self.jobs[job_id]
+
+    def get(self, job_id: str) -> Job | None:
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def list(self) -> list[Job]:
+        with self._lock:
+            return list(self.jobs.values())
+
+    def health(self) -> dict[str, t.Any]:
+        return {
+            "status": "broken" if self._broken else "ok",
+            "version": __version__,
+            "hmm_dir": self.hmm_dir.absolute(),
+            "pk_profile": self.pk_profile.absolute(),
+            "db_fingerprint": self.db_fingerprint,
+            "categories": self.categories,
+            "workers": self.workers,
+            "uptime": None if self.started is None else time.time() - self.started,
+            "jobs": Counter(job.status for job in self.list()),
+        }
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    """
+    Serves the HTTP API of the :class:`FinderService` set as the `service`
+    attribute of the server.
+    """
+
+    server_version = f"tkp-finder/{__version__}"
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def service(self) -> FinderService:
+        return self.server.service
+
+    def do_GET(self):
+        path = urlsplit(self.path).path.rstrip("/")
+        if path == "/health":
+            self.send_json(HTTPStatus.OK, self.service.health())
+        elif path == "/jobs":
+            jobs = [job.as_dict(result=False) for job in self.service.list()]
+            self.send_json(HTTPStatus.OK, {"jobs": jobs})
+        elif path.startswith("/jobs/"):
+            job_id = path.removeprefix("/jobs/")
+            job = self.service.get(job_id)
+            if job is None:
+                self.send_error_json(HTTPStatus.NOT_FOUND, f"No job {job_id}")
+            else:
+                self.send_json(HTTPStatus.OK, job.as_dict())
+        else:
+            self.send_error_json(HTTPStatus.NOT_FOUND, f"No endpoint {path}")
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        if url.path.rstrip("/") != "/jobs":
+            self.send_error_json(HTTPStatus.NOT_FOUND, f"No endpoint {url.path}")
+            return
+        size = int(self.headers.get("Content-Length") or 0)
+        if size > MAX_REQUEST_BYTES:
+            # The body is left unread
+            self.close_connection = True
+            self.send_error_json(
+                HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                f"A job exceeds {MAX_REQUEST_BYTES} bytes",
+            )
+            return
+        try:
+            job = self.service.submit(json.loads(self.rfile.read(size) or b"{}"))
+        except ValueError as e:
+            # Including the JSON decoding errors
+            self.send_error_json(HTTPStatus.BAD_REQUEST, str(e))
+            return
+        except RuntimeError as e:
+            self.send_error_json(HTTPStatus.SERVICE_UNAVAILABLE, str(e))
+            return
+
+        wait_for = parse_qs(url.query).get("wait", ["0"])[-1].lower()
+        if wait_for in ("1", "true", "yes"):
+            job.done.wait()
+            self.send_json(HTTPStatus.OK, job.as_dict())
+        else:
+            self.send_json(
+                HTTPStatus.ACCEPTED,
+                job.as_dict(result=False),
+                {"Location": f"/jobs/{job.id}"},
+            )
+
+    def send_json(
+        self,
+        status: HTTPStatus,
+        body: t.Any,
+        headers: dict[str, str] | None = None,
+    ):
+        data = json.dumps(body, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_error_json(self, status: HTTPStatus, message: str):
+        self.send_json(status, {"error": message})
+
+    def log_message(self, format, *args):
+        # Unix socket clients have no address
+        LOGGER.debug(f"{self.client_address or 'unix'} {format % args}")
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def bind_unix_socket(path: Path) -> UnixHTTPServer:
+    """
+    :param path: A path to the socket. A stale socket left by a terminated
+        service is replaced.
+    :return: A server bound to the socket.
+    :raise ValueError: If another service listens on the socket.
+    """
+    if path.is_socket():
+        with socket.socket(socket.AF_UNIX) as s:
+            try:
+                s.connect(str(path))
+            except OSError:
+                path.unlink()
+            else:
+                raise ValueError(f"Socket {path} is used by another process")
+    return UnixHTTPServer(str(path), RequestHandler)
+
+
+def serve(
+    service: FinderService,
+    host: str = "127.0.0.1",
+    port: int = 8765,
+    socket_path: Path | None = None,
+):
+    """
+    Serve the HTTP API of a started `service` until interrupted
+    (SIGINT or SIGTERM).
+
+    :param service: A started service.
+    :param host: A host to listen on.
+    :param port: A port to listen on.
+    :param socket_path: A Unix socket to listen on instead of the port.
+    """
+    if socket_path is None:
+        server = ThreadingHTTPServer((host, port), RequestHandler)
+        address = f"http://{host}:{server.server_address[1]}"
+    else:
+        server = bind_unix_socket(socket_path)
+        address = f"unix:{socket_path}"
+    server.service = service
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    LOGGER.info(f"Serving on {address}")
+    try:
+        with server:
+            server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if socket_path is not None:
+            socket_path.unlink(missing_ok=True)
+        LOGGER.info("Stopped serving")
+
+
+if __name__ == "__main__":
+    raise RuntimeError
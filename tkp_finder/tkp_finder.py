@@ -1,57 +1,86 @@
-import gzip
+import io
+import json
 import logging
 import operator as op
 import shutil
-from collections import abc
-from concurrent.futures import ProcessPoolExecutor
-from itertools import islice, chain, starmap
+import time
+import typing as t
+from collections import abc, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import cache, partial
+from itertools import islice, chain, groupby
 from pathlib import Path
-from warnings import warn
 
-import click
 import numpy as np
 import pandas as pd
-from lXtractor.core.chain import ChainSequence, ChainList, ChainInitializer, ChainIO
-from lXtractor.core.segment import resolve_overlaps
-from lXtractor.ext.hmm import PyHMMer
-from lXtractor.util.io import fetch_to_file, get_files, get_dirs
-from lXtractor.util.seq import read_fasta
+from lXtractor.core.chain import ChainSequence, ChainList, ChainIO
+from lXtractor.util.io import fetch_to_file, get_files
 from lXtractor.variables.base import SequenceVariable
 from lXtractor.variables.manager import Manager
 from lXtractor.variables.sequential import SeqEl
 from more_itertools import (
     consume,
     unique_everseen,
-    split_at,
     zip_equal,
-    mark_ends,
-    unzip,
-    collapse,
-    chunked,
 )
-from pyhmmer.plan7 import HMMFile, HMM
-from toolz import keyfilter, valfilter, compose_left, pipe, curry
+from pyhmmer.easel import DigitalSequenceBlock
+from pyhmmer.plan7 import HMMFile, HMM, OptimizedProfile
+from toolz import pipe, curry
 from tqdm.auto import tqdm
 
 from tkp_finder.deeptm import DeepTMHMM
-
-PFAM_A_URL = "https://ftp.ebi.ac.uk/pub/databases/Pfam/current_release/Pfam-A.hmm.gz"
-PFAM_DAT_URL = (
-    "https://ftp.ebi.ac.uk/pub/databases/Pfam/current_release/Pfam-A.hmm.dat.gz"
+from tkp_finder.tm import TMBackend, HydropathyTM
+from tkp_finder.hmm import (
+    BatchHMMer,
+    DatabaseWriter,
+    HMMRecord,
+    iter_hmm_records,
+    HitTable,
+    ProfileStore,
+    decode_name,
+    read_from_database,
+    read_blocks,
+    spawn_hit,
+    file_checksum,
+    database_fingerprint,
+)
+from tkp_finder.files import open_binary
+from tkp_finder.pfam import (
+    ENTRIES_TSV_NAME,
+    parse_pfam_entries,
+    read_descriptions,
+    write_entries,
 )
-PLANT_HMM_URL = (
-    "https://raw.githubusercontent.com/edikedik/tkp-finder/master"
-    "/Appendix_4/Plant_Pkinase_fam.hmm"
+from tkp_finder.__about__ import __version__
+from tkp_finder.intervals import select_non_overlapping
+from tkp_finder.cache import AnnotationCache, search_cached, stage_key
+from tkp_finder.archive import ChainArchive
+from tkp_finder.checkpoint import Checkpoints, CHECKPOINTS_DIR_NAME, DONE
+from tkp_finder.metrics import Metrics, StageMetrics, collect_metrics
+# The former location of the CLI entry point
+from tkp_finder.cli import tkp_finder
+from tkp_finder.constants import (
+    ANNOTATION_CATEGORIES,
+    ARCHIVE_SUFFIX,
+    BATCH_BYTES,
+    BLOCK_SIZE,
+    DATASET_FORMATS,
+    DB_DIR_NAME,
+    MAX_JOBS,
+    MOTIF,
+    PFAM_A_NAME,
+    PFAM_A_URL,
+    PFAM_DAT_NAME,
+    PFAM_DAT_URL,
+    PFAM_PK_NAME,
+    PK_NAME,
+    PLANT_HMM_NAME,
+    PLANT_HMM_URL,
+    PPK_NAME,
+    RUN_INFO_NAME,
+    SHARD_SIZE,
 )
-PFAM_A_NAME = "Pfam-A.hmm"
-PFAM_DAT_NAME = "Pfam-A.hmm.dat"
-PFAM_ENT_NAME = "pfam_entries.tsv"
-PLANT_HMM_NAME = "Plant_Pkinase_fam.hmm"
-PFAM_PK_NAME = "PF00069"
-PK_NAME = "PK"
-PPK_NAME = "PPK"
-GAP_NAME = "X"
-UNK_HMM = "unknown"
+
 VARIABLES = (
     SeqEl(30),  # Beta-3 Lys
     SeqEl(48),  # aC Glu
@@ -62,17 +91,13 @@ VARIABLES = (
     SeqEl(142),
     SeqEl(143),  # DFG
 )
-MOTIF = "KXXXDDXX"
-ANNOTATION_CATEGORIES = (
-    "Coiled-coil",
-    "Disordered",
-    "Domain",
-    "Family",
-    "Motif",
-    "Repeat",
-    "TM",
-    "ALL",
-)
+#: Must match :data:`tkp_finder.constants.TM_BACKEND_NAMES`
+TM_BACKENDS: dict[str, type[TMBackend]] = {
+    "deeptmhmm": DeepTMHMM,
+    "local": HydropathyTM,
+}
+
+PFAM_ENT_NAME = ENTRIES_TSV_NAME
 
 LOGGER = logging.getLogger("tkp-finder")
 
@@ -81,398 +106,265 @@ LOGGER = logging.getLogger("tkp-finder")
 # TODO: lX: HMM coverage doesn't take into account HMM size and the name is misleading
 
 
-def setup_logger(logger: logging.Logger | None, level: int | None):
-    if logger is None:
-        logger = logging.getLogger("tkp-finder")
-    if not logger.handlers:
-        handler = logging.StreamHandler()
-        handler.setLevel(level or logging.WARNING)
-        formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
-        handler.setFormatter(formatter)
-        logger.addHandler(handler)
-        logger.setLevel(level or logging.WARNING)
-    return logger
-
-
-@click.group(
-    "tkp_finder",
-    context_settings=dict(
-        help_option_names=["-h", "--help"], ignore_unknown_options=True
-    ),
-    no_args_is_help=True,
-    invoke_without_command=True,
-)
-def tkp_finder():
-    """
-    A command-line tool to discover and annotate tandem protein kinases.
-
-    It's based on the [lXtractor](https://github.com/edikedik/lXtractor) library.
-
-    GitHub: <https://github.com/edikedik/tkp-finder>
-    Author: Ivan Reveguk <ivan.reveguk@gmail.com>
-    """
-    pass
-
-
-@tkp_finder.command("setup", no_args_is_help=True)
-@click.option(
-    "-H",
-    "--hmm_dir",
-    type=click.Path(dir_okay=True, file_okay=False, writable=True),
-    help=(
-        "Path to a directory to store hmm-related data. "
-        "By default, will create an `hmm` "
-        "dir in the current directory."
-    ),
-)
-@click.option(
-    "-d",
-    "--download",
-    is_flag=True,
-    default=False,
-    show_default=True,
-    help="If the flag is on, download the Pfam data from interpro."
-)
-@click.option(
-    "-p",
-    "--plants",
-    is_flag=True,
-    default=False,
-    show_default=True,
-    help="If the flag is on, use Plant PK family-type HMMs."
-)
-@click.option(
-    "-q",
-    "--quiet",
-    is_flag=True,
-    default=False,
-    show_default=True,
-    help="Disable verbose output."
-)
-@click.option(
-    "--path_pfam_a",
-    type=click.Path(dir_okay=False, file_okay=True, exists=True),
-    help=(
-        "A path to downloaded Pfam-A HMM profiles. "
-        "By default, if `download` is ``False``,"
-        "will try to find it within the `hmm_dir`."
-    ),
-)
-@click.option(
-    "--path_pfam_dat",
-    type=click.Path(dir_okay=False, file_okay=True, exists=True),
-    help=(
-        "A path to downloaded Pfam-A (meta)data file. "
-        "By default, if `download` is ``False``,"
-        "will try to find it within the `hmm_dir`."
-    ),
-)
-@click.option(
-    "--path_plants",
-    type=click.Path(dir_okay=False, file_okay=True, exists=True),
-    help=(
-        "A path to downloaded Plant HMMs. "
-        "By default, if `download` is ``False``,"
-        "will try to find it within the `hmm_dir`."
-    ),
-)
-def setup(hmm_dir, download, plants, quiet, path_pfam_a, path_pfam_dat, path_plants):
+def run_setup(
+    hmm_dir: Path,
+    download: bool = False,
+    plants: bool = False,
+    split_profiles: bool = False,
+    path_pfam_a: Path | None = None,
+    path_pfam_dat: Path | None = None,
+    path_plants: Path | None = None,
+    quiet: bool = False,
+    metrics_out: Path | None = None,
+):
     """
-    Command to initialize the HMM data needed for TKPs' annotation.
-
-    For a fist-time usage, invoke `tkp-finder setup -H hmm -d`.
+    Prepare the HMM data for :func:`run_find`. See `tkp-finder setup`.
+
+    :param hmm_dir: An existing directory to store the data.
+    :param download: Download the Pfam data into `hmm_dir`. Otherwise, the
+        paths must be provided or the files must be within `hmm_dir`.
+    :param plants: Also use Plant PK family-type HMMs.
+    :param split_profiles: Also write each profile into a separate file.
+    :param path_pfam_a: A path to Pfam-A profiles, plain or gzip-compressed.
+    :param path_pfam_dat: A path to the Pfam-A metadata, plain or
+        gzip-compressed.
+    :param path_plants: A path to Plant HMMs.
+    :param quiet: Disable progress bars.
+    :param metrics_out: A path to write the metrics report to
+        (see :meth:`Metrics.report`).
     """
-    level = logging.WARNING if quiet else logging.INFO
-    setup_logger(None, level=level)
-    LOGGER.info("Running setup")
-
-    hmm_dir = Path.cwd() / "hmm" if hmm_dir is None else Path(hmm_dir)
-    hmm_dir.mkdir(exist_ok=True, parents=True)
-
+    started = time.perf_counter(), time.process_time()
+    metrics = Metrics()
     if download:
-        LOGGER.info("Fetching and unpacking Pfam data")
-        path_pfam_a, path_pfam_dat = fetch_pfam(hmm_dir)
+        LOGGER.info("Fetching Pfam data")
+        with metrics.stage(PFAM_A_URL, "download"):
+            path_pfam_a, path_pfam_dat = fetch_pfam(hmm_dir)
     else:
         files = get_files(hmm_dir)
         if path_pfam_a is None:
-            if PFAM_A_NAME not in files:
+            path_pfam_a = find_maybe_gzipped(files, PFAM_A_NAME)
+            if path_pfam_a is None:
                 raise ValueError(
-                    f"If `download` is false, {hmm_dir} must contain {PFAM_A_NAME}"
+                    f"If `download` is false, {hmm_dir} must contain {PFAM_A_NAME} "
+                    f"or {PFAM_A_NAME}.gz"
                 )
-            path_pfam_a = files[PFAM_A_NAME]
         if path_pfam_dat is None:
-            if PFAM_DAT_NAME not in files:
+            path_pfam_dat = find_maybe_gzipped(files, PFAM_DAT_NAME)
+            if path_pfam_dat is None:
                 raise ValueError(
-                    f"If `download` is false, {hmm_dir} must contain {PFAM_DAT_NAME}"
+                    f"If `download` is false, {hmm_dir} must contain {PFAM_DAT_NAME} "
+                    f"or {PFAM_DAT_NAME}.gz"
                 )
-            path_pfam_dat = files[PFAM_DAT_NAME]
         LOGGER.info(f"Using existing {path_pfam_a, path_pfam_dat}")
+    path_pfam_a, path_pfam_dat = Path(path_pfam_a), Path(path_pfam_dat)
+
+    db = DatabaseWriter(hmm_dir / DB_DIR_NAME)
+    with db, ThreadPoolExecutor(1) as executor:
+        # The metadata is parsed while the profiles start streaming
+        entries_future = executor.submit(parse_pfam_entries, path_pfam_dat)
+
+        @cache
+        def acc2type() -> dict[str, str]:
+            entries = entries_future.result()
+            LOGGER.info(
+                f"Obtained {len(entries)} metadata entries from {path_pfam_dat}"
+            )
+            write_entries(hmm_dir, entries)
+            return {e.accession: e.type for e in entries}
 
-    df = parse_pfam_dat(path_pfam_dat)
-    df.to_csv(hmm_dir / PFAM_ENT_NAME, sep="\t", index=False)
-    LOGGER.info(f"Obtained {len(df)} metadata entries from {path_pfam_dat}")
-
-    acc2type = {
-        dom_id: dom_type
-        for dom_id, dom_type in df[["Accession", "Type"]].itertuples(index=False)
-    }
-
-    get_pfam_path = lambda hmm: pipe(
-        hmm.accession.decode("utf-8").split(".")[0],
-        lambda x: hmm_dir / "profiles" / acc2type[x] / f"{x}.hmm",
-    )
-    split_hmm(path_pfam_a, get_pfam_path, not quiet)
-
-    domains_dir = hmm_dir / "profiles" / "Domain"
-    pk_path = domains_dir / f"{PFAM_PK_NAME}.hmm"
-    if not pk_path.exists():
-        raise ValueError(f"Expected to find {PFAM_PK_NAME} in {domains_dir}")
-    shutil.copy(pk_path, hmm_dir / pk_path.name)
-    LOGGER.info(f"Copied PK profile {pk_path.name} to {hmm_dir / pk_path.name}")
-    LOGGER.info("Finished Pfam setup")
-
-    if plants:
-        if download:
-            LOGGER.info("Downloading Plant HMMs.")
-            path_plants = fetch_to_file(PLANT_HMM_URL, root_dir=hmm_dir, text=True)
-        else:
-            path_plants = path_plants or hmm_dir / PLANT_HMM_NAME
-            if not path_plants.exists():
-                raise ValueError(f"Path for plant HMMs {path_plants} does not exist!")
-        get_plants_path = lambda hmm: (
-            hmm_dir
-            / "profiles"
-            / "Family"
-            / f"{hmm.name.decode('utf-8').replace(' ', '_').replace('-', '_')}.hmm"
+        get_pfam_path = lambda hmm: pipe(
+            decode_name(hmm.accession).split(".")[0],
+            lambda x: hmm_dir / "profiles" / acc2type()[x] / f"{x}.hmm",
+        )
+        with metrics.stage(path_pfam_a, "split_hmm") as m:
+            profile_paths = split_hmm(
+                path_pfam_a, get_pfam_path, not quiet, db=db, write=split_profiles
+            )
+            m.count("profiles", len(profile_paths))
+        acc2type()
+        LOGGER.info("Finished Pfam setup")
+
+        if plants:
+            if download:
+                LOGGER.info("Downloading Plant HMMs.")
+                path_plants = fetch_to_file(
+                    PLANT_HMM_URL, root_dir=hmm_dir, text=True
+                )
+            else:
+                path_plants = Path(path_plants or hmm_dir / PLANT_HMM_NAME)
+                if not path_plants.exists():
+                    raise ValueError(
+                        f"Path for plant HMMs {path_plants} does not exist!"
+                    )
+            get_plants_path = lambda hmm: (
+                hmm_dir
+                / "profiles"
+                / "Family"
+                / f"{decode_name(hmm.name).replace(' ', '_').replace('-', '_')}.hmm"
+            )
+            with metrics.stage(path_plants, "split_hmm") as m:
+                plant_paths = split_hmm(
+                    path_plants, get_plants_path, not quiet, db=db, write=split_profiles
+                )
+                m.count("profiles", len(plant_paths))
+            profile_paths += plant_paths
+            LOGGER.info("Finished Plants HMM setup")
+
+        with metrics.stage(db.db_dir, "press") as m:
+            manifest = db.press(verbose=not quiet)
+            m.count("profiles", len(profile_paths))
+        LOGGER.info(
+            f"Wrote HMM databases to {db.db_dir} "
+            f"with the fingerprint {manifest['fingerprint']}"
         )
-        split_hmm(path_plants, get_plants_path, not quiet)
-        LOGGER.info("Finished Plants HMM setup")
-
-    LOGGER.info("Finished setup")
-
 
-def gunzip(path_in: Path, path_out: Path | None = None, rm: bool = True) -> Path:
-    if path_out is None:
-        name_out = path_in.name.removesuffix(".gz")
-        if path_in.name == name_out:
-            name_out = f"{name_out}_unpacked"
-        path_out = path_in.parent / name_out
-    if path_out.exists():
-        warn(f"Overwriting existing {path_out}")
-    with gzip.open(path_in, "rb") as f_in:
-        with path_out.open("wb") as f_out:
-            shutil.copyfileobj(f_in, f_out)
-    if rm:
-        path_in.unlink()
-    return path_out
+    if split_profiles:
+        profile_paths = set(profile_paths)
+        for path in (hmm_dir / "profiles").glob("*/*.hmm"):
+            if path not in profile_paths:
+                path.unlink()
+
+    pk_path = hmm_dir / f"{PFAM_PK_NAME}.hmm"
+    try:
+        pk_hmm = read_from_database(db.db_dir, "Domain", PFAM_PK_NAME)
+    except KeyError as e:
+        raise ValueError(
+            f"Expected to find {PFAM_PK_NAME} among Domain profiles"
+        ) from e
+    with pk_path.open("wb") as f:
+        pk_hmm.write(f)
+    LOGGER.info(f"Wrote PK profile {PFAM_PK_NAME} to {pk_path}")
+
+    if metrics_out is not None:
+        params = dict(
+            hmm_dir=hmm_dir.absolute(),
+            download=download,
+            plants=plants,
+            split_profiles=split_profiles,
+            path_pfam_a=path_pfam_a,
+            path_pfam_dat=path_pfam_dat,
+            path_plants=path_plants,
+        )
+        path = write_metrics(metrics, metrics_out, "setup", started, params)
+        LOGGER.info(f"Wrote metrics to {path}")
 
 
 def fetch_pfam(base: Path):
+    # The archives are kept compressed and are read as streams
     return (
-        gunzip(fetch_to_file(PFAM_A_URL, root_dir=base, text=False)),
-        gunzip(fetch_to_file(PFAM_DAT_URL, root_dir=base, text=False)),
+        fetch_to_file(PFAM_A_URL, root_dir=base, text=False),
+        fetch_to_file(PFAM_DAT_URL, root_dir=base, text=False),
     )
 
 
-def parse_pfam_dat(path: Path):
-    def wrap_chunk(xs: list[str]):
-        _id, _acc, _desc, _, _type = map(lambda x: x.split("   ")[-1], xs[:5])
-        _acc = _acc.split(".")[0]
-        return _id, _acc, _desc, _type
+def find_maybe_gzipped(files: dict[str, Path], name: str) -> Path | None:
+    return files.get(name) or files.get(f"{name}.gz")
 
-    with path.open() as f:
-        lines = filter(bool, map(lambda x: x.rstrip(), f))
-        chunks = filter(bool, split_at(lines, lambda x: x.startswith("# ")))
-        return pd.DataFrame(
-            map(wrap_chunk, chunks), columns=["ID", "Accession", "Description", "Type"]
-        )
+
+def parse_pfam_dat(path: Path) -> pd.DataFrame:
+    return pd.DataFrame(
+        [(e.id, e.accession, e.description, e.type) for e in parse_pfam_entries(path)],
+        columns=["ID", "Accession", "Description", "Type"],
+    )
 
 
 def split_hmm(
-    path: Path, get_path: abc.Callable[[HMM], Path] | None = None, verbose: bool = False
+    path: Path,
+    get_path: abc.Callable[[HMMRecord], Path],
+    verbose: bool = False,
+    db: DatabaseWriter | None = None,
+    write: bool = True,
 ):
-    with HMMFile(path) as hmms:
+    # The parent dir name of a profile's path is its category in the `db`,
+    # and the stem is its name. The records are streamed as raw text, so
+    # `path` may be gzip-compressed and the profiles are parsed by the `db`'s
+    # workers only.
+    # Profiles unchanged since the `db`'s previous manifest aren't rewritten.
+    made_dirs, paths = set(), []
+    with open_binary(Path(path)) as f:
+        records = iter_hmm_records(f)
         if verbose:
-            hmms = tqdm(hmms, desc="Splitting HMM")
-        for hmm in hmms:
-            hmm_path = get_path(hmm)
-            hmm_path.parent.mkdir(exist_ok=True, parents=True)
-            with hmm_path.open("wb") as f:
-                hmm.write(f)
-
-
-@tkp_finder.command(
-    "find", context_settings={"ignore_unknown_options": True}, no_args_is_help=True
-)
-@click.argument("fasta", nargs=-1, type=click.Path())
-@click.option(
-    "-H",
-    "--hmm_dir",
-    type=click.Path(exists=True, dir_okay=True, file_okay=False),
-    help="Directory with HMM profiles. Expected to contain `profiles` dir and target "
-    "PK profile (PF00069.hmm). See `tkp-finder setup` on how to prepare this dir."
-)
-@click.option(
-    "-a",
-    "--ann_type",
-    multiple=True,
-    type=click.Choice(ANNOTATION_CATEGORIES),
-    default=["Family", "Domain", "Motif", "TM"],
-    show_default=True,
-    help=(
-        "Which HMM types to use for annotating the discovered TKPs. "
-        "The names must correspond to "
-        "folders within he `hmm_dir`."
-    ),
-)
-@click.option(
-    "-p",
-    "--pk_profile",
-    type=click.Path(exists=True, file_okay=True, dir_okay=False),
-    help=(
-        "A path to the PK HMM profile. "
-        "By default, will try to find it within the `hmm_dir`."
-    ),
-)
-@click.option(
-    "-m",
-    "--motif",
-    default=MOTIF,
-    show_default=True,
-    help=(
-        "A motif to discriminate between PKs and pseudo PKs. "
-        "This corresponds to the following "
-        "conserved elements: "
-        "(1) b3-Lys "
-        "(2) aC-helix Glu "
-        "(3-4-5) HRD motif "
-        "(6-7-8) DFG motif."
-    ),
-)
-@click.option(
-    "-o",
-    "--output",
-    type=click.Path(file_okay=False, dir_okay=True, writable=True),
-    help=(
-        "Output directory to store the results. "
-        "Be default, will store within `./tkp-finder`."
-    ),
-)
-@click.option(
-    "--pk_map_name",
-    default=PK_NAME,
-    show_default=True,
-    help="Use this name for the protein kinase domain."
-)
-@click.option(
-    "--ppk_map_name",
-    default=PPK_NAME,
-    show_default=True,
-    help="Use this name for pseudo protein kinases."
-)
-@click.option(
-    "-ms",
-    "--min_pk_domain_size",
-    type=int,
-    default=150,
-    show_default=True,
-    help="The minimum number of amino acid residues within a PK domain."
-)
-@click.option(
-    "--min_pk_domains",
-    type=int,
-    default=2,
-    help="The number of domains to classify a protein as TKP."
-)
-@click.option(
-    "-mS",
-    "--min_hmm_score",
-    type=float,
-    default=0.0,
-    show_default=True,
-    help="Min BitScore of a domain."
-)
-@click.option(
-    "-mc",
-    "--min_hmm_cov",
-    type=float,
-    default=0.5,
-    show_default=True,
-    help="Min coverage by an HMM profile."
-)
-@click.option(
-    "--timeout",
-    type=int,
-    default=300,
-    help="For parallel processing, indicate timeout for getting results "
-    "of a single process."
-)
-@click.option(
-    "-n",
-    "--num_proc",
-    type=int,
-    default=None,
-    help=(
-        "The number of cpus for data parallelism: "
-        "each input fasta will be annotated within "
-        "separate process. HINT: one may split large fasta files "
-        "for faster processing."
-    ),
-)
-@click.option(
-    "--deep_tm_chunk_size",
-    type=int,
-    default=100,
-    show_default=True,
-    help=(
-        "The number of sequences in a single query for DeepTMHMM. "
-        "Should be as large as possible, although too large files are blocked "
-        "by the server. "
-        "They did not specify the file size limit though..."
-    ),
-)
-@click.option(
-    "-q",
-    "--quiet",
-    is_flag=True,
-    default=False,
-    help="Disable stdout logging and progress bar."
-)
-def find(
-    fasta,
-    hmm_dir,
-    ann_type,
-    pk_profile,
-    motif,
-    output,
-    pk_map_name,
-    ppk_map_name,
-    min_pk_domain_size,
-    min_pk_domains,
-    min_hmm_score,
-    min_hmm_cov,
-    timeout,
-    num_proc,
-    deep_tm_chunk_size,
-    quiet,
-):
+            records = tqdm(records, desc="Splitting HMM")
+        for record in records:
+            hmm_path = get_path(record)
+            category, name = hmm_path.parent.name, hmm_path.stem
+            is_current = False
+            if db is not None:
+                previous = db.previous_checksum(category, name)
+                checksum = db.add_record(category, name, record.data, record.accession)
+                is_current = previous == checksum and hmm_path.exists()
+            if write and not is_current:
+                if hmm_path.parent not in made_dirs:
+                    hmm_path.parent.mkdir(exist_ok=True, parents=True)
+                    made_dirs.add(hmm_path.parent)
+                hmm_path.write_bytes(record.data)
+            paths.append(hmm_path)
+    return paths
+
+
+class FindResult(t.NamedTuple):
     """
-    The command finds TKPs in a list of input fasta files.
-
-    It first discovers proteins with `>=min_domains` PK domains.
-    For these proteins, it uses Pfam-A profiles separated into categories
-    (see `hmm_type` option)
-    to produce non-overlapping annotations within each hmm type
-    (maximizing the cumulative BitScore).
-
-    All the extracted profiles are saved as a nested collection of files.
-    Additionally, for each input fasta, it produces the aggregated `summary.tsv`.
+    The outcome of :func:`run_find`.
     """
-    level = logging.WARNING if quiet else logging.INFO
-    setup_logger(None, level=level)
 
-    if not isinstance(ann_type, list):
-        ann_type = list(ann_type)
+    output: Path
+    #: Input path => the number of TKPs found in it
+    num_tkps: dict[Path, int]
+    #: Input path => the written chains' directory or archive
+    chains: dict[Path, Path]
+    #: Paths to the written summary tables
+    summaries: list[Path]
+    #: The formatted summary with a row per TKP (see :func:`format_summaries`)
+    summary: pd.DataFrame
+
+
+def run_find(
+    fasta: abc.Sequence[Path],
+    hmm_dir: Path,
+    output: Path,
+    pk_profile: Path,
+    ann_type: abc.Iterable[str] = ("Family", "Domain", "Motif", "TM"),
+    motif: str = MOTIF,
+    output_format: abc.Sequence[str] = ("tsv",),
+    chains_format: str = "dirs",
+    pk_map_name: str = PK_NAME,
+    ppk_map_name: str = PPK_NAME,
+    min_pk_domain_size: int = 150,
+    min_pk_domains: int = 2,
+    min_hmm_score: float = 0.0,
+    min_hmm_cov: float = 0.5,
+    timeout: int = 300,
+    num_proc: int | None = None,
+    shard_size: int = SHARD_SIZE,
+    threads: int = 1,
+    block_size: int = BLOCK_SIZE,
+    cache: Path | None = None,
+    tm_backend: str = "deeptmhmm",
+    tm_batch_size: int = BATCH_BYTES // 2**10,
+    tm_jobs: int = MAX_JOBS,
+    resume: bool = False,
+    quiet: bool = False,
+    metrics_out: Path | None = None,
+    profiles: ProfileStore | None = None,
+) -> FindResult:
+    """
+    Find and annotate TKPs in the `fasta` files and save the results into
+    the `output` dir. See `tkp-finder find` for the description of
+    the parameters.
+
+    :param fasta: Paths to existing input fasta files.
+    :param hmm_dir: A directory prepared by :func:`run_setup`.
+    :param output: An output directory.
+    :param pk_profile: A path to the PK HMM profile.
+    :param metrics_out: A path to write the metrics report to
+        (see :meth:`Metrics.report`).
+    :param profiles: Profiles of the `hmm_dir` loaded beforehand, e.g., by
+        a long-lived service. By default, each input loads its own.
+    :return: The numbers of TKPs and the locations of the outputs.
+    """
+    started = time.perf_counter(), time.process_time()
+    metrics = Metrics()
+    ann_type = list(ann_type)
 
     if "ALL" in ann_type:
         ann_type = list(ANNOTATION_CATEGORIES[:-1])
@@ -484,38 +376,38 @@ def find(
     else:
         use_tm = False
 
-    fasta = [Path(f) for f in fasta]
-    if not fasta:
-        raise ValueError("No inputs provided. Use -h or --help to invoke help.")
-    for f in fasta:
-        if not f.exists():
-            raise ValueError(f"File {f} does not exist")
-    if hmm_dir is None:
-        hmm_dir = Path.cwd() / "hmm"
-        LOGGER.info(f"Assuming hmm dir to be {hmm_dir}")
-        if not hmm_dir.exists():
-            raise ValueError(f"HMM dir {hmm_dir} does not exist.")
-        dirs = get_dirs(hmm_dir)
-        if "profiles" not in dirs:
-            raise ValueError(f"Expected to find `profiles` dir in {hmm_dir}")
-    if output is None:
-        output = Path.cwd() / "tkp-finder"
-        output.mkdir(exist_ok=True)
-        LOGGER.info(f"Setting output dir to {output}")
-    else:
-        output = Path(output)
-    if pk_profile is None:
-        pk_profile = hmm_dir / f"{PFAM_PK_NAME}.hmm"
-        if not pk_profile.exists():
-            raise ValueError(
-                f"Expected to find profile {PFAM_PK_NAME} within {hmm_dir}"
-            )
+    if any(x in DATASET_FORMATS for x in output_format):
+        # Fail early rather than after the search
+        import_dataset()
+
+    use_parallel = num_proc is not None and num_proc > 1
 
-    use_parallel = num_proc is not None and num_proc > 1 and len(fasta) > 1
+    db_fingerprint = database_fingerprint(hmm_dir)
+    if profiles is not None and profiles.fingerprint != db_fingerprint:
+        raise ValueError(f"The profiles in {hmm_dir} changed since they were loaded")
+
+    params = dict(
+        hmm_dir=hmm_dir.absolute(),
+        db_fingerprint=db_fingerprint,
+        ann_type=ann_type,
+        use_tm=use_tm,
+        tm_backend=tm_backend if use_tm else None,
+        pk_profile=Path(pk_profile).absolute(),
+        motif=motif,
+        pk_map_name=pk_map_name,
+        ppk_map_name=ppk_map_name,
+        min_pk_domain_size=min_pk_domain_size,
+        min_pk_domains=min_pk_domains,
+        min_hmm_score=min_hmm_score,
+        min_hmm_cov=min_hmm_cov,
+    )
+    checkpoints = Checkpoints(output / CHECKPOINTS_DIR_NAME)
+    checkpoints.init(params, resume=resume)
+    write_run_info(output, params, pk_profile)
 
     pipe_one = discover_and_annotate(
         pk_profile=pk_profile,
-        hmm_base_dir=hmm_dir / "profiles",
+        hmm_dir=hmm_dir,
         hmm_types=ann_type,
         min_pk_domain_size=min_pk_domain_size,
         min_pk_domains=min_pk_domains,
@@ -525,71 +417,162 @@ def find(
         pk_map_name=pk_map_name,
         ppk_name=ppk_map_name,
         seq_variables=VARIABLES,
+        threads=threads,
+        block_size=block_size,
+        cache_path=None if cache is None else Path(cache),
+        checkpoints=checkpoints,
         quiet=True if use_parallel else quiet,
+        profiles=profiles,
     )
 
     if use_parallel:
-        LOGGER.info(f"Processing {len(fasta)} files in parallel")
-        results = yield_parallel(pipe_one, num_proc, fasta, timeout)
+        shards = [split_fasta(f, shard_size * 2**20) for f in fasta]
+        num_shards = sum(map(len, shards))
+        LOGGER.info(
+            f"Processing {len(fasta)} files split into {num_shards} shards in parallel"
+        )
+        results = yield_parallel(
+            partial(collect_metrics, pipe_one),
+            num_proc,
+            chain.from_iterable(shards),
+            timeout,
+        )
+        if not quiet:
+            results = tqdm(results, desc="Processing shards", total=num_shards)
+        results = merge_shards(shards, merge_metrics(results, metrics))
     else:
-        results = yield_sequentially(pipe_one, fasta)
-
-    if not quiet and len(fasta) > 1:
-        results = tqdm(results, desc="Processing inputs", total=len(fasta))
+        results = yield_sequentially(partial(pipe_one, metrics=metrics), fasta)
+        if not quiet and len(fasta) > 1:
+            results = tqdm(results, desc="Processing inputs", total=len(fasta))
 
-    completed = []
+    tm, tm_cache, bar = None, None, None
+    if use_tm:
+        tm_cache = None if cache is None else AnnotationCache(Path(cache))
+        tm = TM_BACKENDS[tm_backend](max_jobs=tm_jobs, cache=tm_cache)
+        if not quiet:
+            bar = tqdm(desc=f"Waiting for {tm.name} jobs", total=0)
+
+    def save(f: Path, chains: ChainList, futures: list | None):
+        if futures is not None:
+            # The time spent waiting for the jobs, e.g., polling DeepTMHMM
+            with metrics.stage(f, "annotation:TM") as m:
+                m.count("sequences", len(chains))
+                try:
+                    consume(
+                        tm.collect(
+                            chains,
+                            futures,
+                            category="TM",
+                            callback=None if bar is None else lambda: bar.update(1),
+                        )
+                    )
+                except RuntimeError as e:
+                    LOGGER.error(f"Incomplete {tm.name} annotations for {f}: {e}")
+                else:
+                    checkpoints.save(f, "TM", chains)
+
+        with metrics.stage(f, "write_chains") as m:
+            m.count("sequences", len(chains))
+            if chains_format == "archive":
+                path = output / f"{f.name}{ARCHIVE_SUFFIX}"
+                path.unlink(missing_ok=True)
+                with ChainArchive(path) as archive:
+                    archive.write(chains)
+            else:
+                path = output / f.name
+                io = ChainIO(num_proc=num_proc, verbose=False)
+                consume(io.write(chains, path, write_children=True))
+            chain_paths[f] = path
+
+        with metrics.stage(f, "summary") as m:
+            m.count("sequences", len(chains))
+            df = aggregate_annotations(chains.collapse_children(), inp_name=f.stem)
+            for fmt in unique_everseen(output_format):
+                write_summary(df, output, "summary", fmt, append=bool(summaries))
+        summaries.append(df)
+        LOGGER.info(f"Saved {len(chains)} TKPs found in {f}")
+
+    # Inputs are saved in order as soon as their TM jobs are done. Only the
+    # per-annotation summary rows are kept for the formatted summary.
+    summaries = []
+    # (input, chains, futures of the submitted TM jobs)
+    pending = deque()
+    num_tkps, chain_paths = {}, {}
 
     for f, chains in zip_equal(fasta, results):
+        if chains is not None:
+            num_tkps[f] = len(chains)
         if chains is None or len(chains) == 0:
             continue
-        completed.append((f, chains))
-
-    _, completed_chains = unzip(completed)
-
-    completed_chains = ChainList(chain.from_iterable(completed_chains))
-    LOGGER.info(f"Total TKPs found: {len(completed_chains)}")
-
-    if use_tm:
-        LOGGER.info("Annotating by DeepTMHMM")
-        if not quiet:
-            bar = tqdm(
-                desc=f"Annotating by DeepTMHMM; chunk_size: {deep_tm_chunk_size}",
-                total=len(completed_chains),
-            )
-        for chunk in chunked(completed_chains, deep_tm_chunk_size):
-            annotate_by_deep_tm(chunk, category="TM")
-            if not quiet:
-                bar.update(len(chunk))
-        if not quiet:
+        futures = None
+        if use_tm:
+            checkpointed = checkpoints.load(f, "TM")
+            if checkpointed is not None:
+                LOGGER.info(f"Loaded TM annotations for {f} from a checkpoint")
+                chains = checkpointed
+            else:
+                with metrics.stage(f, "submit:TM") as m:
+                    m.count("sequences", len(chains))
+                    futures = tm.submit(chains, max_bytes=tm_batch_size * 2**10)
+                if bar is not None:
+                    bar.total += len(futures)
+                    bar.refresh()
+        pending.append((f, chains, futures))
+        # Bound the number of inputs waiting for TM jobs held in memory
+        while pending and (
+            len(pending) > tm_jobs
+            or pending[0][2] is None
+            or all(x.done() for x in pending[0][2])
+        ):
+            save(*pending.popleft())
+
+    while pending:
+        save(*pending.popleft())
+
+    if tm is not None:
+        if bar is not None:
             bar.close()
-
-    LOGGER.info("Saving results")
-    io = ChainIO(num_proc=num_proc, verbose=False)
-    staged = collapse(
-        io.write(c, output / f.name, write_children=True) for f, c in completed
-    )
-    if not quiet:
-        staged = tqdm(staged, desc="Writing objects")
-    consume(staged)
-
-    LOGGER.info("Composing summaries")
-    df = pd.concat(
-        aggregate_annotations(c.collapse_children(), inp_name=f.stem)
-        for f, c in completed
-    )
-
-    df_fmt = format_summaries(df, hmm_dir)
-    df.to_csv(output / "summary.tsv", sep="\t", index=False)
-    df_fmt.to_csv(output / "summary_fmt.tsv", sep="\t", index=False)
-
+        tm.close()
+        if tm_cache is not None:
+            LOGGER.info(f"{tm.name} cache hit rate: {tm_cache.report()}")
+            tm_cache.close()
+
+    if not summaries:
+        LOGGER.warning("Found no TKPs in any of the inputs")
+        checkpoints.clear()
+        if metrics_out is not None:
+            write_metrics(metrics, metrics_out, "find", started, params)
+        return FindResult(output, num_tkps, chain_paths, [], pd.DataFrame())
+
+    num_found = sum(num_tkps.values())
+    LOGGER.info(f"Total TKPs found: {num_found}")
+
+    LOGGER.info("Composing formatted summaries")
+    with metrics.stage("all", "format_summaries") as m:
+        m.count("sequences", num_found)
+        df_fmt = format_summaries(pd.concat(summaries), hmm_dir)
+        for fmt in unique_everseen(output_format):
+            write_summary(df_fmt, output, "summary_fmt", fmt)
+
+    checkpoints.clear()
+    if metrics_out is not None:
+        path = write_metrics(metrics, metrics_out, "find", started, params)
+        LOGGER.info(f"Wrote metrics to {path}")
     LOGGER.info("Completed")
 
+    summary_paths = [
+        summary_path(output, name, fmt)
+        for name in ("summary", "summary_fmt")
+        for fmt in unique_everseen(output_format)
+    ]
+    return FindResult(output, num_tkps, chain_paths, summary_paths, df_fmt)
+
 
 @curry
 def discover_and_annotate(
     path: Path,
     pk_profile: Path,
-    hmm_base_dir: Path,
+    hmm_dir: Path,
     hmm_types: abc.Iterable[str] = ("Family", "Domain", "Motif"),
     min_pk_domain_size: int = 150,
     min_pk_domains: int = 2,
@@ -599,122 +582,362 @@ def discover_and_annotate(
     pk_map_name: str = PK_NAME,
     ppk_name: str = PPK_NAME,
     seq_variables: abc.Sequence[SequenceVariable] = VARIABLES,
+    threads: int = 1,
+    block_size: int = BLOCK_SIZE,
+    cache_path: Path | None = None,
+    checkpoints: Checkpoints | None = None,
     quiet: bool = True,
+    metrics: Metrics | None = None,
+    profiles: ProfileStore | None = None,
 ) -> ChainList[ChainSequence]:
-    @curry
-    def value_fn(c: ChainSequence, hmm_type: str):
-        scores = keyfilter(
-            lambda x: x.startswith(hmm_type) and x.endswith("score"), c.meta
-        )
-        if len(scores) > 1:
-            raise ValueError(
-                f"Expected exactly one score for hmm type {hmm_type}, "
-                f"got {len(scores)}: {scores}"
-            )
-        return scores.popitem()[1]
-
     @curry
     def annotate_and_filter(chains, hmm_type):
-        hmms = list((hmm_base_dir / hmm_type).glob("*hmm"))
-        if hmm_type == "TM":
-            return annotate_by_deep_tm(chains, category="TM")
-        return pipe(
-            chains,
-            annotate_by_hmms(
-                hmm_paths=hmms,
+        with metrics.stage(path, f"annotation:{hmm_type}") as m:
+            if hmm_type == "TM":
+                m.count("sequences", len(chains))
+                return annotate_by_deep_tm(chains, category="TM")
+            hmms = profiles[hmm_type]
+            return annotate_by_hmms(
+                chains,
+                hmms=hmms,
                 hmm_type=hmm_type,
                 min_score=min_hmm_score,
                 min_cov_hmm=min_hmm_cov,
+                threads=threads,
+                cache=cache,
+                checksum=None if cache is None else profiles.checksum(hmm_type),
+                resolve_overlaps=True,
                 quiet=quiet,
-            ),
-            filter_child_overlaps(
-                filt_fn=lambda c: any((x.startswith(hmm_type) for x in c.fields)),
-                val_fn=value_fn(hmm_type=hmm_type),
-                quiet=quiet,
-            ),
-        )
+                metrics=m,
+            )
+
+    if metrics is None:
+        # Collected, but discarded
+        metrics = Metrics()
+    if profiles is None:
+        # Loaded for this call only
+        profiles = ProfileStore(hmm_dir)
 
     # if not pk_map_name.startswith('Domain'):
     #     pk_map_name = f'Domain_{pk_map_name}'
 
-    chains = find_tkps(
-        path,
-        min_size=min_pk_domain_size,
-        min_domains=min_pk_domains,
-        min_cov=min_hmm_cov,
-        min_score=min_hmm_score,
-        map_name=pk_map_name,
-        profile=pk_profile,
-        quiet=quiet,
-    )
-    if len(chains) == 0:
-        LOGGER.info(f"Found no TKPs in {path}")
-        return chains
-    chains = compose_left(*(annotate_and_filter(hmm_type=x) for x in hmm_types))(chains)
-    pk_children = chains.collapse_children().filter(lambda x: pk_map_name in x)
-    vs_df = calculate_variables(pk_children, seq_variables, pk_map_name)
-
-    annotate_ppks(
-        chains.collapse_children(),
-        vs_df,
-        pk_name=pk_map_name,
-        ppk_name=ppk_name,
-        motif=motif,
-    )
+    if checkpoints is not None:
+        chains = checkpoints.load(path, DONE)
+        if chains is not None:
+            LOGGER.info(f"Loaded the results for {path} from a checkpoint")
+            return chains
+
+    stages = ["discovery", *hmm_types]
+    if checkpoints is None:
+        completed, chains = -1, None
+    else:
+        completed, chains = checkpoints.latest(path, stages)
+        if completed >= 0:
+            LOGGER.info(f"Resuming {path} after the stage {stages[completed]}")
+
+    cache = None if cache_path is None else AnnotationCache(cache_path)
+    try:
+        if completed < 0:
+            with metrics.stage(path, "discovery") as m:
+                chains = find_tkps(
+                    path,
+                    min_size=min_pk_domain_size,
+                    min_domains=min_pk_domains,
+                    min_cov=min_hmm_cov,
+                    min_score=min_hmm_score,
+                    map_name=pk_map_name,
+                    profile=profiles.file(pk_profile),
+                    checksum=(
+                        None if cache is None else profiles.file_checksum(pk_profile)
+                    ),
+                    threads=threads,
+                    block_size=block_size,
+                    cache=cache,
+                    quiet=quiet,
+                    metrics=m,
+                )
+            if checkpoints is not None:
+                checkpoints.save(path, stages[0], chains)
+        if len(chains) == 0:
+            LOGGER.info(f"Found no TKPs in {path}")
+            if checkpoints is not None:
+                checkpoints.save(path, DONE, chains)
+            return chains
+        # The discovery stage is complete at this point
+        for stage in stages[max(completed, 0) + 1 :]:
+            chains = annotate_and_filter(chains, stage)
+            if checkpoints is not None:
+                checkpoints.save(path, stage, chains)
+    finally:
+        if cache is not None:
+            LOGGER.info(f"Cache hit rates for {path}: {cache.report()}")
+            cache.close()
+
+    with metrics.stage(path, "ppk") as m:
+        m.count("sequences", len(chains))
+        annotate_ppks(
+            chains.collapse_children(),
+            [v.p for v in seq_variables],
+            pk_name=pk_map_name,
+            ppk_name=ppk_name,
+            motif=motif,
+        )
+    if checkpoints is not None:
+        checkpoints.save(path, DONE, chains)
 
     return chains
 
 
-def annotate_by_deep_tm(chains: abc.Iterable[ChainSequence], **kwargs):
-    annotator = DeepTMHMM()
-    consume(annotator.annotate(chains, **kwargs))
+def annotate_by_deep_tm(
+    chains: abc.Iterable[ChainSequence],
+    backend: str | TMBackend = "deeptmhmm",
+    **kwargs,
+):
+    """
+    Annotate chains by TM segments.
+
+    :param chains: Chain sequences to annotate.
+    :param backend: A TM backend instance or a name of one of the
+        :data:`TM_BACKENDS` to initialize.
+    :param kwargs: Passed to :meth:`TMBackend.annotate`.
+    :return: The annotated `chains`.
+    """
+    if isinstance(backend, str):
+        with TM_BACKENDS[backend]() as annotator:
+            consume(annotator.annotate(chains, **kwargs))
+    else:
+        consume(backend.annotate(chains, **kwargs))
     return chains
 
 
+def count_sequences(path: Path) -> int:
+    with path.open() as f:
+        return sum(1 for line in f if line.startswith(">"))
+
+
+class Shard(t.NamedTuple):
+    """
+    A contiguous range of records in a fasta file.
+    """
+
+    path: Path
+    #: Byte offset of the first record
+    start: int
+    #: Byte offset past the last record
+    end: int
+
+    def __str__(self) -> str:
+        return f"{self.path}[{self.start}:{self.end}]"
+
+    @classmethod
+    def from_path(cls, path: Path) -> "Shard":
+        return cls(path, 0, path.stat().st_size)
+
+    def open(self) -> t.BinaryIO:
+        if self.start == 0 and self.end == self.path.stat().st_size:
+            return self.path.open("rb")
+        with self.path.open("rb") as f:
+            f.seek(self.start)
+            return io.BytesIO(f.read(self.end - self.start))
+
+
+def split_fasta(path: Path, shard_size: int) -> list[Shard]:
+    """
+    Split a fasta file into shards of approximately `shard_size` bytes.
+    The shards' boundaries are aligned to the records' headers.
+
+    :param path: A path to a fasta file.
+    :param shard_size: The approximate size of a shard in bytes.
+    :return: A list of shards covering the whole file.
+    """
+    size = path.stat().st_size
+    bounds = [0]
+    with path.open("rb") as f:
+        while bounds[-1] + shard_size < size:
+            f.seek(bounds[-1] + shard_size)
+            f.readline()
+            pos, line = f.tell(), f.readline()
+            while line and not line.startswith(b">"):
+                pos, line = f.tell(), f.readline()
+            if not line:
+                break
+            bounds.append(pos)
+    bounds.append(size)
+    return [Shard(path, start, end) for start, end in zip(bounds, bounds[1:])]
+
+
+def merge_shards(
+    shards: abc.Sequence[abc.Sequence[Shard]],
+    results: abc.Iterable[ChainList | None],
+) -> abc.Generator[ChainList | None, None, None]:
+    """
+    Reassemble the results of shards into the results of inputs.
+
+    :param shards: Shards of each input.
+    :param results: Results of each shard in the same order.
+    :return: A generator over merged results, one per input. If any shard of
+        an input failed, yield ``None`` for the whole input.
+    """
+    results = iter(results)
+    for input_shards in shards:
+        shard_results = list(islice(results, len(input_shards)))
+        if any(x is None for x in shard_results):
+            LOGGER.error(f"Failed to process some shards of {input_shards[0].path}")
+            yield None
+            continue
+        # Sequences are deduplicated within a shard but may repeat across them
+        yield ChainList(
+            unique_everseen(
+                chain.from_iterable(shard_results), key=op.attrgetter("seq1")
+            )
+        )
+
+
 @curry
 def find_tkps(
-    path: Path,
-    profile: Path,
+    path: Path | Shard,
+    profile: Path | HMM,
     min_size: int = 150,
     min_domains: int = 2,
     min_cov: float | None = None,
     min_score: float | None = None,
     map_name: str = PK_NAME,
+    threads: int = 1,
+    block_size: int = BLOCK_SIZE,
+    cache: AnnotationCache | None = None,
     quiet: bool = True,
+    metrics: StageMetrics | None = None,
+    checksum: str | None = None,
 ) -> ChainList:
-    def wrap_pbar(it):
-        if quiet:
-            return it
-        return tqdm(it, desc="Initializing chains")
+    if isinstance(profile, HMM):
+        hmm = profile
+    else:
+        with HMMFile(profile) as f:
+            hmm = f.read()
+    if metrics is not None:
+        metrics.count("profiles")
+    shard = path if isinstance(path, Shard) else Shard.from_path(path)
+    num_seqs = None
+    if not hmm.cutoffs.trusted_available():
+        # Without bit score cutoffs, reporting depends on E-values,
+        # which must account for all the input sequences, not a single block.
+        num_seqs = count_sequences(shard.path)
+    if cache is not None and checksum is None:
+        if isinstance(profile, HMM):
+            raise ValueError("Using a cache requires the profile's checksum")
+        checksum = file_checksum(profile)
 
-    initializer = ChainInitializer()
-    annotator = PyHMMer(profile, bit_cutoffs="trusted")
+    if not quiet:
+        bar = tqdm(desc="Discovering PK domains", unit="seq")
+
+    with shard.open() as handle:
+        chains = ChainList(
+            chain.from_iterable(
+                iter_tkps(
+                    read_blocks(handle, hmm.alphabet, block_size),
+                    hmm,
+                    min_size=min_size,
+                    min_domains=min_domains,
+                    min_cov=min_cov,
+                    min_score=min_score,
+                    map_name=map_name,
+                    threads=threads,
+                    num_seqs=num_seqs,
+                    cache=cache,
+                    checksum=checksum,
+                    metrics=metrics,
+                    callback=None if quiet else bar.update,
+                )
+            )
+        )
+    if not quiet:
+        bar.close()
 
-    chains = pipe(
-        path,
-        curry(read_fasta)(strip_id=True),
-        curry(unique_everseen)(key=op.itemgetter(1)),
-        initializer.from_iterable,
-        wrap_pbar,
-        ChainList,
-    )
+    return chains
 
-    consume(
-        annotator.annotate(
-            chains,
-            min_size=min_size,
-            min_cov_hmm=min_cov,
-            min_score=min_score,
-            new_map_name=map_name,
-        )
-    )
 
-    return pipe(
-        chains,
-        lambda x: x.filter(lambda c: len(c.children) >= min_domains),
-        filter_child_overlaps(quiet=quiet),
-        lambda x: x.filter(lambda c: len(c.children) >= min_domains),
-    )
+def iter_tkps(
+    blocks: abc.Iterable[tuple[list[str], DigitalSequenceBlock]],
+    hmm: HMM,
+    min_size: int = 150,
+    min_domains: int = 2,
+    min_cov: float | None = None,
+    min_score: float | None = None,
+    map_name: str = PK_NAME,
+    threads: int = 1,
+    num_seqs: int | None = None,
+    cache: AnnotationCache | None = None,
+    checksum: str | None = None,
+    metrics: StageMetrics | None = None,
+    callback: abc.Callable[[int], t.Any] | None = None,
+    seen: set[str] | None = None,
+) -> abc.Generator[list[ChainSequence], None, None]:
+    """
+    Discover PK domains in blocks of sequences, turning only the sequences
+    with enough non-overlapping PK domains into chains.
+
+    :param blocks: Pairs of sequence names and digital sequence blocks
+        (see :func:`read_blocks`).
+    :param hmm: The PK profile.
+    :param num_seqs: The total number of sequences to compute E-values for,
+        which matters only if the `hmm` lacks the trusted cutoffs.
+        By default, E-values are computed per block.
+    :param cache: An annotation cache.
+    :param checksum: A checksum of the `hmm` identifying it in the `cache`.
+    :param metrics: Metrics to record the counters in.
+    :param callback: Called with the size of each processed block.
+    :param seen: Sequences of the chains found previously, which are skipped.
+        Updated with the sequences of the found chains.
+    :return: A generator over the chains found in each block.
+    """
+    options = {} if num_seqs is None else {"Z": num_seqs}
+    annotator = BatchHMMer([(map_name, hmm)], cpus=threads, **options)
+    stage = None
+    if cache is not None:
+        if checksum is None:
+            raise ValueError("Using a cache requires the profile's checksum")
+        stage = stage_key(
+            "discovery", checksum, map_name, min_score, min_size, min_cov
+        )
+    if seen is None:
+        seen = set()
+
+    for names, block in blocks:
+        hits = HitTable.from_hits(
+            search_cached(
+                annotator,
+                block,
+                cache,
+                stage,
+                label="discovery",
+                min_score=min_score,
+                min_size=min_size,
+                min_cov_hmm=min_cov,
+            )
+        )
+        if metrics is not None:
+            metrics.count("sequences", len(block))
+            metrics.count("residues", sum(map(len, block)))
+            metrics.count("hits", len(hits))
+        # Prefer the longest domains, i.e., the values are the lengths
+        hits = hits.resolve_overlaps(hits["end"] - hits["start"] + 1)
+        num_domains = np.bincount(hits["seq_idx"], minlength=len(block))
+        hits = hits.select(num_domains[hits["seq_idx"]] >= min_domains)
+        if metrics is not None:
+            metrics.count("hits_kept", len(hits))
+        chains = []
+        for seq_idx, seq_hits in groupby(hits, key=op.attrgetter("seq_idx")):
+            seq = block[seq_idx].textize().sequence
+            if seq in seen:
+                continue
+            seen.add(seq)
+            c = ChainSequence.from_string(seq, name=names[seq_idx])
+            for hit in seq_hits:
+                spawn_hit(c, hit)
+            chains.append(c)
+        if callback is not None:
+            callback(len(block))
+        yield chains
 
 
 @curry
@@ -731,23 +954,78 @@ def calculate_variables(
 @curry
 def annotate_by_hmms(
     chains: ChainList,
-    hmm_paths: abc.Iterable[Path],
+    hmms: abc.Sequence[tuple[str, HMM | OptimizedProfile]],
     hmm_type: str,
+    threads: int = 1,
+    cache: AnnotationCache | None = None,
+    checksum: str | None = None,
+    resolve_overlaps: bool = False,
     quiet: bool = True,
+    metrics: StageMetrics | None = None,
     **kwargs,
 ) -> ChainList:
+    """
+    Annotate chains by domain hits of HMM profiles.
+
+    :param chains: A list of chains to annotate.
+    :param hmms: Pairs of (name, profile).
+    :param hmm_type: A prefix of the children's map names.
+    :param threads: The number of threads for the search.
+    :param cache: An annotation cache.
+    :param checksum: A checksum of `hmms` identifying them in the `cache`.
+    :param resolve_overlaps: Keep only non-overlapping hits with the maximum
+        cumulative score within each chain. The hits are resolved before any
+        children are spawned.
+    :param quiet: Disable the progress bar.
+    :param metrics: Metrics to record the counters and the time spent on
+        each profile in.
+    :param kwargs: Passed to :meth:`BatchHMMer.iter_hits`.
+    :return: The annotated `chains`.
+    """
+    if not hmms or len(chains) == 0:
+        return chains
+    annotator = BatchHMMer(hmms, bit_cutoffs="trusted", cpus=threads)
+    stage = None
+    if cache is not None:
+        if checksum is None:
+            raise ValueError("Using a cache requires the profiles' checksum")
+        stage = stage_key("annotation", hmm_type, checksum, sorted(kwargs.items()))
+    seqs = annotator.digitize(c.seq1 for c in chains)
+    callbacks = []
     if not quiet:
-        hmm_paths = tqdm(hmm_paths, desc=f"Annotating by HMM {hmm_type}")
-    for path in hmm_paths:
-        # if path.stem == PFAM_PK_NAME:
-        #     continue
-        map_name = f"{hmm_type}_{path.stem}"
-        try:
-            annotator = PyHMMer(path, bit_cutoffs='trusted')
-            consume(annotator.annotate(chains, new_map_name=map_name, **kwargs))
-        except ValueError:
-            annotator = PyHMMer(path)
-            consume(annotator.annotate(chains, new_map_name=map_name, **kwargs))
+        bar = tqdm(desc=f"Annotating by HMM {hmm_type}", total=len(hmms))
+        callbacks.append(lambda *_: bar.update(1))
+    if metrics is not None:
+        metrics.count("sequences", len(chains))
+        metrics.count("residues", sum(map(len, seqs)))
+        metrics.count("profiles", len(hmms))
+        callbacks.append(metrics.profile_timer({id(x): name for name, x in hmms}))
+
+    def callback(*args):
+        for fn in callbacks:
+            fn(*args)
+
+    hits = HitTable.from_hits(
+        search_cached(
+            annotator,
+            seqs,
+            cache,
+            stage,
+            label=hmm_type,
+            callback=callback if callbacks else None,
+            prefix=hmm_type,
+            **kwargs,
+        )
+    )
+    if metrics is not None:
+        metrics.count("hits", len(hits))
+    if resolve_overlaps:
+        hits = hits.resolve_overlaps()
+    if metrics is not None:
+        metrics.count("hits_kept", len(hits))
+    consume(hits.spawn(chains))
+    if not quiet:
+        bar.close()
     return chains
 
 
@@ -758,47 +1036,132 @@ def filter_child_overlaps(
     val_fn: abc.Callable[[ChainSequence], float] = len,
     quiet: bool = True,
 ) -> ChainList:
-    _chains = chains if quiet else tqdm(chains, desc="Resolving overlaps")
-    for c in _chains:
-        target_children = ChainList(next(c.iter_children())).filter(filt_fn)
-        non_overlapping = resolve_overlaps(
-            target_children, value_fn=val_fn, max_it=int(10**5)
+    """
+    For each chain, keep a subset of non-overlapping children selected by
+    `filt_fn` with the maximum cumulative value. The rest of the children
+    are left intact. All chains are resolved in a single batch
+    (see :func:`select_non_overlapping`).
+
+    :param chains: A list of chains.
+    :param filt_fn: A function selecting the children to resolve.
+    :param val_fn: A function returning a child's value.
+    :param quiet: Disable logging.
+    :return: The same chains with overlapping children removed.
+    """
+    targets = [
+        (i, child)
+        for i, c in enumerate(chains)
+        for child in c.children
+        if filt_fn(child)
+    ]
+    if not targets:
+        return chains
+    groups, children = zip(*targets)
+    selected = select_non_overlapping(
+        np.array(groups),
+        np.fromiter((x.start for x in children), dtype=np.int64, count=len(children)),
+        np.fromiter((x.end for x in children), dtype=np.int64, count=len(children)),
+        np.fromiter(map(val_fn, children), dtype=np.float64, count=len(children)),
+    )
+    rejected = {id(x) for x, is_selected in zip(children, selected) if not is_selected}
+    if not quiet:
+        LOGGER.info(
+            f"Removed {len(rejected)} out of {len(children)} overlapping children"
         )
-        non_overlapping_ids = [x.id for x in non_overlapping]
-        c.children = c.children.filter(
-            lambda x: not filt_fn(x) or x.id in non_overlapping_ids)
+    if rejected:
+        for i in sorted(set(groups[j] for j in np.flatnonzero(~selected))):
+            c = chains[i]
+            c.children = c.children.filter(lambda x: id(x) not in rejected)
     return chains
 
 
+def hit_score(c: ChainSequence) -> float:
+    """
+    :param c: A child spawned by :func:`spawn_hit`, named `{map_name}_{dom_i}`.
+    :return: The hit's bit score.
+    """
+    return c.meta[f"{c.name.rpartition('_')[0]}_score"]
+
+
+def extract_motifs(
+    chains: abc.Sequence[ChainSequence],
+    positions: abc.Sequence[int],
+    map_name: str = PK_NAME,
+) -> list[str]:
+    """
+    Extract residues aligned to the PK profile's positions directly from
+    the profile numbering of each chain.
+
+    :param chains: Chain sequences having the `map_name` numbering.
+    :param positions: Profile positions, starting from 1.
+    :param map_name: The name of the PK profile numbering.
+    :return: A motif per chain with "X" at the positions missing from its
+        alignment.
+    """
+    if len(chains) == 0:
+        return []
+    numbering = np.concatenate(
+        [np.array(c[map_name], dtype=np.float64) for c in chains]
+    )
+    codes = np.frombuffer(
+        "".join(c.seq1 for c in chains).encode("ascii"), dtype=np.uint8
+    )
+    chain_idx = np.repeat(np.arange(len(chains)), [len(c.seq1) for c in chains])
+    motifs = np.full((len(chains), len(positions)), ord("X"), dtype=np.uint8)
+    for j, p in enumerate(positions):
+        is_p = numbering == p
+        motifs[chain_idx[is_p], j] = codes[is_p]
+    return [x.decode("ascii") for x in motifs.view(f"S{len(positions)}").ravel()]
+
+
+def is_ppk(motifs: abc.Sequence[str], motif: str = MOTIF) -> np.ndarray:
+    """
+    :param motifs: Observed motifs of the same size as `motif`.
+    :param motif: A motif of a catalytically active PK, where "X" matches
+        any residue.
+    :return: A boolean mask of the motifs deviating from `motif`.
+    """
+    observed = np.frombuffer("".join(motifs).encode("ascii"), dtype=np.uint8)
+    observed = observed.reshape(len(motifs), len(motif))
+    expected = np.frombuffer(motif.encode("ascii"), dtype=np.uint8)
+    is_fixed = expected != ord("X")
+    return (observed[:, is_fixed] != expected[is_fixed]).any(axis=1)
+
+
 def annotate_ppks(
     chains: ChainList,
-    vs_df: pd.DataFrame,
+    positions: abc.Sequence[int] = tuple(v.p for v in VARIABLES),
     pk_name: str = PK_NAME,
     ppk_name: str = PPK_NAME,
     motif: str = MOTIF,
-):
-    def is_ppk(motif_observed):
-        assert len(motif) == len(motif_observed), "motif sizes must match"
-        for c1, c2 in zip(motif, motif_observed):
-            if c1 != "X" and c1 != c2:
-                return True
-        return False
-
-    vs_df = vs_df.copy().fillna("X")
-    vs_df["Motif"] = ["".join(x[1:]) for x in vs_df.itertuples(index=False)]
-    id2motif = dict(x for x in vs_df[["ObjectID", "Motif"]].itertuples(index=False))
+) -> ChainList:
+    """
+    Store the motif of each PK domain under the "motif" meta key and rename
+    the pseudo kinases, whose motif deviates from the `motif`, into
+    `ppk_name`. Chains without the `pk_name` numbering get the "-" motif.
+
+    :param chains: Chain sequences to annotate.
+    :param positions: Profile positions of the motif.
+    :param pk_name: The name of the PK profile numbering.
+    :param ppk_name: The name replacing `pk_name` for pseudo kinases.
+    :param motif: A motif of a catalytically active PK (see :func:`is_ppk`).
+    :return: The annotated `chains`.
+    """
+    if len(motif) != len(positions):
+        raise ValueError(
+            f"The motif {motif} must have {len(positions)} residues, one per position"
+        )
+    pks = [c for c in chains if pk_name in c]
+    motifs = extract_motifs(pks, positions, pk_name)
+    id2motif = dict(zip(map(id, pks), zip(motifs, is_ppk(motifs, motif).tolist())))
 
     for c in chains:
-        try:
-            chain_motif = id2motif[c.id]
-            is_pseudo = is_ppk(chain_motif)
-            if is_pseudo:
-                c.name = c.name.replace(pk_name, ppk_name)
-            c.meta["motif"] = chain_motif
-        except KeyError:
-            c.meta["motif"] = "-"
+        chain_motif, is_pseudo = id2motif.get(id(c), ("-", False))
+        if is_pseudo:
+            c.name = c.name.replace(pk_name, ppk_name)
+        c.meta["motif"] = chain_motif
 
-    return chains, vs_df
+    return chains
 
 
 def aggregate_annotations(
@@ -808,130 +1171,376 @@ def aggregate_annotations(
     inp_name: str | None = None,
 ) -> pd.DataFrame:
     def get_score(c: ChainSequence):
-        return next(filter(lambda x: x[0].endswith("score"), c.meta.items()))[1]
-
-    def agg_one(c):
-        if c.name.split("_")[0] in [pk_name, ppk_name]:
-            hmm_type = "Target"
-            hmm_name = f"{c.id.split('_')[0]}_{c.meta['motif']}"
-            score = get_score(c)
-        elif c.name.split("_")[0] == "TM":
-            hmm_type = "TM"
-            hmm_name = c.id.split("_")[0]
-            score = np.nan
-        else:
-            hmm_type = c.id.split("_")[0]
-            hmm_name = "_".join(c.name.split("_")[1:-1])
-            score = get_score(c)
-        parent_name = c.parent.name
-        parent_size = len(c.parent)
-        return hmm_type, hmm_name, parent_name, parent_size, c.id, c.start, c.end, score
-
-    df = pd.DataFrame(
-        map(agg_one, chains),
-        columns=[
-            "AnnType",
-            "AnnName",
-            "ParentName",
-            "ParentSize",
-            "ObjectID",
-            "Start",
-            "End",
-            "BitScore",
-        ],
-    )
+        return next((v for k, v in c.meta.items() if k.endswith("score")), np.nan)
+
+    columns = [
+        "AnnType",
+        "AnnName",
+        "ParentName",
+        "ParentSize",
+        "ObjectID",
+        "Start",
+        "End",
+        "BitScore",
+    ]
+    # Only the attributes are collected per chain; the rest is vectorized
+    rows = [
+        (
+            c.name,
+            c.id,
+            c.parent.name,
+            len(c.parent),
+            c.start,
+            c.end,
+            str(c.meta.get("motif")),
+            get_score(c),
+        )
+        for c in chains
+    ]
+    if not rows:
+        df = pd.DataFrame(columns=columns)
+    else:
+        names, ids, parent_names, parent_sizes, starts, ends, motifs, scores = (
+            np.array(x, dtype=object) for x in zip(*rows)
+        )
+        name_type = np.array([x.partition("_")[0] for x in names], dtype=object)
+        id_type = np.array([x.partition("_")[0] for x in ids], dtype=object)
+        is_target = np.isin(name_type, [pk_name, ppk_name])
+        is_tm = name_type == "TM"
+        # A name without the type prefix and the domain index suffix
+        hmm_name = np.array(
+            [x.partition("_")[2].rpartition("_")[0] for x in names], dtype=object
+        )
+        df = pd.DataFrame(
+            {
+                "AnnType": np.where(
+                    is_target, "Target", np.where(is_tm, "TM", id_type)
+                ),
+                "AnnName": np.where(
+                    is_target,
+                    id_type + "_" + motifs,
+                    np.where(is_tm, id_type, hmm_name),
+                ),
+                "ParentName": parent_names,
+                "ParentSize": parent_sizes.astype(np.int64),
+                "ObjectID": ids,
+                "Start": starts.astype(np.int64),
+                "End": ends.astype(np.int64),
+                "BitScore": np.where(is_tm, np.nan, scores).astype(np.float64),
+            }
+        )
     if inp_name:
         df["InputName"] = inp_name
     return df
 
 
-def merge_summaries(base: Path):
+def write_run_info(output: Path, params: dict[str, t.Any], pk_profile: Path) -> Path:
+    """
+    Record the version, the parameters and the fingerprints of the profiles
+    used by `find`, so that the outputs can be traced back to a specific
+    HMM database.
+
+    :param output: An output directory.
+    :param params: Run parameters, including the `db_fingerprint`.
+    :param pk_profile: A path to the PK profile.
+    :return: A path to the written file.
+    """
+    info = {
+        "version": __version__,
+        "pk_profile_checksum": file_checksum(Path(pk_profile)),
+        **params,
+    }
+    path = output / RUN_INFO_NAME
+    path.write_text(json.dumps(info, indent=2, default=str))
+    return path
+
+
+def import_dataset():
+    try:
+        import pyarrow.dataset
+    except ImportError as e:
+        raise ImportError(
+            "Parquet and Arrow outputs require `pyarrow`: pip install pyarrow"
+        ) from e
+    return pyarrow.dataset
+
+
+def summary_path(output: Path, name: str, fmt: str = "tsv") -> Path:
+    """
+    :return: A path to the summary table (a file or a dataset's directory)
+        written by :func:`write_summary`.
+    """
+    return output / f"{name}{DATASET_FORMATS[fmt][1] if fmt != 'tsv' else '.tsv'}"
+
+
+def write_summary(
+    df: pd.DataFrame, output: Path, name: str, fmt: str = "tsv", append: bool = False
+):
+    """
+    :param df: A summary table with the `InputName` column.
+    :param output: An output directory.
+    :param name: A name of the table.
+    :param fmt: One of the :data:`~tkp_finder.constants.OUTPUT_FORMATS`.
+        For `parquet` and `arrow`, write a dataset partitioned by `InputName`.
+    :param append: Append to the table written previously. For datasets,
+        the partitions of the inputs in `df` are replaced. Otherwise,
+        the existing table is overwritten.
+    """
+    if fmt == "tsv":
+        df.to_csv(
+            output / f"{name}.tsv",
+            sep="\t",
+            index=False,
+            mode="a" if append else "w",
+            header=not append,
+        )
+        return
+    ds = import_dataset()
+    import pyarrow as pa
+
+    ds_format, ext = DATASET_FORMATS[fmt]
+    if not append and (output / f"{name}{ext}").exists():
+        shutil.rmtree(output / f"{name}{ext}")
+    file_format = ds.ParquetFileFormat() if fmt == "parquet" else ds.IpcFileFormat()
+    ds.write_dataset(
+        pa.Table.from_pandas(df, preserve_index=False),
+        output / f"{name}{ext}",
+        format=file_format,
+        file_options=file_format.make_write_options(compression="zstd"),
+        partitioning=["InputName"],
+        partitioning_flavor="hive",
+        existing_data_behavior="delete_matching",
+    )
+
+
+def open_summaries(base: Path, name: str = "summary", fmt: str = "parquet"):
+    """
+    Lazily open summary datasets written by `find` with the `parquet` or
+    `arrow` output format.
+
+    :param base: An output directory of `find` or a directory of such outputs.
+    :param name: A name of the table: `summary` or `summary_fmt`.
+    :param fmt: The output format.
+    :return: A `pyarrow.dataset.Dataset`. Nothing is read until it is
+        queried, e.g., by `to_table(columns=..., filter=...)`.
+    """
+    ds = import_dataset()
+    ds_format, ext = DATASET_FORMATS[fmt]
+    paths = [p for p in [base / f"{name}{ext}", *base.glob(f"*/{name}{ext}")] if p.is_dir()]
+    if not paths:
+        raise ValueError(f"No {name}{ext} datasets found in {base}")
+    return ds.dataset(
+        [ds.dataset(p, format=ds_format, partitioning="hive") for p in paths]
+    )
+
+
+def merge_summaries(
+    base: Path,
+    name: str = "summary",
+    columns: abc.Sequence[str] | None = None,
+    inputs: abc.Iterable[str] | None = None,
+) -> pd.DataFrame:
+    """
+    Merge summary tables of `find` outputs.
+
+    Parquet or Arrow datasets are read lazily: only the requested columns
+    and partitions of the requested inputs are loaded. Otherwise, fall back
+    to reading `*/{name}.tsv` files.
+
+    :param base: An output directory of `find` or a directory of such outputs.
+    :param name: A name of the table: `summary` or `summary_fmt`.
+    :param columns: Columns to load. By default, load all columns.
+    :param inputs: Names of the inputs to load. By default, load all inputs.
+    :return: A merged table.
+    """
+    for fmt, (_, ext) in DATASET_FORMATS.items():
+        if (base / f"{name}{ext}").is_dir() or any(base.glob(f"*/{name}{ext}")):
+            ds = import_dataset()
+            filt = None if inputs is None else ds.field("InputName").isin(list(inputs))
+            dataset = open_summaries(base, name, fmt)
+            return dataset.to_table(columns=columns, filter=filt).to_pandas()
+
     def agg(p):
         df = pd.read_csv(p, sep="\t")
         df["InputName"] = p.parent.name.split(".")[0]
         return df
 
-    return pd.concat(map(agg, base.glob("*/summary.tsv")))
+    df = pd.concat(map(agg, base.glob(f"*/{name}.tsv")))
+    if inputs is not None:
+        df = df[df["InputName"].isin(list(inputs))]
+    if columns is not None:
+        df = df[list(columns)]
+    return df
 
 
 def format_summaries(df: pd.DataFrame, hmm_dir: Path) -> pd.DataFrame:
-    def fmt_row(x):
-        ann_name = x.AnnName
-        try:
-            obj_name = acc2desc[ann_name]
-        except KeyError:
-            obj_name = x.ObjectID.split("|")[0].removeprefix(f"{x.AnnType}_")
-        obj_size = x.End - x.Start + 1
-        return f"({obj_name}~{obj_size})"
-
-    def fmt_gap(x1, x2=None):
-        if x2 is None:
-            return f"(X~{x1.Start - 1})"
-        return f"(X~{x2.Start - x1.End - 1})"
-
-    def fmt_pair(x):
-        is_fst, is_lst, (x1, x2) = x
-        if is_fst and is_lst:
-            return f".{fmt_gap(x1)}-{fmt_row(x1)}"
-        if is_fst:
-            return f".{fmt_gap(x1)}-{fmt_row(x1)}-{fmt_gap(x1, x2)}-"
-        if is_lst:
-            return f"-{fmt_row(x1)}"
-        return f"{fmt_row(x1)}-{fmt_gap(x1, x2)}"
-
-    def fmt(gg):
-
-        pairs = mark_ends(
-            zip(
-                gg.itertuples(index=False),
-                chain(islice(gg.itertuples(index=False), 1, None), (len(gg),)),
-            )
-        )
-
-        last = gg.iloc[-1]
-        tail_size = last["ParentSize"] - last["End"]
+    """
+    Format the domain architecture of each protein.
 
-        return "".join(map(fmt_pair, pairs)) + f"-(X~{tail_size})."
+    For each annotation type, the annotations are joined into a string of
+    `(name~size)` elements interleaved with `(X~size)` gaps. The strings are
+    composed from per-row pieces computed on whole columns, so the cost is
+    linear in the number of annotations.
 
-    def fmt_groups(g, gg):
-        total = gg.iloc[-1]["ParentSize"]
-        groups = gg.groupby("AnnType")
-        names, formatted = map(list, unzip((g, fmt(x)) for g, x in groups))
-        ann_names = [f"{n}Names" for n in names]
-        ann_names_values = ["~".join(x["AnnName"]) for _, x in groups]
-        return pd.Series(
-            [*g, *formatted, *ann_names_values, total],
-            index=["InputName", "ParentName", *names, *ann_names, "TotalSize"],
-        )
-
-    hmm_df = pd.read_csv(hmm_dir / PFAM_ENT_NAME, sep="\t")
-    acc2desc = dict(hmm_df[["Accession", "Description"]].itertuples(index=False))
+    :param df: A table produced by :func:`aggregate_annotations`.
+    :param hmm_dir: A directory with the Pfam entries' descriptions.
+    :return: A table with a row per (InputName, ParentName).
+    """
+    if len(df) == 0:
+        return pd.DataFrame()
 
     df = (
         df.copy()
         .sort_values(["InputName", "ParentName", "AnnType", "Start"])
         .reset_index(drop=True)
     )
-    groups = df.groupby(["InputName", "ParentName"], as_index=False)
+    parent_keys = ["InputName", "ParentName"]
+    keys = [*parent_keys, "AnnType"]
+
+    def is_new(cols: list[str]) -> np.ndarray:
+        return (df[cols] != df[cols].shift()).any(axis=1).to_numpy()
+
+    def to_str(xs: np.ndarray) -> np.ndarray:
+        return np.array(list(map(str, xs.tolist())), dtype=object)
+
+    def join_groups(xs: np.ndarray, sep: str) -> list[str]:
+        # Groups are contiguous in the sorted table
+        return [sep.join(xs[i:j]) for i, j in zip(bounds[:-1], bounds[1:])]
+
+    start, end = df["Start"].to_numpy(), df["End"].to_numpy()
+    is_fst = is_new(keys)
+    is_lst = np.append(is_fst[1:], True)
+    bounds = [*np.flatnonzero(is_fst).tolist(), len(df)]
+
+    ann_type = df["AnnType"].to_numpy(dtype=object)
+    ann_name = df["AnnName"].to_numpy(dtype=object)
+    acc2desc = read_descriptions(hmm_dir, set(ann_name.tolist()))
+    name = np.array(
+        [
+            acc2desc[x] if x in acc2desc else obj.split("|")[0].removeprefix(f"{t}_")
+            for x, obj, t in zip(ann_name, df["ObjectID"], ann_type)
+        ],
+        dtype=object,
+    ).astype(str).astype(object)
+    row = "(" + name + "~" + to_str(end - start + 1) + ")"
+
+    gap_fst = ".(X~" + to_str(start - 1) + ")-"
+    gap_nxt = "-(X~" + to_str(np.append(start[1:], 0) - end - 1) + ")"
+    tail = "-(X~" + to_str(df["ParentSize"].to_numpy() - end) + ")."
+    prefix = np.where(is_fst, gap_fst, np.where(is_lst, "-", ""))
+    suffix = np.where(is_lst, tail, np.where(is_fst, gap_nxt + "-", gap_nxt))
+    pieces = prefix + row + suffix
+
+    heads = df.loc[is_fst, keys].reset_index(drop=True)
+    heads["Formatted"] = join_groups(pieces, "")
+    heads["Names"] = join_groups(ann_name, "~")
+    index = pd.MultiIndex.from_frame(heads[parent_keys])
+    formatted = heads.set_index([*parent_keys, "AnnType"])["Formatted"].unstack()
+    names = heads.set_index([*parent_keys, "AnnType"])["Names"].unstack()
+    is_parent_lst = np.append(is_new(parent_keys)[1:], True)
+    total = df.loc[is_parent_lst].set_index(parent_keys)["ParentSize"]
+
+    # Order the type columns by the first protein having them,
+    # and within a protein alphabetically
+    parent_idx = np.cumsum(is_new(parent_keys))
+    first = pd.Series(parent_idx).groupby(ann_type).min()
+    type_columns = []
+    for i, ann_types in first.groupby(first, sort=True):
+        ann_types = list(ann_types.index)
+        type_columns.extend([*ann_types, *(f"{x}Names" for x in ann_types)])
+        if i == first.min():
+            type_columns.append("TotalSize")
+
+    res = pd.concat(
+        [formatted, names.add_suffix("Names"), total.rename("TotalSize")], axis=1
+    ).reindex(index.unique())
+    return res.reset_index()[[*parent_keys, *type_columns]]
+
+
+def merge_metrics(
+    results: abc.Iterable[tuple[t.Any, Metrics] | None], metrics: Metrics
+) -> abc.Generator[t.Any, None, None]:
+    """
+    Unpack the results of :func:`collect_metrics` calls merging their
+    metrics into `metrics`. Failed calls (``None``) are passed through.
+    """
+    for res in results:
+        if res is None:
+            yield None
+        else:
+            obj, obj_metrics = res
+            metrics.merge(obj_metrics)
+            yield obj
 
-    return pd.DataFrame(starmap(fmt_groups, groups))
+
+def write_metrics(
+    metrics: Metrics,
+    path: Path,
+    command: str,
+    started: tuple[float, float],
+    params: dict[str, t.Any] | None = None,
+) -> Path:
+    """
+    :param metrics: Metrics collected by a command.
+    :param path: A path to write the report to.
+    :param command: The command's name.
+    :param started: Wall and CPU time of the command's start, as returned by
+        `time.perf_counter` and `time.process_time`. The CPU time is
+        of the main process only; the stages report their process's time.
+    :param params: The command's parameters.
+    :return: The `path`.
+    """
+    return metrics.write(
+        path,
+        command=command,
+        version=__version__,
+        wall_time=time.perf_counter() - started[0],
+        cpu_time=time.process_time() - started[1],
+        params=params or {},
+    )
 
 
 def yield_sequentially(fn, *args):
     yield from map(fn, *args)
 
 
-def yield_parallel(fn, num_proc, objs, timeout=500):
+def yield_parallel(fn, num_proc, objs, timeout=500, lookahead=2):
+    """
+    Apply `fn` to `objs` in a process pool, yielding the results in order.
+
+    At most `num_proc + lookahead` objects are processed or waiting at once:
+    the next one is submitted as each result is yielded, and the yielded
+    results aren't referenced anymore. Thus, the memory is bounded by the
+    window rather than by the number of `objs`.
+
+    :param fn: A picklable function of a single object.
+    :param num_proc: The number of processes.
+    :param objs: Objects to apply `fn` to. Consumed lazily.
+    :param timeout: Seconds to wait for a result.
+    :param lookahead: The number of objects submitted beyond `num_proc`,
+        keeping the workers busy while a result is consumed.
+    :return: A generator over the results, with ``None`` for each failed
+        object.
+    """
+    objs = iter(objs)
     with ProcessPoolExecutor(num_proc) as executor:
-        futures = [(o, executor.submit(fn, o)) for o in objs]
-        for o, f in futures:
+        pending = deque(
+            (o, executor.submit(fn, o)) for o in islice(objs, num_proc + lookahead)
+        )
+        while pending:
+            o, f = pending.popleft()
             try:
-                yield f.result(timeout=timeout)
+                res = f.result(timeout=timeout)
             except Exception as e:
                 LOGGER.error(f"Failed on input {o} with {e}; stacktrace below")
                 LOGGER.exception(e)
-                yield None
-
+                res = None
+            for o in islice(objs, 1):
+                pending.append((o, executor.submit(fn, o)))
+            # Don't hold the result while waiting for the next one
+            del f
+            yield res
+            del res
 
 if __name__ == "__main__":
     tkp_finder()
@@ -0,0 +1,393 @@
+import logging
+from abc import ABCMeta, abstractmethod
+from collections import abc
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from itertools import chain
+
+import numpy as np
+from lXtractor.core.chain import ChainSequence, ChainList
+from lXtractor.core.segment import Segment
+from tqdm.auto import tqdm
+
+from tkp_finder.constants import BATCH_BYTES, MAX_JOBS
+from tkp_finder.cache import AnnotationCache, stage_key, text_digest
+
+LOGGER = logging.getLogger(__name__)
+
+#: Kyte-Doolittle hydropathy scale
+HYDROPATHY = {
+    "A": 1.8, "R": -4.5, "N": -3.5, "D": -3.5, "C": 2.5,
+    "Q": -3.5, "E": -3.5, "G": -0.4, "H": -3.2, "I": 4.5,
+    "L": 3.8, "K": -3.9, "M": 1.9, "F": 2.8, "P": -1.6,
+    "S": -0.8, "T": -0.7, "W": -0.9, "Y": -1.3, "V": 4.2,
+}  # fmt: skip
+_HYDROPATHY_LUT = np.zeros(256, dtype=np.float32)
+for _aa, _value in HYDROPATHY.items():
+    _HYDROPATHY_LUT[ord(_aa)] = _HYDROPATHY_LUT[ord(_aa.lower())] = _value
+_POSITIVE_LUT = np.zeros(256, dtype=bool)
+_POSITIVE_LUT[[ord(x) for x in "KRkr"]] = True
+
+
+def batch_by_size(
+    seqs: abc.Iterable[tuple[str, str]], max_bytes: int = BATCH_BYTES
+) -> abc.Generator[list[tuple[str, str]], None, None]:
+    """
+    Split sequences into batches whose fasta payload does not exceed
+    `max_bytes`. A sequence larger than `max_bytes` makes a batch on its own.
+
+    :param seqs: Pairs of (header, sequence).
+    :param max_bytes: The maximum size of a batch in bytes.
+    :return: A generator over batches.
+    """
+    batch, size = [], 0
+    for header, seq in seqs:
+        # ">", the header, newline, the sequence, newline
+        seq_size = len(header) + len(seq) + 3
+        if batch and size + seq_size > max_bytes:
+            yield batch
+            batch, size = [], 0
+        batch.append((header, seq))
+        size += seq_size
+    if batch:
+        yield batch
+
+
+class InlineExecutor(Executor):
+    """
+    An executor running each call in the submitting thread, returning
+    a completed future.
+    """
+
+    def submit(self, fn, /, *args, **kwargs) -> Future:
+        future = Future()
+        future.set_running_or_notify_cancel()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+
+class TMBackend(metaclass=ABCMeta):
+    """
+    A base class for TM topology predictors annotating chains by
+    `{category}_{label}` children, where `label` is one of the predicted
+    segment types, such as "TMhelix", "inside", or "outside".
+
+    Sequences are predicted in batches by :meth:`run_batch` within the
+    :attr:`executor`, a thread pool by default. Use :meth:`submit` to start
+    the predictions without waiting for them and :meth:`collect` to annotate
+    chains by their results.
+
+    Sequences are submitted under their digests, so that a sequence
+    submitted again before its job is collected isn't predicted twice.
+    The jobs' results are released once every submission using them is
+    collected. With a `cache`, the predictions are also persisted and reused
+    across submissions and runs.
+    """
+
+    #: A name identifying the predictions in the cache
+    name: str = "TM"
+
+    def __init__(
+        self, max_jobs: int = MAX_JOBS, cache: AnnotationCache | None = None
+    ):
+        """
+        :param max_jobs: The maximum number of concurrently running jobs.
+        :param cache: An annotation cache to store the predictions in.
+            Must be used from the thread calling :meth:`submit` and
+            :meth:`collect`.
+        """
+        self.max_jobs = max_jobs
+        self.cache = cache
+        self.cache_stage = stage_key("tm", self.name)
+        self._executor: ThreadPoolExecutor | None = None
+        #: Digest => a future of a job predicting the sequence. Only the
+        #: futures of the submissions yet to be collected are kept.
+        self._submitted: dict[str, Future] = {}
+        #: A future => the digests it predicts
+        self._digests: dict[Future, list[str]] = {}
+        #: A future => the number of submissions yet to collect it
+        self._users: dict[Future, int] = {}
+        #: Digests of sequences stored in the cache
+        self._cached: set[str] = set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                self.max_jobs, thread_name_prefix=self.name
+            )
+        return self._executor
+
+    @abstractmethod
+    def run_batch(self, batch: list[tuple[str, str]]) -> dict[str, list[Segment]]:
+        """
+        Predict a single batch of sequences.
+
+        :param batch: Pairs of (header, sequence).
+        :return: A mapping from headers to the predicted segments.
+        """
+
+    def submit(
+        self, chains: abc.Iterable[ChainSequence], max_bytes: int = BATCH_BYTES
+    ) -> list[Future]:
+        """
+        Submit chains for annotation without waiting for the results.
+
+        Only the sequences that are neither cached nor already submitted
+        are predicted.
+
+        :param chains: Chain sequences to annotate.
+        :param max_bytes: The maximum fasta payload of a single job.
+        :return: A list of futures resolving into mappings from sequence
+            digests to the predicted segments.
+        """
+        seqs = {}
+        for c in chains:
+            seqs.setdefault(text_digest(c.seq1).hex(), c.seq1)
+
+        futures = []
+        if self.cache is not None:
+            cached = self.cache.get(
+                self.cache_stage, (bytes.fromhex(k) for k in seqs)
+            )
+            self.cache.update_stats(self.name, len(cached), len(seqs))
+            if cached:
+                future = Future()
+                future.set_result(
+                    {
+                        k.hex(): [Segment(*x) for x in segments]
+                        for k, segments in cached.items()
+                    }
+                )
+                futures.append(future)
+                self._cached.update(k.hex() for k in cached)
+                seqs = {k: v for k, v in seqs.items() if k not in self._cached}
+
+        # Failed jobs are resubmitted
+        self._submitted = {
+            k: f
+            for k, f in self._submitted.items()
+            if not (f.done() and f.exception() is not None)
+        }
+        pending = {self._submitted[k] for k in seqs if k in self._submitted}
+        missing = [(k, v) for k, v in seqs.items() if k not in self._submitted]
+        for future in pending:
+            self._users[future] += 1
+        futures.extend(pending)
+        for batch in batch_by_size(missing, max_bytes):
+            future = self.executor.submit(self.run_batch, batch)
+            self._digests[future] = [k for k, _ in batch]
+            self._users[future] = 1
+            for k, _ in batch:
+                self._submitted[k] = future
+            futures.append(future)
+        return futures
+
+    def _release(self, futures: abc.Iterable[Future]):
+        # Forget the futures no other submission is waiting for
+        for future in futures:
+            users = self._users.pop(future, None)
+            if users is None:
+                # Resolved from the cache
+                continue
+            if users > 1:
+                self._users[future] = users - 1
+                continue
+            for k in self._digests.pop(future):
+                if self._submitted.get(k) is future:
+                    del self._submitted[k]
+
+    def collect(
+        self,
+        chains: abc.Iterable[ChainSequence],
+        futures: abc.Iterable[Future],
+        category: str = "TM",
+        callback: abc.Callable[[], None] | None = None,
+        **kwargs,
+    ) -> abc.Generator[ChainSequence, None, None]:
+        """
+        Wait for the submitted jobs and annotate the chains by their results.
+        The children are spawned in the order of `chains`.
+
+        :param chains: Chain sequences used in :meth:`submit`.
+        :param futures: Futures returned by :meth:`submit`.
+        :param category: A prefix of the spawned children's names.
+        :param callback: Called after each completed job.
+        :param kwargs: Passed to `spawn_child`.
+        :return: A generator over spawned children.
+        :raises RuntimeError: After all the successful jobs were processed
+            if any job failed.
+        """
+        futures = list(futures)
+        results, num_failed = {}, 0
+        for future in futures:
+            try:
+                results.update(future.result())
+            except Exception as e:
+                LOGGER.error(f"{self.name} job failed due to {e}")
+                num_failed += 1
+            finally:
+                if callback is not None:
+                    callback()
+        self._release(futures)
+
+        if self.cache is not None:
+            new = [k for k in results if k not in self._cached]
+            self.cache.put(
+                self.cache_stage,
+                (
+                    (bytes.fromhex(k), [(s.start, s.end, s.name) for s in results[k]])
+                    for k in new
+                ),
+            )
+            self._cached.update(new)
+
+        for c in chains:
+            segments = results.get(text_digest(c.seq1).hex())
+            if segments is None:
+                continue
+            for s in segments:
+                yield c.spawn_child(s.start, s.end, f"{category}_{s.name}", **kwargs)
+
+        if num_failed:
+            raise RuntimeError(f"{num_failed}/{len(futures)} {self.name} jobs failed")
+
+    def annotate(
+        self,
+        chains: abc.Iterable[ChainSequence],
+        category: str = "TM",
+        max_bytes: int = BATCH_BYTES,
+        quiet: bool = True,
+        **kwargs,
+    ) -> abc.Generator[ChainSequence, None, None]:
+        if not isinstance(chains, ChainList):
+            chains: ChainList[ChainSequence] = ChainList(chains)
+        futures = self.submit(chains, max_bytes)
+        LOGGER.info(f"Submitted {len(futures)} {self.name} jobs")
+        if quiet:
+            callback = None
+        else:
+            bar = tqdm(total=len(futures), desc=f"Waiting for {self.name} jobs")
+            callback = lambda: bar.update(1)
+        try:
+            yield from self.collect(chains, futures, category, callback, **kwargs)
+        finally:
+            if not quiet:
+                bar.close()
+
+
+class HydropathyTM(TMBackend):
+    """
+    A fast offline predictor of TM helices and their topology.
+
+    TM helices are the highest-scoring non-overlapping windows of the
+    Kyte-Doolittle hydropathy profile above the `threshold`. The loops between
+    them alternate between "inside" and "outside", with the orientation
+    selected by the positive-inside rule: the set of loops with more
+    Lys and Arg residues is placed inside. Sequences without TM helices are
+    annotated as a single "inside" segment, like DeepTMHMM does for
+    globular proteins.
+
+    The predictions are CPU-bound and hold the GIL, so, unlike the base
+    class, the batches are predicted inline by :meth:`submit`.
+    """
+
+    name = "HydropathyTM"
+
+    def __init__(
+        self,
+        window: int = 19,
+        threshold: float = 1.6,
+        min_loop: int = 2,
+        max_jobs: int = MAX_JOBS,
+        cache: AnnotationCache | None = None,
+    ):
+        """
+        :param window: The size of a TM helix.
+        :param threshold: The minimum average hydropathy of a TM helix.
+        :param min_loop: The minimum number of residues between TM helices.
+        :param max_jobs: Unused: the batches are predicted inline.
+        :param cache: An annotation cache to store the predictions in.
+        """
+        self.window = window
+        self.threshold = threshold
+        self.min_loop = min_loop
+        super().__init__(max_jobs, cache)
+        self.cache_stage = stage_key("tm", self.name, window, threshold, min_loop)
+
+    @property
+    def executor(self) -> Executor:
+        return InlineExecutor()
+
+    def find_helices(self, seq: str) -> list[tuple[int, int]]:
+        """
+        :param seq: A protein sequence.
+        :return: A sorted list of 0-based (start, end) pairs of TM helices
+            with an exclusive end.
+        """
+        codes = np.frombuffer(seq.encode("ascii"), dtype=np.uint8)
+        if len(codes) < self.window:
+            return []
+        cumsum = np.concatenate([[0], np.cumsum(_HYDROPATHY_LUT[codes])])
+        scores = (cumsum[self.window :] - cumsum[: -self.window]) / self.window
+        candidates = np.flatnonzero(scores >= self.threshold)
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+
+        # Greedily accept the best windows separated by at least `min_loop`
+        taken = np.zeros(len(codes), dtype=bool)
+        helices = []
+        for start in candidates:
+            lo = max(0, start - self.min_loop)
+            hi = min(len(codes), start + self.window + self.min_loop)
+            if not taken[lo:hi].any():
+                taken[start : start + self.window] = True
+                helices.append((int(start), int(start) + self.window))
+        return sorted(helices)
+
+    def predict(self, seq: str) -> list[Segment]:
+        """
+        :param seq: A protein sequence.
+        :return: A list of predicted segments covering the sequence, using
+            1-based inclusive coordinates.
+        """
+        helices = self.find_helices(seq)
+        if not helices:
+            return [Segment(1, len(seq), "inside")]
+
+        bounds = [0, *chain.from_iterable(helices), len(seq)]
+        loops = list(zip(bounds[::2], bounds[1::2]))
+        positive = _POSITIVE_LUT[np.frombuffer(seq.encode("ascii"), dtype=np.uint8)]
+        counts = [int(positive[start:end].sum()) for start, end in loops]
+        even_inside = sum(counts[::2]) >= sum(counts[1::2])
+
+        segments = []
+        for i, (start, end) in enumerate(loops):
+            if end > start:
+                is_inside = (i % 2 == 0) == even_inside
+                segments.append(
+                    Segment(start + 1, end, "inside" if is_inside else "outside")
+                )
+            if i < len(helices):
+                h_start, h_end = helices[i]
+                segments.append(Segment(h_start + 1, h_end, "TMhelix"))
+        return segments
+
+    def run_batch(self, batch: list[tuple[str, str]]) -> dict[str, list[Segment]]:
+        return {header: self.predict(seq) for header, seq in batch}
+
+
+if __name__ == "__main__":
+    raise RuntimeError